@@ -4,6 +4,9 @@ from __future__ import absolute_import, division, unicode_literals, print_functi
 from .pdom import aWord, aWordStarts, aStarts, aEnds, aContains
 from .pdom import search as dom_search
 from .pdom import select as dom_select
+from .pdom import search_iter as dom_search_iter
+from .pdom import select_iter as dom_select_iter
+from .pdom import select_one as dom_select_one
 ## old
 from .pdom import parseDOM, parse_dom
 
@@ -23,12 +23,19 @@ from .base import AttrDict, RoAttrDictView
 from .base import NoResult, Result, MissingAttr, ResultParam
 from .base import regex, pats, remove_tags_re
 from .base import _tostr, _make_html_list, find_node
-from .base import Node, DomMatch
+from .base import Node, NodeList, Column, Columns, DomMatch
 from .base import aWord, aWordStarts, aStarts, aEnds, aContains
 
 
 from .msearch import dom_search as search
 from .mselect import dom_select as select
+from .mselect import CompiledSelector, compile_selector
+from .mexplain import explain
+from .mprofile import profile, Profile
+from .mslowlog import slow_log, SlowLog
+from .mstream import dom_search_iter as search_iter
+from .mstream import dom_select_iter as select_iter
+from .mstream import dom_select_one as select_one
 from .backward import parseDOM, parse_dom
 
 
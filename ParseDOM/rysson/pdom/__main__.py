@@ -5,6 +5,7 @@ import sys as _sys
 import argparse
 
 from .mselect import dom_select
+from .mexplain import explain
 from .selectorparser import parse as selector_parse
 from .selectorparser import dump as selector_dump
 from .selectorparser import set_debug_repr as selector_set_debug_repr, set_debug as selector_set_debug
@@ -75,11 +76,23 @@ class ExtArgumentParser(argparse.ArgumentParser):
     #    return super(ExtArgumentParser, self).parse_known_args(args=args, namespace=namespace)
 
 
+def load_page(url):
+    r"""Returns page from URL or file."""
+    if url.startswith('file://'):
+        url = url[7:]
+    if '://' in url:
+        import requests
+        with requests.Session() as sess:
+            res = sess.get(url)
+            return res.text
+    with open(url) as f:
+        return f.read()
+
+
 def main():
     print('=== Tests ===')
 
     import sys
-    import requests
     import pprint
     pprint = pprint.PrettyPrinter(indent=2).pprint
 
@@ -102,6 +115,12 @@ def main():
     aselparser.add_argument('selectors', metavar='SEL', nargs='+', help='selector to parse')
     aparser.set_subparser_alternative('CMDSEL', '--selector', '--selector-parse', '-S')
 
+    aexplainparser = asubparsers.add_parser('CMDEXPLAIN', help='(-E) show selector plan, run on page if URL is used')
+    aexplainparser.add_argument('--url', '-u', metavar='URL', help='URL or file to run selectors on')
+    aexplainparser.add_argument('--html', '-H', metavar='HTML', help='Direct HTML to run selectors on')
+    aexplainparser.add_argument('selectors', metavar='SEL', nargs='+', help='selector to explain')
+    aparser.set_subparser_alternative('CMDEXPLAIN', '--explain', '-E')
+
     #cmdi = [x.title for x in aparser._action_groups].index('command')
     #aparser._action_groups.insert(0, aparser._action_groups.pop(cmdi))
     args = aparser.parse_args()
@@ -115,21 +134,19 @@ def main():
         selector_set_debug_repr()
         for sel in args.selectors:
             print(selector_parse(sel))
+    elif args.op == 'CMDEXPLAIN':
+        html = args.html
+        if args.url:
+            html = load_page(args.url)
+        for sel in args.selectors:
+            explain(sel, html)
+            print()
     elif args.op == 'CMDHTML':
         html = args.html[0]
         for sel in args.selectors:
             pprint(dom_select(html, sel))
     else:
-        url = args.url[0]
-        if url.startswith('file://'):
-            url = url[7:]
-        if '://' in url:
-            with requests.Session() as sess:
-                res = sess.get(url)
-                page = res.text
-        else:
-            with open(url) as f:
-                page = f.read()
+        page = load_page(args.url[0])
         #print(page[:200])
         for sel in args.selectors:
             pprint(dom_select(page, sel))
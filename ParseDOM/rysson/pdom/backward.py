@@ -1,15 +1,109 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, unicode_literals, print_function
 
-from .base import Result, DomMatch
+import re
+
+from .base import base_str
+from .base import Result, Node, DomMatch
+from .base import pats
+from .base import _tostr, _make_html_list, find_node
+from .base import attr_value_re, attr_value
+from .base import isrealsequence
 from .msearch import dom_search
 
+
+#: Cache of fused regex for legacy parseDOM() calls.
+_fused_cache = {}
+
+#: Max size of fused regex cache.
+FUSED_CACHE_SIZE = 256
+
+
+def _fused_regex(name, attrs):
+    r"""
+    Helper. Returns one regex for tag `name` with all `attrs` (lookahead for next attributes).
+
+    It matches the same tags as dom_search() does with single attribute
+    regex per attribute (and intersection of found tags).
+    """
+    key = name, tuple(sorted(attrs.items()))
+    try:
+        return _fused_cache[key]
+    except KeyError:
+        pass
+    if len(_fused_cache) >= FUSED_CACHE_SIZE:
+        _fused_cache.clear()
+    if not attrs:
+        pat = pats.melem(name, None, None)
+    else:
+        # the first attribute as in dom_search(), the rest as lookahead
+        (a0, v0), rest = key[1][0], key[1][1:]
+        look = ''.join(r'(?={anyAttr}{attr}{anyAttr}\s*/?>)'.format(attr=pats.mattr(a, v), **pats) for a, v in rest)
+        pat = r'<{tag}{look}{anyAttr}{attr}{anyAttr}\s*/?>'.format(tag=pats.mtag(name), look=look,
+                                                                  attr=pats.mattr(a0, v0), **pats)
+    rx = _fused_cache[key] = re.compile(pat, re.DOTALL | re.IGNORECASE)
+    return rx
+
+
+def _fast_search(html, name, attrs, ret):
+    r"""
+    Helper. Fast engine for simple parseDOM() calls.
+
+    Supports only: `attrs` dict with str (regex) or True values, `ret`
+    content (None or False), DomMatch or single lower-case attribute name.
+    Returns None if call is not supported, dom_search() has to be used.
+    """
+    if attrs and not all(isinstance(v, base_str) or v is True for v in attrs.values()):
+        return None
+    content = ret is None or ret is False
+    if not content and ret is not DomMatch and not (isinstance(ret, base_str) and ret == ret.lower()):
+        return None
+    html = _make_html_list(html)
+    if any(item is None or isrealsequence(item) for item in html):
+        return None
+    name = _tostr(name or '').strip()
+    if not name or name == '*':
+        name = pats.anyTag   # any tag
+    rx = _fused_regex(name, attrs or {})
+    res = []
+    if content:
+        for item in html:
+            item = _tostr(item)
+            for r in rx.finditer(item):
+                ms, me = r.span()
+                ce = find_node(None, r.group(), item, ms, me)[3]
+                res.append(item[me:ce])
+    elif ret is DomMatch:
+        for item in html:
+            item = _tostr(item)
+            for r in rx.finditer(item):
+                ms, me = r.span()
+                ce = find_node(None, r.group(), item, ms, me)[3]
+                res.append(DomMatch(Node(r.group()).attrs, item[me:ce]))
+    else:
+        arx = attr_value_re(ret)
+        for item in html:
+            for r in rx.finditer(_tostr(item)):
+                val = attr_value(arx, r.group())
+                if val is not None:
+                    res.append(val)
+    return res
+
+
 def parseDOM(html, name=None, attrs=None, ret=None, exclude_comments=False):
+    if not exclude_comments:
+        res = _fast_search(html, name, attrs, ret)
+        if res is not None:
+            return res
     return dom_search(html, name, attrs=attrs,
                       ret=Result.Content if ret is None else ret,
                       exclude_comments=exclude_comments)
 
 def parse_dom(html, name='', attrs=None, req=False, exclude_comments=False):
+    if not exclude_comments:
+        res = _fast_search(html, name, attrs, DomMatch)
+        if res is not None:
+            return res
     return dom_search(html, name, attrs=attrs, ret=DomMatch,
                       exclude_comments=exclude_comments)
 
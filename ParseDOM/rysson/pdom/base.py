@@ -3,7 +3,10 @@ from __future__ import absolute_import, division, unicode_literals, print_functi
 
 import sys
 import re
-from collections import defaultdict
+import json
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, OrderedDict
 from collections import namedtuple
 try:
     from requests import Response
@@ -12,13 +15,18 @@ except ImportError:
 
 PY2 = sys.version_info < (3,0)
 
+#: Array type code for offsets.
+OFFSET_TYPECODE = 'l' if PY2 else 'q'
+
 if PY2:
     from collections import Sequence
     type_str, type_bytes, base_str = unicode, str, basestring
+    intern_str = lambda s: s  # unicode can not be interned
     class Enum: pass
 else:
     from collections.abc import Sequence
     type_str, type_bytes, unicode, base_str = str, bytes, str, str
+    intern_str = sys.intern
     from enum import Enum
 
 
@@ -159,6 +167,117 @@ pats = Patterns()
 regs = Regex(pats)   # not used now
 remove_tags_re = re.compile(pats.nodeTag)
 openCloseTag_re = re.compile(pats.openCloseTag, re.DOTALL)
+getTag_re = re.compile(pats.getTag, re.DOTALL)
+
+
+#: Max number of cached text projections (one per HTML part), see text_projection().
+TEXT_CACHE_SIZE = 8
+
+_text_cache = OrderedDict()
+
+
+class TextProjection(object):
+    r"""
+    Text of HTML part (item) without tags with offset map.
+
+    Tags are removed exactly like `remove_tags_re.sub('', item)`. Every source
+    offset outside tags is mapped to text offset, so text of node is a slice
+    of the projection and `:contains()` is one substring search.
+
+    Projection is built lazily. Until stripped parts are longer then the item,
+    texts are stripped directly, so one node in a long page doesn't pay for
+    whole page. Then the projection is built (at most twice the work).
+
+    Parameters
+    ----------
+    item : str
+        HTML string or HTML part string, the same like `Node.item`.
+    """
+
+    __slots__ = ('item', 'stripped', 'text', 'tag_starts', 'tag_ends', 'removed', 'found')
+
+    def __init__(self, item):
+        self.item = item
+        self.stripped = 0
+        #: Tag-free text or None if not built yet.
+        self.text = None
+
+    def _build(self):
+        r"""Helper. Build projection text and offset map."""
+        item = self.item
+        self.tag_starts, self.tag_ends = starts, ends = [], []
+        #: Number of removed (tag) characters before every tag and after the last one.
+        self.removed = removed = [0]
+        #: Sorted offsets of found substrings (in text), see contains().
+        self.found = {}
+        parts, pos, total = [], 0, 0
+        for r in remove_tags_re.finditer(item):
+            ts, te = r.span()
+            parts.append(item[pos:ts])
+            starts.append(ts)
+            ends.append(te)
+            total += te - ts
+            removed.append(total)
+            pos = te
+        parts.append(item[pos:])
+        self.text = ''.join(parts)
+
+    def _ready(self, cs, ce):
+        r"""Helper. True if projection is built (or should be built now)."""
+        if self.text is None:
+            self.stripped += ce - cs
+            if self.stripped <= len(self.item):
+                return False
+            self._build()
+        return True
+
+    def offset(self, pos):
+        r"""Returns text offset for source offset `pos` or None if `pos` is inside a tag."""
+        i = bisect_right(self.tag_ends, pos)
+        if i < len(self.tag_starts) and self.tag_starts[i] < pos:
+            return None
+        return pos - self.removed[i]
+
+    def span(self, cs, ce):
+        r"""Returns text span for source [cs:ce] or None if not possible (tag on the edge)."""
+        tcs, tce = self.offset(cs), self.offset(ce)
+        if tcs is None or tce is None:
+            return None
+        return tcs, tce
+
+    def get(self, cs, ce):
+        r"""Returns text of source part `item[cs:ce]`."""
+        span = self._ready(cs, ce) and self.span(cs, ce)
+        if not span:
+            return remove_tags_re.sub('', self.item[cs:ce])
+        return self.text[span[0]:span[1]]
+
+    def contains(self, cs, ce, sub):
+        r"""True if text of source part `item[cs:ce]` contains `sub`."""
+        span = self._ready(cs, ce) and sub and self.span(cs, ce)
+        if not span:
+            return sub in remove_tags_re.sub('', self.item[cs:ce])
+        try:
+            found = self.found[sub]
+        except KeyError:
+            found, text, i = [], self.text, self.text.find(sub)
+            while i >= 0:
+                found.append(i)
+                i = text.find(sub, i + 1)
+            self.found[sub] = found
+        i = bisect_left(found, span[0])
+        return i < len(found) and found[i] + len(sub) <= span[1]
+
+
+def text_projection(item):
+    r"""Returns text projection of `item` (cached), see TextProjection."""
+    proj = _text_cache.get(id(item))
+    if proj is not None and proj.item is item:
+        return proj
+    if len(_text_cache) >= TEXT_CACHE_SIZE:
+        _text_cache.popitem(last=False)
+    proj = _text_cache[id(item)] = TextProjection(item)
+    return proj
 
 
 class DomMatch(namedtuple('DomMatch', ['attrs', 'content'])):
@@ -206,6 +325,8 @@ class ItemSource(Enum):
     Content = 0
     #: After part of previous source item is used for ``Node''.
     After = 1
+    #: Following siblings of ``Node'' (in the same parent), the node item is used, no copy.
+    Siblings = 2
 
 
 class ResultParam(object):
@@ -226,6 +347,16 @@ class ResultParam(object):
     nodefilter : callable or None
         Filter found nodes: nodefilter(node) -> bool.
         If filter function returns False node will be skipped.
+    columnar : bool, default False
+        If true dom_search() returns Columns (one lazy column per `args` item).
+        Options `separate`, `missing` and `sync` are ignored.
+    limit : int or None
+        Max number of found nodes in every HTML part. Scanning stops
+        after `limit` nodes if it's possible.
+    values : callable or None
+        Compiled extractor: values(node) -> list of `args` values (None for
+        missing attribute), used instead of `args` if missing attributes
+        are not skipped (see mcodegen).
     """
     def __init__(self, args,
                  separate=False,
@@ -233,7 +364,10 @@ class ResultParam(object):
                  sync=False,
                  nodefilter=None,
                  position=TagPosition.Any,
-                 source=ItemSource.Content):
+                 source=ItemSource.Content,
+                 columnar=False,
+                 limit=None,
+                 values=None):
         self.args = args
         self.separate = separate
         self.missing = missing
@@ -241,6 +375,10 @@ class ResultParam(object):
         self.nodefilter = nodefilter
         self.position = position
         self.source = source
+        self.columnar = columnar
+        self.limit = limit
+        self.values = values
+        self._compiled = None  # compiled `args`, set by dom_search()
 
 
 def aWord(s):
@@ -338,7 +476,7 @@ def find_node(name, match, item, ms, me):
     item[ts:te] -- whole tag, outerHTML
     """
     # Recover tag name (important for "*")
-    r = re.match(pats.getTag, match, re.DOTALL)
+    r = getTag_re.match(match)
     tag = r.group(1) if r else name or '[\w-]+'
     # <tag/> has no content
     if match.endswith('/>'):
@@ -349,13 +487,13 @@ def find_node(name, match, item, ms, me):
     #for r in re.compile(pats.openCloseTag, re.DOTALL).finditer(item, me):
     #for r in regs.openCloseTag.finditer(item, me):
     for r in openCloseTag_re.finditer(item, me):
-        d = r.groupdict()
-        if d['beg']:
-            tag_stack.append(d['beg'])
-        elif d['end']:
+        if r.lastgroup == 'beg':
+            tag_stack.append(r.group('beg'))
+        else:
+            end = r.group('end')
             while tag_stack:
                 last = tag_stack.pop()
-                if last == d['end']:
+                if last == end:
                     break
             if not tag_stack:
                 ce, ee = r.start(), r.end()
@@ -363,6 +501,77 @@ def find_node(name, match, item, ms, me):
     return tag, ms, me, ce, ee
 
 
+#: All attributes regex, see Node.attrs.
+attrs_re = re.compile(r'\s+{askAttrName}{askAttrVal}'.format(**pats), re.DOTALL)
+
+#: All attributes with node separator (zero char) regex, see Node.parse_attrs().
+attrs_sep_re = re.compile(r'(\x00)|\s+{askAttrName}{askAttrVal}'.format(**pats), re.DOTALL)
+
+#: Attribute value pattern (after attribute name), see attr_value_re().
+attrValue_pat = r'''(?:=(?:([^\s/>'"]+)|"([^"]*?)"|'([^']*?)'))?'''
+
+#: Interned attribute names (lower case).
+_attr_names = {}
+
+#: Attributes with interned values (tokens).
+_interned_values = frozenset(('class', 'rel', 'type'))
+
+
+def _attr_name(attr):
+    r"""Helper. Returns interned lower case attribute name."""
+    try:
+        return _attr_names[attr]
+    except KeyError:
+        pass
+    if len(_attr_names) > 10000:
+        _attr_names.clear()
+    name = _attr_names[attr] = intern_str(attr.lower())
+    return name
+
+
+def _attrs_dict(found):
+    r"""Helper. Make attributes dict from attrs_re found (attr, val1, val2, val3) list."""
+    attrs = {}
+    for attr, a, b, c in found:
+        attr = _attr_name(attr)
+        attrs[attr] = intern_str(a or b or c) if attr in _interned_values else a or b or c
+    return attrs
+
+
+#: Cache of single attribute regex.
+_attr_value_re_cache = {}
+
+
+def attr_value_re(name):
+    r"""Helper. Returns regex to find attribute `name` in tag string, see attr_value()."""
+    try:
+        return _attr_value_re_cache[name]
+    except KeyError:
+        pass
+    # all attributes are matched (values are skipped), but only `name` is captured
+    rx = _attr_value_re_cache[name] = re.compile(r'\s+(?:({})(?![\w-])|[\w-]+){}'.format(re.escape(name),
+                                                                                        attrValue_pat),
+                                                 re.DOTALL | re.IGNORECASE)
+    return rx
+
+
+def attr_value(rx, tagstr, default=None):
+    r"""Helper. Returns attribute value (found by `rx`) from tag string or `default`."""
+    val = default
+    for hit, a, b, c in rx.findall(tagstr):
+        if hit:
+            val = a or b or c  # the last one wins, like in Node.attrs
+    return val
+
+
+def _node_restore(cls, item, ts, cs, ce, te, tagstr=None):
+    r"""Helper. Restore pickled Node (see Node.__reduce__)."""
+    node = cls.__new__(cls)
+    Node.__init__(node, item[ts:cs] if tagstr is None else tagstr, item=item, tagindex=(ts, cs))
+    node.ce, node.te = ce, te
+    return node
+
+
 class Node(object):
     r"""
     XML/HTML simplified node. Without structure.
@@ -377,7 +586,7 @@ class Node(object):
 
     __slots__ = ('ts', 'cs', 'ce', 'te',
                  'item', '__name', 'tagstr',
-                 '__attrs',
+                 '__attrs', '__tokens',
                  #'__content',
                  #'__vals',
                  )
@@ -388,6 +597,7 @@ class Node(object):
         self.item = item or ''
         self.__name = None
         self.__attrs = None
+        self.__tokens = None
         if tagindex is not None:
             self.ts, self.cs = tagindex
 
@@ -440,12 +650,59 @@ class Node(object):
     def attrs(self):
         r"""Returns parsed attributes."""
         if self.__attrs is None:
-            self.__attrs =  dict((attr.lower(), a or b or c) \
-                                 for attr, a, b, c in \
-                                 re.findall(r'\s+{askAttrName}{askAttrVal}'.format(**pats),
-                                            self.tagstr, re.DOTALL))
+            self.__attrs = _attrs_dict(attrs_re.findall(self.tagstr))
         return self.__attrs
 
+    def get_attr(self, name, default=None):
+        r"""
+        Returns attribute `name` value or `default` if missing.
+
+        If attributes are not parsed yet, only `name` attribute is searched.
+        Attribute name is case-insensitive.
+        """
+        if self.__attrs is not None:
+            return self.__attrs.get(name.lower(), default)
+        return attr_value(attr_value_re(name.lower()), self.tagstr, default)
+
+    def tokens(self, name):
+        r"""
+        Returns set of whitespace separated words of attribute `name` (cached).
+
+        Words are lower case (selectors are case-insensitive), empty set if
+        attribute is missing. All attributes are parsed (see attrs), filtered
+        nodes need them usually. Used by `.class`, `[attr~=val]` and `[attr|=val]`.
+        """
+        name = name.lower()
+        if self.__tokens is None:
+            self.__tokens = {}
+        else:
+            try:
+                return self.__tokens[name]
+            except KeyError:
+                pass
+        tokens = self.__tokens[name] = frozenset(self.attrs.get(name, '').lower().split())
+        return tokens
+
+    @staticmethod
+    def parse_attrs(nodes):
+        r"""Parse attributes of all `nodes` at once (one regex pass over joined tags)."""
+        nodes = [node for node in nodes if node.__attrs is None]
+        if not nodes:
+            return
+        tagstrs = [node.tagstr for node in nodes]
+        if any('\x00' in tagstr for tagstr in tagstrs):  # separator is in use, parse one by one
+            for node in nodes:
+                node.attrs
+            return
+        found = attrs_sep_re.findall('\x00'.join(tagstrs))
+        it = iter(nodes)
+        node, beg = next(it), 0
+        for i, item in enumerate(found):
+            if item[0]:  # separator, next node
+                node.__attrs = _attrs_dict(tuple(f[1:]) for f in found[beg:i])
+                node, beg = next(it), i + 1
+        node.__attrs = _attrs_dict(tuple(f[1:]) for f in found[beg:])
+
     @property
     def content(self):
         r"""Returns tag content (innerHTML)."""
@@ -465,13 +722,21 @@ class Node(object):
     @property
     def text(self):
         r"""Returns tag text only."""
-        return remove_tags_re.sub('', self.content)
+        if not self.te:
+            self._preparse()
+        return text_projection(self.item).get(self.cs, self.ce)
+
+    def contains_text(self, sub):
+        r"""True if node text contains `sub` (see TextProjection)."""
+        if not self.te:
+            self._preparse()
+        return text_projection(self.item).contains(self.cs, self.ce, sub)
 
     @property
     def name(self):
         r"""Returns tag name."""
         if self.__name is None:
-            r = re.match(pats.getTag, self.tagstr or '', re.DOTALL)
+            r = getTag_re.match(self.tagstr or '')
             if r:
                 self.__name = r.group(1)
         return self.__name or ''
@@ -494,6 +759,24 @@ class Node(object):
         return 'Node({name!r}, {attrs}, {content!r})'.format(
             name=self.name, attrs=self.attrs, content=self.content)
 
+    def __reduce__(self):
+        r"""
+        Compact pickle: item (shared by pickle memo) and offsets only.
+        Parsed name and attributes are not stored, they are parsed again on demand.
+        """
+        args = (self.__class__, self.item, self.ts, self.cs, self.ce, self.te)
+        if self.item[self.ts:self.cs] != self.tagstr:
+            args += (self.tagstr,)
+        return _node_restore, args
+
+    def detached(self):
+        r"""Returns copy of node with its outerHTML as item (doesn't hold whole page)."""
+        if not self.te:
+            self._preparse()
+        node = Node(self.tagstr, item=self.item[self.ts:self.te], tagindex=(0, self.cs - self.ts))
+        node.ce, node.te = self.ce - self.ts, self.te - self.ts
+        return node
+
     def move_to_item(self, item, off):
         r"""Low level. Move item and offsets to given part."""
         self.item = item
@@ -503,6 +786,368 @@ class Node(object):
             self.ce += off
             self.te += off
 
+    def _view(self, item, ts, cs, ce, te):
+        r"""Low level. Reuse node (flyweight) as view of other node, see NodeList."""
+        self.item, self.tagstr = item, item[ts:cs]
+        self.ts, self.cs, self.ce, self.te = ts, cs, ce, te
+        self.__name = self.__attrs = self.__tokens = None
+        return self
+
+
+def _nodelist_restore(cls, item, ts, cs, ce, te):
+    r"""Helper. Restore pickled NodeList (see NodeList.__reduce__)."""
+    return cls._from_lists(item, ts, cs, ce, te)
+
+
+class NodeList(Sequence):
+    r"""
+    Compact list of nodes found in one item.
+
+    Node offsets (ts, cs, ce, te, see find_node()) are kept in arrays,
+    tag strings are not copied (tag is `item[ts:cs]`). Node objects are
+    created only on indexing or iteration.
+
+    Parameters
+    ----------
+    item : str
+        Original HTML string or HTML part string, where nodes are found.
+    spans : iterable of (int, int) or None
+        Tag spans (ts, cs) of found nodes.
+
+    Closing tags are found on demand, ce and te are zero if not found yet.
+    """
+
+    __slots__ = ('item', 'ts', 'cs', 'ce', 'te')
+
+    def __init__(self, item='', spans=None):
+        spans = list(spans or ())
+        self.item = item
+        self.ts = array(OFFSET_TYPECODE, [s[0] for s in spans])
+        self.cs = array(OFFSET_TYPECODE, [s[1] for s in spans])
+        self.ce = array(OFFSET_TYPECODE, [0]) * len(spans)
+        self.te = array(OFFSET_TYPECODE, [0]) * len(spans)
+
+    def append(self, ts, cs, ce=0, te=0):
+        r"""Append node by tag offsets."""
+        self.ts.append(ts)
+        self.cs.append(cs)
+        self.ce.append(ce)
+        self.te.append(te)
+
+    def __len__(self):
+        return len(self.ts)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.select(range(*index.indices(len(self))))
+        ts, cs = self.ts[index], self.cs[index]
+        node = Node(tagstr=self.item[ts:cs], item=self.item, tagindex=(ts, cs))
+        if self.te[index]:
+            node.ce, node.te = self.ce[index], self.te[index]
+        return node
+
+    def __iter__(self):
+        item, ce, te = self.item, self.ce, self.te
+        for i, (ts, cs) in enumerate(zip(self.ts, self.cs)):
+            node = Node(tagstr=item[ts:cs], item=item, tagindex=(ts, cs))
+            if te[i]:
+                node.ce, node.te = ce[i], te[i]
+            yield node
+
+    def __eq__(self, other):
+        if isinstance(other, NodeList):
+            return self.item == other.item and self.ts == other.ts
+        if isinstance(other, (list, tuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(other, self))
+        return NotImplemented
+
+    def __ne__(self, other):
+        eq = self.__eq__(other)
+        return eq if eq is NotImplemented else not eq
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'NodeList({})'.format(list(self))
+
+    def resolve(self, index):
+        r"""Find closing tag of node `index` if not found yet. Returns (ts, cs, ce, te)."""
+        if not self.te[index]:
+            ts, cs = self.ts[index], self.cs[index]
+            _, _, _, self.ce[index], self.te[index] = find_node(None, self.item[ts:cs], self.item, ts, cs)
+        return self.ts[index], self.cs[index], self.ce[index], self.te[index]
+
+    def tagstr(self, index):
+        r"""Returns tag string of node `index`."""
+        return self.item[self.ts[index]:self.cs[index]]
+
+    def content(self, index):
+        r"""Returns content (innerHTML) of node `index`."""
+        ts, cs, ce, te = self.resolve(index)
+        return self.item[cs:ce]
+
+    def outer_html(self, index):
+        r"""Returns outerHTML of node `index`."""
+        ts, cs, ce, te = self.resolve(index)
+        return self.item[ts:te]
+
+    def text(self, index):
+        r"""Returns text (without tags) of node `index`."""
+        ts, cs, ce, te = self.resolve(index)
+        return text_projection(self.item).get(cs, ce)
+
+    def tagstrs(self):
+        r"""Returns list of tag strings."""
+        return [self.tagstr(i) for i in range(len(self))]
+
+    def contents(self):
+        r"""Returns list of contents (innerHTML)."""
+        return [self.content(i) for i in range(len(self))]
+
+    def outer_htmls(self):
+        r"""Returns list of outerHTML."""
+        return [self.outer_html(i) for i in range(len(self))]
+
+    def texts(self):
+        r"""Returns list of texts (without tags)."""
+        return [self.text(i) for i in range(len(self))]
+
+    def select(self, indexes):
+        r"""Returns new NodeList with nodes `indexes` only."""
+        indexes = list(indexes)
+        return self._from_lists(self.item, *([arr[i] for i in indexes]
+                                             for arr in (self.ts, self.cs, self.ce, self.te)))
+
+    def filter(self, nodefilter):
+        r"""
+        Returns new NodeList with nodes where nodefilter(node) is true.
+
+        The only one Node object (flyweight view) is used for all nodes,
+        so `nodefilter` can NOT keep the node.
+        """
+        view, item, keep = Node(''), self.item, []
+        for i, (ts, cs, te) in enumerate(zip(self.ts, self.cs, self.te)):
+            if nodefilter(view._view(item, ts, cs, self.ce[i], te)):
+                if view.te and not te:   # closing tag could be found by filter
+                    self.ce[i], self.te[i] = view.ce, view.te
+                keep.append(i)
+        return self.select(keep)
+
+    @classmethod
+    def _from_lists(cls, item, ts, cs, ce, te):
+        r"""Helper. Create NodeList from offset lists."""
+        nodes = cls(item)
+        nodes.ts, nodes.cs = array(OFFSET_TYPECODE, ts), array(OFFSET_TYPECODE, cs)
+        nodes.ce, nodes.te = array(OFFSET_TYPECODE, ce), array(OFFSET_TYPECODE, te)
+        return nodes
+
+    def __reduce__(self):
+        r"""Compact pickle: item and offset arrays."""
+        return _nodelist_restore, (self.__class__, self.item, self.ts, self.cs, self.ce, self.te)
+
+    def detached(self):
+        r"""Returns copy with item cut to found nodes only (doesn't hold whole page)."""
+        if not len(self):
+            return NodeList()
+        for i in range(len(self)):
+            self.resolve(i)
+        beg, end = min(self.ts), max(self.te)
+        return self._from_lists(self.item[beg:end], *([v - beg for v in arr]
+                                                      for arr in (self.ts, self.cs, self.ce, self.te)))
+
+    @classmethod
+    def from_nodes(cls, item, nodes):
+        r"""Create NodeList from list of Node (all nodes have to be in the same `item`)."""
+        return cls._from_lists(item, [n.ts for n in nodes], [n.cs for n in nodes],
+                               [n.ce for n in nodes], [n.te for n in nodes])
+
+
+class Column(Sequence):
+    r"""
+    Single column of Columns result. Values are decoded on demand.
+
+    Parameters
+    ----------
+    columns : Columns
+        Parent columnar result.
+    ritem : Result or str
+        Requested item (Result or attribute name).
+    """
+
+    __slots__ = ('columns', 'ritem', 'name', '_get')
+
+    def __init__(self, columns, ritem):
+        self.columns = columns
+        self.ritem = ritem
+        self.name = Column.names.get(ritem, ritem)
+        getter = Column.getters.get(ritem)
+        if getter is None:  # attribute
+            if isinstance(ritem, base_str) and ritem == ritem.lower():
+                # only this attribute is parsed (like in msearch._compile_ret())
+                rx = attr_value_re(ritem)
+                getter = lambda nodes, i: attr_value(rx, nodes.tagstr(i))
+            else:
+                # the same like row results, Node.attrs has lower case names
+                getter = lambda nodes, i: nodes[i].attrs.get(ritem)
+        self._get = getter
+
+    #: Column names for results.
+    names = {
+        Result.Content:   'content',
+        Result.Node:      'node',
+        Result.Text:      'text',
+        Result.OuterHTML: 'outerHTML',
+        Result.DomMatch:  'DomMatch',
+        Result.NoResult:  'none',
+    }
+
+    #: Value getters for results: getter(nodelist, index).
+    getters = {
+        Result.Content:   lambda nodes, i: nodes.content(i),
+        Result.Text:      lambda nodes, i: nodes.text(i),
+        Result.OuterHTML: lambda nodes, i: nodes.outer_html(i),
+        Result.Node:      lambda nodes, i: nodes[i],
+        Result.DomMatch:  lambda nodes, i: DomMatch(nodes[i].attrs, nodes.content(i)),
+        Result.NoResult:  lambda nodes, i: NoResult(),
+    }
+
+    #: JSON value getters for results which are not JSON types, see Columns.to_jsonl().
+    json_getters = {
+        Result.Node:      lambda nodes, i: nodes.outer_html(i),
+        Result.DomMatch:  lambda nodes, i: {'attrs': nodes[i].attrs, 'content': nodes.content(i)},
+        Result.NoResult:  lambda nodes, i: None,
+    }
+
+    def __len__(self):
+        return len(self.columns)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        for nodes in self.columns.parts:
+            if index < len(nodes):
+                return self._get(nodes, index)
+            index -= len(nodes)
+        raise IndexError('Column index out of range')
+
+    def __iter__(self):
+        get = self._get
+        for nodes in self.columns.parts:
+            for i in range(len(nodes)):
+                yield get(nodes, i)
+
+    def values(self):
+        r"""Returns list of all column values."""
+        return list(self)
+
+    def __repr__(self):
+        return 'Column({!r}, {})'.format(self.name, len(self))
+
+
+class Columns(object):
+    r"""
+    Columnar result of dom_search(), see ResultParam(columnar=True).
+
+    One column per requested item (attribute or Result). All columns share
+    node offsets (NodeList per HTML part), values are decoded on demand.
+
+    Parameters
+    ----------
+    parts : list of NodeList
+        Found nodes for every HTML part.
+    ret : list
+        Requested items (Result or attribute name).
+    """
+
+    __slots__ = ('parts', 'columns')
+
+    def __init__(self, parts, ret):
+        self.parts = parts
+        self.columns = [Column(self, ritem) for ritem in ret]
+
+    def __reduce__(self):
+        r"""Compact pickle: parts (NodeList) and requested items."""
+        return Columns, (self.parts, [col.ritem for col in self.columns])
+
+    def detached(self):
+        r"""Returns copy with HTML parts cut to found nodes only."""
+        return Columns([nodes.detached() for nodes in self.parts], [col.ritem for col in self.columns])
+
+    @property
+    def names(self):
+        r"""Column names."""
+        return [col.name for col in self.columns]
+
+    def __len__(self):
+        r"""Number of rows."""
+        return sum(len(nodes) for nodes in self.parts)
+
+    def __getitem__(self, key):
+        r"""Returns column by index or by name."""
+        if isinstance(key, base_str):
+            for col in self.columns:
+                if col.name == key:
+                    return col
+            raise KeyError(key)
+        return self.columns[key]
+
+    def __iter__(self):
+        r"""Iterate over rows (lists of values)."""
+        getters = [col._get for col in self.columns]
+        for nodes in self.parts:
+            for i in range(len(nodes)):
+                yield [get(nodes, i) for get in getters]
+
+    def __repr__(self):
+        return 'Columns({}, rows={})'.format(self.names, len(self))
+
+    def to_rows(self):
+        r"""Returns list of rows (list of values), like dom_search() with list `ret`."""
+        return list(self)
+
+    def to_jsonl(self, fp, ensure_ascii=False):
+        r"""
+        Write rows as JSON Lines (one JSON object per row) into `fp`.
+
+        Row dicts are not created, JSON object is formatted directly.
+        Node is written as its outerHTML, DomMatch as `{"attrs": ..., "content": ...}`
+        and `::none` as null. Returns number of written rows.
+        """
+        dumps = json.dumps
+        keys = [dumps(name, ensure_ascii=ensure_ascii) for name in self.names]
+        getters = [Column.json_getters.get(col.ritem, col._get) for col in self.columns]
+        count = 0
+        for nodes in self.parts:
+            for i in range(len(nodes)):
+                fp.write('{' + ', '.join(k + ': ' + dumps(get(nodes, i), ensure_ascii=ensure_ascii)
+                                         for k, get in zip(keys, getters)) + '}\n')
+                count += 1
+        return count
+
+    def offsets(self, numpy=False):
+        r"""
+        Returns node offsets (index, ts, cs, ce, te) of all rows.
+
+        `index` is HTML part number (offsets are relative to its item).
+        Closing tags are resolved. If `numpy` is True NumPy arrays are
+        returned (data is not copied), else array.array.
+        """
+        index, ts, cs, ce, te = (array(OFFSET_TYPECODE) for _ in range(5))
+        for n, nodes in enumerate(self.parts):
+            for i in range(len(nodes)):
+                nodes.resolve(i)
+            index.extend(array(OFFSET_TYPECODE, [n]) * len(nodes))
+            ts.extend(nodes.ts)
+            cs.extend(nodes.cs)
+            ce.extend(nodes.ce)
+            te.extend(nodes.te)
+        if numpy:
+            import numpy as np
+            return tuple(np.frombuffer(arr, dtype='i{}'.format(arr.itemsize)) for arr in (index, ts, cs, ce, te))
+        return index, ts, cs, ce, te
+
 
 
 # -------  DOM Select -------
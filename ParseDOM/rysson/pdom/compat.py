@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+r"""
+Drop-in replacements for old parseDOM copies (mrknow, cherry), based on pdom.
+
+Signatures and result types are the same as in original functions
+(list of str or list of DOMMatch, '' on bad input), but old O(n²) search
+is replaced by pdom engine. It's opt-in, use functions directly or
+install them in old module:
+
+>>> from rysson.pdom.compat import install_cherry
+>>> install_cherry(dom_parser)
+"""
+from __future__ import absolute_import, division, unicode_literals, print_function
+
+import re
+from collections import namedtuple
+
+from .base import type_str, type_bytes
+from .base import Result, Node
+from .base import aWord
+from .base import _tostr
+from .msearch import dom_search
+from .backward import parseDOM
+
+
+#: The same as cherry.dom_parser.DomMatch.
+DOMMatch = namedtuple('DOMMatch', ['attrs', 'content'])
+
+#: Old regex type.
+re_type = type(re.compile(''))
+
+#: Tag with new line (mrknow replaces new lines in tags).
+_multiline_tag_re = re.compile('<[^>]*?\n[^>]*?>')
+
+#: Attributes like in cherry (attribute without value is skipped).
+_cherry_attr_re = re.compile(r'''\s+(?P<key>[^=]+)=\s*(?:(?P<delim>["'])(?P<value1>.*?)(?P=delim)|(?P<value2>[^"'][^>\s]*))''')
+
+
+def _html_list(html):
+    r"""Helper. Make list of str from old parseDOM input or None if input is invalid."""
+    if isinstance(html, (type_str, type_bytes)) or _is_dommatch(html):
+        html = [html]
+    elif not isinstance(html, list):
+        return None
+    return [_tostr(item.content if _is_dommatch(item) else item) for item in html]
+
+
+def _is_dommatch(obj):
+    r"""Helper. True if `obj` is any DOMMatch (cherry's, pdom, etc.)."""
+    return isinstance(obj, tuple) and hasattr(obj, 'attrs') and hasattr(obj, 'content')
+
+
+def mrknow_parseDOM(html, name='', attrs={}, ret=False):
+    r"""
+    Drop-in mrknow.parseDOM().
+
+    Returns list of tag contents, outerHTML (if `ret` is True) or attribute
+    values (if `ret` is str). Returns '' on invalid input.
+
+    Tags and attributes are matched like in pdom, mrknow quirks are not
+    emulated (only tags without attributes if any, attribute name suffix
+    and unquoted value prefix match, the first duplicated attribute, no
+    closing tag with `ret=True`). Unquoted attribute value with `/` breaks
+    the tag in pdom. See "Compatibility" in doc/en/dom.md.
+    """
+    html = _html_list(html)
+    if html is None or not name.strip():
+        return ''
+    attrs = dict(attrs) or None
+    ret_lst = []
+    for item in html:
+        if '\n' in item:
+            item = _multiline_tag_re.sub(lambda m: m.group(0).replace('\n', ' '), item)
+        if isinstance(ret, (type_str, type_bytes)):
+            # attribute values are stripped
+            ret_lst += [val.strip() for val in parseDOM(item, name, attrs, _tostr(ret))]
+        elif ret:
+            ret_lst += dom_search(item, name, attrs=attrs, ret=Result.OuterHTML)
+        else:
+            ret_lst += parseDOM(item, name, attrs)
+    return ret_lst
+
+
+def _cherry_match(value, val):
+    r"""Helper. Check attribute value like cherry does (regex, word or list of words)."""
+    if isinstance(value, re_type):
+        return value.match(val) is not None
+    if val == value:
+        return True
+    words = set(val.split(' '))
+    return set([value] if isinstance(value, (type_str, type_bytes)) else value) <= words
+
+
+def _cherry_pattern(value):
+    r"""Helper. Regex pattern to preselect tags for cherry attribute value (True if any)."""
+    if isinstance(value, (type_str, type_bytes)):
+        value = re.escape(_tostr(value))
+        return '(?:{}|{})'.format(aWord(value), value)
+    return True
+
+
+def _cherry_attrs(tagstr):
+    r"""Helper. Parse attributes like cherry does."""
+    attribs = {}
+    for match in _cherry_attr_re.finditer(tagstr):
+        value = match.group('value1')
+        if value is None:
+            value = match.group('value2')
+        if value is None:
+            continue
+        attribs[match.group('key').lower().strip()] = value
+    return attribs
+
+
+def cherry_parse_dom(html, name='', attrs=None, req=False, exclude_comments=False):
+    r"""
+    Drop-in cherry.dom_parser.parse_dom().
+
+    Returns list of DOMMatch(attrs, content) or '' on invalid input.
+    Attribute value can be regex (re.match is used), word or list of words.
+    """
+    if attrs is None:
+        attrs = {}
+    name = name.strip()
+    html = _html_list(html)
+    if html is None or not name or not isinstance(attrs, dict):
+        return ''
+    if req:
+        if not isinstance(req, list):
+            req = [req]
+        req = set(key.lower() for key in req)
+    all_results = []
+    for item in html:
+        if exclude_comments:
+            item = re.sub('<!--.*?-->', '', item, flags=re.DOTALL)
+        # find tags with attributes and check values in Python (cherry semantic)
+        sattrs = dict((key, _cherry_pattern(value)) for key, value in attrs.items()) or None
+        for node in dom_search(item, name, attrs=sattrs, ret=Node):
+            if attrs:
+                node_attrs = node.attrs
+                if not all(key.lower() in node_attrs and _cherry_match(value, node_attrs[key.lower()])
+                           for key, value in attrs.items()):
+                    continue
+            attribs = _cherry_attrs(node.tagstr)
+            if req and not req <= set(attribs.keys()):
+                continue
+            content = '' if node.tagstr.endswith('/>') else node.content.strip()
+            all_results.append(DOMMatch(attribs, content))
+    return all_results
+
+
+def install_mrknow(module):
+    r"""Replace parseDOM() in mrknow-like `module` by mrknow_parseDOM()."""
+    module.parseDOM = mrknow_parseDOM
+
+
+def install_cherry(module):
+    r"""Replace parse_dom() in cherry-like `module` (e.g. dom_parser) by cherry_parse_dom()."""
+    module.parse_dom = cherry_parse_dom
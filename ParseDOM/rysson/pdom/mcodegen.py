@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, unicode_literals, print_function
+
+from .base import Result, DomMatch, NoResult, base_str, regex
+from .mindex import struct_index, nth_ab
+from .msearch import _ritem_enum
+from .selectorparser import WordFilter
+
+
+#: Source of result extractors (without attributes), see SelectorCode.
+_result_source = {
+    Result.Node:      'node',
+    Result.Content:   'node.content',
+    Result.OuterHTML: 'node.outerHTML',
+    Result.Text:      'node.text',
+    Result.DomMatch:  'DomMatch(node.attrs, node.content)',
+    Result.NoResult:  'NoResult()',
+}
+
+#: Structural pseudo-classes: (position kind, condition or nth position expression).
+#: Kind 'c' is position among children, 't' among children of the same type.
+_struct_pseudo = {
+    'first-child':      ('c', 'cpos == 1'),
+    'last-child':       ('c', 'cpos == ccount'),
+    'only-child':       ('c', 'ccount == 1'),
+    'nth-child':        ('c', None, 'cpos'),
+    'nth-last-child':   ('c', None, 'ccount - cpos + 1'),
+    'first-of-type':    ('t', 'tpos == 1'),
+    'last-of-type':     ('t', 'tpos == tcount'),
+    'only-of-type':     ('t', 'tcount == 1'),
+    'nth-of-type':      ('t', None, 'tpos'),
+    'nth-last-of-type': ('t', None, 'tcount - tpos + 1'),
+}
+
+class SelectorCode(object):
+    r"""
+    Python code generated for single selector (see selector_code()).
+
+    Node filters (`.class` words, :contains(), structural pseudo-classes, etc.)
+    and result extractors are inlined into two plain functions, source is
+    compiled once. Filters without inline form (e.g. :not(), :has()) are
+    called directly.
+
+    Attributes
+    ----------
+    source : str
+        Generated Python source (for debugging).
+    nodefilter : callable or None
+        nodefilter(node) -> bool, None if selector has no filters.
+    values : callable or None
+        values(node) -> list of requested values (None for missing attribute),
+        None if selector has no results.
+    """
+
+    __slots__ = ('source', 'nodefilter', 'values')
+
+    def __init__(self, source, nodefilter, values):
+        self.source = source
+        self.nodefilter = nodefilter
+        self.values = values
+
+    def __repr__(self):
+        return 'SelectorCode({!r})'.format(self.source)
+
+
+class _CodeWriter(object):
+    r"""Helper. Collects generated lines and constants (values used by generated code)."""
+
+    def __init__(self):
+        self.lines = []
+        self.consts = {}
+
+    def const(self, value, prefix='c'):
+        name = '_{}{}'.format(prefix, len(self.consts))
+        self.consts[name] = value
+        return name
+
+    def add(self, line, indent=1):
+        self.lines.append('    ' * indent + line)
+
+    def fail_unless(self, cond):
+        self.add('if not ({}):'.format(cond))
+        self.add('return False', 2)
+
+
+def _nth_cond(w, pos, value):
+    r"""Helper. Returns condition for `an+b` expression `value` on position expression `pos`."""
+    a, b = nth_ab(value)
+    if not a:
+        return '{} == {}'.format(pos, b)
+    w.add('k = {} - {}'.format(pos, b))
+    return 'k % {a} == 0 and k // {a} >= 0'.format(a=a)
+
+
+def _filter_source(w, sel):
+    r"""Helper. Write body of nodefilter() for selector `sel`."""
+    struct = set()  # already computed positions
+    for f, key in zip(sel.nodefilterlist, sel.filterkeys):
+        name, args = key[0], key[1]
+        if isinstance(f, WordFilter):
+            for attr, words, starts in f.checks:
+                w.add('words = node.tokens({!r})'.format(attr))
+                if words:
+                    w.fail_unless('{} <= words'.format(w.const(words, 'w')))
+                for s in starts:
+                    w.fail_unless('any(t.startswith({!r}) for t in words)'.format(s))
+        elif name in _struct_pseudo and (len(_struct_pseudo[name]) == 2 or len(args) == 1):
+            kind, cond = _struct_pseudo[name][:2]
+            if not struct:
+                w.add('index = struct_index(node.item)')
+                w.add('e = index.elems.get(node.ts)')
+                w.add('if e is None:')
+                w.add('return False', 2)
+            if kind not in struct:
+                if kind == 'c':
+                    w.add('cpos, ccount = e[1], index.count[e[0]]')
+                else:
+                    w.add('tpos, tcount = e[2], index.type_count[e[0], e[3]]')
+                struct.add(kind)
+            if cond is None:
+                cond = _nth_cond(w, _struct_pseudo[name][2], args[0])
+            w.fail_unless(cond)
+        elif name == 'contains' and len(args) == 1:
+            w.fail_unless('node.contains_text({!r})'.format(args[0]))
+        elif name == 'content-contains' and len(args) == 1:
+            w.fail_unless('{!r} in node.content'.format(args[0]))
+        elif name == 'regex' and len(args) == 1:
+            w.fail_unless('{}.search(node.outerHTML)'.format(w.const(regex(args[0]), 'r')))
+        elif name == 'empty':
+            w.fail_unless('not node.content.strip()')
+        else:
+            # no inline form (:not(), :has()), call filter
+            w.fail_unless('{}(node)'.format(w.const(f, 'f')))
+    w.add('return True')
+
+
+def _values_source(w, sel):
+    r"""Helper. Write body of values() for selector `sel`."""
+    ret = [_ritem_enum(ritem) for ritem in sel.result]
+    attrs = sum(1 for ritem in ret if ritem not in _result_source)
+    parts = []
+    for ritem in ret:
+        try:
+            parts.append(_result_source[ritem])
+        except (KeyError, TypeError):  # attribute, like in _compile_ret()
+            if Result.DomMatch not in ret and attrs == 1 and isinstance(ritem, base_str) and ritem == ritem.lower():
+                parts.append('node.get_attr({!r})'.format(ritem))  # only this attribute is parsed
+            else:
+                parts.append('node.attrs.get({!r})'.format(ritem))
+    w.add('return [{}]'.format(', '.join(parts)))
+
+
+def selector_code(sel):
+    r"""
+    Returns SelectorCode for Selector `sel` (cached in selector).
+
+    Generated source is available as `selector_code(sel).source`,
+    see also CompiledSelector.source().
+    """
+    if sel._code is not None:
+        return sel._code
+    w = _CodeWriter()
+    w.lines.append('# tag: {!r}, filters: {}, results: {}'.format(
+        sel.tag or '*', ', '.join(key[0] for key in sel.filterkeys) or '-',
+        ', '.join(getattr(ritem, 'name', ritem) for ritem in sel.result) or '-'))
+    if sel.nodefilterlist:
+        w.lines.append('def nodefilter(node):')
+        _filter_source(w, sel)
+    if sel.result:
+        w.lines.append('def values(node):')
+        _values_source(w, sel)
+    source = '\n'.join(w.lines) + '\n'
+    ns = dict(w.consts, struct_index=struct_index, DomMatch=DomMatch, NoResult=NoResult)
+    exec(compile(source, '<pdom-selector>', 'exec'), ns)
+    code = sel._code = SelectorCode(source, ns.get('nodefilter'), ns.get('values'))
+    return code
@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, unicode_literals, print_function
+
+import re
+import sys
+from timeit import default_timer as _timer
+
+from . import base as _base
+from . import mselect as _mselect
+from .base import Result, TagPosition, ItemSource, Node, regex
+from .base import _tostr, _make_html_list, isrealsequence, aContains
+from .selectorparser import parse as parse_selector
+from .selectorparser import Selector, SelectorPath, OrderedSetSelector, SetSelector
+from .selectorparser import WordFilter, NotFilter
+from .mselect import compile_selector, _select_group, _fused_plan, _union_plan, _path_trie
+from .mcodegen import _struct_pseudo
+
+
+def _combinator(sel):
+    r"""Helper. Path combinator of selector `sel` (' ', '>', '+' or '~')."""
+    if sel.item_source == ItemSource.Siblings:
+        return '+' if sel.elem_pos == TagPosition.FirstOnly else '~'
+    if sel.elem_pos == TagPosition.RootLevel:
+        return '>'
+    return ' '
+
+
+#: Result pseudo-elements names.
+_result_names = {
+    Result.Node:      'node',
+    Result.Content:   'content',
+    Result.OuterHTML: 'outerHTML',
+    Result.Text:      'text',
+    Result.DomMatch:  'DomMatch',
+    Result.NoResult:  'none',
+}
+
+
+def _result_str(result):
+    r"""Helper. Results as pseudo-elements, e.g. `::text::attr(href, title)`."""
+    out, attrs = [], []
+    for ritem in result:
+        if ritem in _result_names:
+            out.append('::' + _result_names[ritem])
+        else:
+            attrs.append('{}'.format(ritem))
+    if attrs:
+        out.append('::attr({})'.format(', '.join(attrs)))
+    return ''.join(out)
+
+
+def selector_str(sel):
+    r"""
+    Returns readable form of single Selector `sel` (without combinator).
+
+    Attribute values are shown as scan regexes, words as one word set check
+    (their scan prefilters are omitted), e.g. `a[href].x:first-child::text{limit=1}`.
+    """
+    out = [sel.tag or '*']
+    prefilters = set()  # scan prefilters of words, see SelectorBuilder._compile_words()
+    for f in sel.nodefilterlist:
+        if isinstance(f, WordFilter):
+            for attr, words, starts in f.checks:
+                prefilters.add((attr, True))
+                prefilters.update((attr, aContains(re.escape(w))) for w in words | set(starts))
+    for attr, vals in sorted(sel.attrs.items()):
+        for val in vals:
+            if (attr, val) not in prefilters:
+                out.append('[{}]'.format(attr) if val is True else '[{}={!r}]'.format(attr, val))
+    for f, key in zip(sel.nodefilterlist, sel.filterkeys):
+        if isinstance(f, WordFilter):
+            for attr, words, starts in f.checks:
+                if attr == 'class':
+                    out.extend('.{}'.format(w) for w in sorted(words))
+                else:
+                    out.extend('[{}~={}]'.format(attr, w) for w in sorted(words))
+                out.extend('[{}|={}]'.format(attr, s) for s in sorted(starts))
+        elif isinstance(f, NotFilter):
+            out.append(':not({})'.format(selector_str(f.sel)))
+        elif key[1]:
+            out.append(':{}({})'.format(key[0], ', '.join('{}'.format(a) for a in key[1])))
+        else:
+            out.append(':{}'.format(key[0]))
+    out.append(_result_str(sel.result))
+    if sel.nth is not None:
+        out.append(':{}'.format(sel.nth))
+    if sel.optional:
+        out.append('?')
+    if sel.limit is not None:
+        out.append('{{limit={}}}'.format(sel.limit))
+    return ''.join(out)
+
+
+def selector_tree(group, indent=0):
+    r"""
+    Returns lines of parsed selector `group` tree (GroupSelector, path or set).
+
+    Every path step is one line with its combinator, e.g.
+
+        path
+          div
+          > a.x::attr(href)
+    """
+    lines = []
+    pad = '  ' * indent
+    for item in group:
+        if isinstance(item, Selector):
+            comb = _combinator(item)
+            lines.append(pad + (selector_str(item) if comb == ' ' else '{} {}'.format(comb, selector_str(item))))
+        else:
+            name = 'path' if isinstance(item, SelectorPath) else \
+                'ordered set' if isinstance(item, OrderedSetSelector) else \
+                'set' if isinstance(item, SetSelector) else item.__class__.__name__
+            lines.append(pad + name)
+            lines.extend(selector_tree(item, indent + 1))
+    return lines
+
+
+def _step_strategy(sel):
+    r"""Helper. How single step `sel` is evaluated (short description)."""
+    if sel.item_source == ItemSource.Siblings:
+        out = ['index lookup ({})'.format('next sibling' if sel.elem_pos == TagPosition.FirstOnly else 'siblings')]
+    elif sel.elem_pos == TagPosition.RootLevel:
+        out = ['root-level scan']
+    else:
+        out = ['regex scan']
+    if sel.limit is not None:
+        out.append('stop after {}'.format(sel.limit))
+    names = [key[0] for key in sel.filterkeys]
+    if any(name in _struct_pseudo or name == 'has' for name in names):
+        out.append('structural index')
+    if any(name in ('contains', 'text') for name in names) or Result.Text in sel.result:
+        out.append('text projection')
+    return ', '.join(out)
+
+
+def _group_strategy(group, grouped=True):
+    r"""Helper. How group selector is evaluated (the same order like in _select_group())."""
+    if _fused_plan(group) is not None:
+        return 'fused regex (attribute values are captured by one scan, no Node, no closing tags)'
+    union = None if grouped else _union_plan(group)
+    if union is not None:
+        return 'union scan ({} paths in one regex{})'.format(
+            len(union.members), ', shared prefix of {} steps'.format(len(union.prefix)) if union.prefix else '')
+    if _path_trie(group).shared:
+        return 'shared prefix (common steps of {} paths are evaluated once)'.format(len(group))
+    return 'path by path' if len(group) > 1 else 'single path'
+
+
+class _Step(object):
+    r"""Helper. Plan step (single selector) and its statistics, see explain()."""
+
+    __slots__ = ('sel', 'text', 'calls', 'parts', 'bytes', 'estimated', 'found', 'closing', 'time')
+
+    def __init__(self, sel, text):
+        self.sel = sel
+        self.text = text
+        self.calls = self.parts = self.bytes = self.estimated = self.found = self.closing = 0
+        self.time = 0.0
+
+
+def _plan_steps(group, indent=0):
+    r"""Helper. Returns list of _Step for every selector in `group` (the same order like selector_tree())."""
+    steps = []
+    pad = '  ' * indent
+    for item in group:
+        if isinstance(item, Selector):
+            comb = _combinator(item)
+            steps.append(_Step(item, pad + (selector_str(item) if comb == ' '
+                                            else '{} {}'.format(comb, selector_str(item)))))
+        else:
+            if not isinstance(item, SelectorPath):
+                steps.append(_Step(None, pad + ('ordered set' if isinstance(item, OrderedSetSelector) else 'set')))
+            steps.extend(_plan_steps(item, indent + 1 if not isinstance(item, SelectorPath) else indent))
+    return steps
+
+
+def _parts(html, source):
+    r"""Helper. Generate HTML parts (str) of dom_search() input, nested sequences are flattened."""
+    for item in _make_html_list(html):
+        if isrealsequence(item):
+            for part in _parts(item, source):
+                yield part
+        elif source == ItemSource.Siblings and isinstance(item, Node):
+            continue  # found in structural index, nothing is scanned
+        elif item is not None and item is not Result.RemoveItem:
+            yield _tostr(item, source=source)
+
+
+def _found(res):
+    r"""Helper. Number of nodes in dom_search() result."""
+    if isinstance(res, tuple):  # separate results: (values, nodes)
+        res = res[1]
+    count = 0
+    for r in res:
+        if isrealsequence(r) and not isinstance(r, Node):
+            count += _found(r)
+        elif r is not None and r is not Result.RemoveItem and r != [None]:
+            count += 1
+    return count
+
+
+#: Tag start pattern (any tag), for estimated candidates.
+_any_tag_re = re.compile(r'<[a-zA-Z]')
+
+
+class _Tracer(object):
+    r"""
+    Helper. Collects statistics of plan steps while selector runs.
+
+    dom_search() (used by every step in mselect) and find_node() (closing tags)
+    are replaced by counting wrappers, see run(). Closing tags are counted
+    in the step, which resolved them (Node content is resolved on demand).
+    """
+
+    def __init__(self, steps):
+        self.steps = [step for step in steps if step.sel is not None]
+        self.current = None
+        self.closing = 0
+
+    def step(self, ret):
+        r"""Returns step for ResultParam `ret` (kept in selector, see _selector_param())."""
+        for step in self.steps:
+            if any(param is ret for param in step.sel._params.values()):
+                return step
+
+    def dom_search(self, html, name=None, attrs=None, ret=None, exclude_comments=False):
+        step, outer = self.step(ret), self.current
+        self.current = step
+        closing = self.closing
+        t = _timer()
+        try:
+            res = self._dom_search(html, name, attrs, ret, exclude_comments)
+        finally:
+            elapsed = _timer() - t
+            self.current = outer
+        if step is not None:
+            step.calls += 1
+            step.time += elapsed
+            step.closing += self.closing - closing
+            step.found += _found(res)
+            name = _tostr(name).strip()
+            rx = _any_tag_re if not name or name == '*' else \
+                regex(r'<(?:{})(?=[\s/>])'.format(name), re.IGNORECASE)
+            for part in _parts(html, getattr(ret, 'source', ItemSource.Content)):
+                step.parts += 1
+                step.bytes += len(part)
+                step.estimated += sum(1 for _ in rx.finditer(part))
+        return res
+
+    def find_node(self, *args):
+        self.closing += 1
+        return self._find_node(*args)
+
+    def run(self, html, group, grouped=True):
+        r"""Run `group` selector on `html`, returns (results, elapsed time)."""
+        self._dom_search, self._find_node = _mselect.dom_search, _base.find_node
+        _mselect.dom_search, _base.find_node = self.dom_search, self.find_node
+        try:
+            t = _timer()
+            res = _select_group([], _make_html_list(html), group, grouped=grouped)
+            return res, _timer() - t
+        finally:
+            _mselect.dom_search, _base.find_node = self._dom_search, self._find_node
+
+
+def explain(selector, html=None, file=None, grouped=True):
+    r"""
+    Print how selector is parsed, optimized and evaluated (query plan).
+
+    Parsed tree ("before"), optimized tree ("after", used by dom_select())
+    and names of applied rewrite rules (see moptimize.optimize()) are printed.
+    Then the plan: group strategy (fused regex, union scan, shared prefix,
+    path by path) and strategy of every step (regex scan, root-level scan,
+    index lookup, ...).
+
+    If `html` is given, selector runs on it and for every step is printed:
+    number of calls, scanned HTML parts and bytes, estimated candidates (tags
+    with the step name in scanned parts), found nodes, resolved closing tags
+    and time.
+
+    Parameters
+    ----------
+    selector : str or CompiledSelector
+        Selector, see dom_select().
+    html : str or list of str or None
+        HTML to run selector on.
+    file : file-like or None
+        Output stream, default is `sys.stdout`.
+    grouped : bool, default True
+        Group selector mode, see dom_select().
+    """
+    if file is None:
+        file = sys.stdout
+    compiled = compile_selector(selector)
+    print('selector: {}'.format(compiled.selector), file=file)
+    print('before:', file=file)
+    for line in selector_tree(parse_selector(compiled.selector), 1):
+        print(line, file=file)
+    print('after:', file=file)
+    for line in selector_tree(compiled.group, 1):
+        print(line, file=file)
+    print('rules: {}'.format(', '.join(compiled.rules) or '-'), file=file)
+    group = compiled.group
+    steps = _plan_steps(group)
+    print('plan: {}'.format(_group_strategy(group, grouped)), file=file)
+    width = max(len(step.text) for step in steps)
+    if html is None:
+        for step in steps:
+            print('  {:{w}}  {}'.format(step.text, _step_strategy(step.sel) if step.sel else '', w=width), file=file)
+        return
+    tracer = _Tracer(steps)
+    res, elapsed = tracer.run(html, group, grouped)
+    print('  {:{w}}  {:>5} {:>5} {:>9} {:>7} {:>7} {:>7} {:>9}  {}'.format(
+        'step', 'calls', 'parts', 'bytes', 'est', 'found', 'closing', 'time [ms]', 'strategy', w=width), file=file)
+    for step in steps:
+        if step.sel is None:
+            print('  {}'.format(step.text), file=file)
+        elif not step.calls:
+            print('  {:{w}}  {:>5} {:>5} {:>9} {:>7} {:>7} {:>7} {:>9}  {}'.format(
+                step.text, '-', '-', '-', '-', '-', '-', '-', _step_strategy(step.sel), w=width), file=file)
+        else:
+            print('  {:{w}}  {:>5} {:>5} {:>9} {:>7} {:>7} {:>7} {:>9.3f}  {}'.format(
+                step.text, step.calls, step.parts, step.bytes, step.estimated, step.found, step.closing,
+                step.time * 1000, _step_strategy(step.sel), w=width), file=file)
+    print('total: {} results, {} closing tags, {:.3f} ms'.format(len(res), tracer.closing, elapsed * 1000), file=file)
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, unicode_literals, print_function
+
+import re
+from collections import OrderedDict
+
+from .base import pats
+
+
+#: Max number of cached indexes (one per HTML part), see struct_index().
+INDEX_CACHE_SIZE = 8
+
+nodeTag_re = re.compile(pats.nodeTag, re.DOTALL)
+
+_index_cache = OrderedDict()
+
+
+class StructIndex(object):
+    r"""
+    Structural index of HTML part (item).
+
+    Every element has its parent, position among siblings and position among
+    siblings of the same type (tag name, case-insensitive). Positions are
+    1-based like in CSS. Index is built in one pass over all tags, closing tags
+    are resolved exactly like in find_node().
+
+    Root-level elements are children of virtual root. Unexpected closing tag
+    on root-level starts next virtual root (e.g. end of parent in the rest
+    of document).
+
+    Parameters
+    ----------
+    item : str
+        HTML string or HTML part string, the same like `Node.item`.
+    """
+
+    __slots__ = ('item', 'elems', 'starts', 'ends', 'first', 'next', 'count', 'type_count', 'memo')
+
+    def __init__(self, item):
+        self.item = item
+        #: Element by tag start offset: (parent, position, position of type, name, tag end).
+        #: Parent is parent tag start offset or negative number for virtual root.
+        self.elems = elems = {}
+        #: Tag start offsets in document order.
+        self.starts = starts = []
+        #: Content end offset (closing tag start) by tag start offset, missing if content is empty.
+        self.ends = ends = {}
+        #: First child tag start offset by parent.
+        self.first = first = {}
+        #: Next sibling tag start offset by tag start offset.
+        self.next = nxt = {}
+        last = {}  # the last child by parent
+        #: Number of children by parent.
+        self.count = count = {}
+        #: Number of children by (parent, name).
+        self.type_count = type_count = {}
+        #: Any data computed on the index by its users (e.g. :has() hits).
+        self.memo = {}
+        root, stack = -1, []
+        for r in nodeTag_re.finditer(item):
+            beg, slf, end = r.groups()
+            if beg:
+                p = stack[-1][1] if stack else root
+                name, (ts, cs) = beg.lower(), r.span()
+                n = count[p] = count.get(p, 0) + 1
+                key = p, name
+                nt = type_count[key] = type_count.get(key, 0) + 1
+                elems[ts] = p, n, nt, name, cs
+                starts.append(ts)
+                if n > 1:
+                    nxt[last[p]] = ts
+                else:
+                    first[p] = ts
+                last[p] = ts
+                if not slf:
+                    stack.append((beg, ts))
+            else:
+                if not stack:
+                    root -= 1
+                while stack:
+                    sname, sts = stack.pop()
+                    ends[sts] = r.start()
+                    if sname == end:
+                        break
+
+    def child_pos(self, ts):
+        r"""Returns (position, number of siblings) for element at `ts` or None if it's not element."""
+        e = self.elems.get(ts)
+        if e is None:
+            return None
+        return e[1], self.count[e[0]]
+
+    def type_pos(self, ts):
+        r"""Returns (position, number of siblings of the same type) for element at `ts` or None."""
+        e = self.elems.get(ts)
+        if e is None:
+            return None
+        return e[2], self.type_count[e[0], e[3]]
+
+    def siblings(self, ts):
+        r"""Generate (tag start, tag end) of following siblings of element at `ts`."""
+        elems, nxt = self.elems, self.next
+        ts = nxt.get(ts)
+        while ts is not None:
+            yield ts, elems[ts][4]
+            ts = nxt.get(ts)
+
+    def children(self, ts):
+        r"""Generate (tag start, tag end) of children of element at `ts`."""
+        elems, nxt = self.elems, self.next
+        ts = self.first.get(ts) if ts in self.ends else None
+        while ts is not None:
+            yield ts, elems[ts][4]
+            ts = nxt.get(ts)
+
+
+def struct_index(item):
+    r"""
+    Returns structural index of `item` (cached).
+
+    Few last indexes are cached, nodes are filtered part by part, so one index
+    serves all nodes found in the part.
+    """
+    index = _index_cache.get(id(item))
+    if index is not None and index.item is item:
+        return index
+    if len(_index_cache) >= INDEX_CACHE_SIZE:
+        _index_cache.popitem(last=False)
+    index = _index_cache[id(item)] = StructIndex(item)
+    return index
+
+
+def nth_ab(value):
+    r"""
+    Returns (a, b) for CSS `an+b` expression (e.g. '2n+1', 'odd', '3', '-n+2').
+    """
+    value = (value or '').replace(' ', '').lower()
+    if value == 'odd':
+        a, b = 2, 1
+    elif value == 'even':
+        a, b = 2, 0
+    else:
+        r = re.match(r'^(?:([-+]?\d*)n)?([-+]?\d+)?$', value)
+        if not value or not r:
+            raise ValueError('Incorrect nth expression {!r}'.format(value))
+        a, b = r.groups()
+        if value.find('n') < 0:
+            a = 0
+        else:
+            a = int(a + '1' if a in ('', '-', '+') else a)
+        b = int(b or 0)
+    return a, b
+
+
+def nth_expr(value):
+    r"""
+    Returns function pos -> bool for CSS `an+b` expression (e.g. '2n+1', 'odd', '3', '-n+2').
+    """
+    a, b = nth_ab(value)
+    if not a:
+        return lambda pos: pos == b
+    return lambda pos: (pos - b) % a == 0 and (pos - b) // a >= 0
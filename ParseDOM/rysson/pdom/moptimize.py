@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, unicode_literals, print_function
+
+import re
+
+from .base import Result, base_str
+from .selectorparser import Selector, SelectorPath, WordFilter, NotFilter
+
+
+#: Plain (literal) attribute value pattern, e.g. `#main` or `[id="main"]`, but not `[id^="m"]`.
+_plain_value_re = re.compile(r'(?:\w|\\?-)+$')
+
+
+def _is_unique(sel):
+    r"""Helper. True if selector has exact `id` value (id is unique in document)."""
+    return any(isinstance(val, base_str) and _plain_value_re.match(val) for val in sel.attrs.get('id', ()))
+
+
+def _rule_star(sel):
+    r"""`*.x` -> `.x`, any tag is the same like no tag (one key for trie and union)."""
+    if sel.tag == '*':
+        sel.tag = ''
+        return True
+
+
+def _rule_attrs(sel):
+    r"""`[x][x]` -> `[x]`, `[x][x="1"]` -> `[x="1"]`, every value is one regex scan."""
+    changed = False
+    for attr, vals in sel.attrs.items():
+        seen, new = set(), []
+        for val in vals:
+            key = val, val.__class__  # True == 1
+            if key not in seen:
+                seen.add(key)
+                new.append(val)
+        if True in new and any(isinstance(val, base_str) for val in new):
+            new = [val for val in new if val is not True]  # value implies attribute
+        if new != vals:
+            vals[:] = new
+            changed = True
+    return changed
+
+
+def _rule_not_not(sel):
+    r"""`:not(:not(A))` -> `A`, tag and attributes of `A` are moved to scan regex."""
+    for i, f in enumerate(sel.nodefilterlist):
+        if not isinstance(f, NotFilter):
+            continue
+        outer = f.sel
+        if outer.tag.strip('*') or outer.attrs or len(outer.nodefilterlist) != 1:
+            continue
+        inner = outer.nodefilterlist[0]
+        if not isinstance(inner, NotFilter):
+            continue
+        inner = inner.sel
+        tag = inner.tag.strip('*')
+        if tag and sel.tag.strip('*') and tag.lower() != sel.tag.lower():
+            continue  # never matches, leave it
+        if tag:
+            sel.tag = tag
+        for attr, vals in inner.attrs.items():
+            sel.attrs[attr].extend(vals)
+        sel.nodefilterlist[i:i+1] = inner.nodefilterlist
+        sel.filterkeys[i:i+1] = inner.filterkeys
+        return True
+
+
+def _rule_filters(sel):
+    r"""`:first-child:first-child` -> `:first-child`, the same filters (by key) are called once."""
+    keys, filters = [], []
+    for f, key in zip(sel.nodefilterlist, sel.filterkeys):
+        if key not in keys:
+            keys.append(key)
+            filters.append(f)
+    if len(keys) != len(sel.filterkeys):
+        sel.nodefilterlist[:], sel.filterkeys[:] = filters, keys
+        return True
+
+
+def _rule_words(sel):
+    r"""`.a.b` with `:not(:not(.c))` -> one word set check (one WordFilter)."""
+    found = [i for i, f in enumerate(sel.nodefilterlist) if isinstance(f, WordFilter)]
+    if len(found) < 2:
+        return False
+    words = {}
+    for i in found:
+        for attr, ws, starts in sel.nodefilterlist[i].checks:
+            w, s = words.setdefault(attr, (set(), set()))
+            w.update(ws)
+            s.update(starts)
+    wordfilter = WordFilter(words)
+    for i in reversed(found):
+        del sel.nodefilterlist[i], sel.filterkeys[i]
+    sel.nodefilterlist.insert(0, wordfilter)
+    sel.filterkeys.insert(0, ('words', wordfilter.checks))
+    return True
+
+
+def _rule_unique_id(sel):
+    r"""`#id` anywhere in a path -> stop after the first hit in every scanned part (opt-in, ids must be unique)."""
+    if sel.limit is None and _is_unique(sel):
+        sel.limit = 1
+        return True
+
+
+def _rule_none(sel):
+    r"""The last `A::none` in a path -> existence check, stop after the first hit."""
+    if sel.limit is None and sel.result == [Result.NoResult]:
+        sel.limit = 1
+        return True
+
+
+#: Rewrite rules for every selector: (name, rule).
+_rules = (
+    ('star', _rule_star),
+    ('not-not', _rule_not_not),
+    ('attrs', _rule_attrs),
+    ('filters', _rule_filters),
+    ('words', _rule_words),
+)
+
+#: Opt-in rule, pages often repeat ids, see optimize().
+_unique_id_rules = (
+    ('unique-id', _rule_unique_id),
+)
+
+
+def _optimize_sel(sel, last, log, rules):
+    r"""Helper. Apply `rules` on selector `sel` (`last` in its path)."""
+    if last:
+        rules += (('exists', _rule_none), )
+    changed = True
+    while changed:
+        changed = False
+        for name, rule in rules:
+            if rule(sel):
+                changed = True
+                sel._key = None
+                if log is not None and name not in log:
+                    log.append(name)
+
+
+def _optimize(items, log, rules):
+    r"""Helper. Optimize path (or group, or set) `items`."""
+    for i, item in enumerate(items):
+        if isinstance(item, Selector):
+            _optimize_sel(item, i + 1 == len(items) or not isinstance(items, SelectorPath), log, rules)
+        else:
+            _optimize(item, log, rules)
+
+
+def optimize(group, log=None, unique_ids=False):
+    r"""
+    Rewrite parsed selector (in place) to cheaper form with the same results.
+
+    Rules:
+        - star:      `*.x` -> `.x` (the same key for shared prefix and union)
+        - not-not:   `:not(:not(A))` -> `A`, tag and attributes are scanned by regex
+        - attrs:     `[x][x]` -> `[x]`, `[x][x=1]` -> `[x=1]`
+        - filters:   the same pseudo-classes are checked once
+        - words:     all `.class` and `[attr~=w]` words are one set check
+        - exists:    the last `A::none` step in a path stops after the first hit
+        - unique-id: `#id` step stops after the first hit in every scanned part,
+                     only if `unique_ids` is true (pages often repeat ids)
+
+    Parameters
+    ----------
+    group : GroupSelector
+        Parsed selector, see selectorparser.parse().
+    log : list or None
+        If list, names of applied rules are appended.
+    unique_ids : bool, default False
+        If True ids are unique in the document, `#id` steps could stop early.
+        Results differ if page repeats the id.
+
+    Returns
+    -------
+    GroupSelector
+        The same `group`.
+    """
+    _optimize(group, log, _rules + _unique_id_rules if unique_ids else _rules)
+    return group
@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, unicode_literals, print_function
+
+import sys
+from collections import defaultdict
+from timeit import default_timer as _timer
+
+from . import base as _base
+from . import msearch as _msearch
+from . import mselect as _mselect
+from .base import Node, pats
+
+
+def swap_functions(hooks):
+    r"""
+    Replace functions (any objects) by wrappers in all modules of the package.
+
+    Every reference (module global, e.g. `from .base import find_node`) to
+    original object is replaced, also in the top package (e.g. `rysson.dom_select`).
+    References kept outside the package are not changed.
+
+    Parameters
+    ----------
+    hooks : list of (original, wrapper)
+        Objects to replace.
+
+    Returns
+    -------
+    list of (namespace, key, original)
+        Replaced references, see restore_functions().
+    """
+    wrappers = dict((id(orig), wrapper) for orig, wrapper in hooks)
+    swapped = []
+    prefix = __name__.partition('.')[0] + '.'
+    for modname, mod in list(sys.modules.items()):
+        if mod is None or not (modname + '.').startswith(prefix):
+            continue
+        namespace = vars(mod)
+        for key, value in list(namespace.items()):
+            wrapper = wrappers.get(id(value))
+            if wrapper is not None:
+                swapped.append((namespace, key, value))
+                namespace[key] = wrapper
+    return swapped
+
+
+def restore_functions(swapped):
+    r"""Restore functions replaced by swap_functions() (module namespace or class attribute)."""
+    for target, key, value in reversed(swapped):
+        if isinstance(target, dict):
+            target[key] = value
+        else:
+            setattr(target, key, value)
+
+
+class _CountingRegex(object):
+    r"""
+    Helper. Compiled regex proxy, counts scans (finditer, findall, search, sub)
+    and matches of the pattern, see Profile.
+    """
+
+    __slots__ = ('rx', 'stats')
+
+    def __init__(self, rx, stats):
+        self.rx = rx
+        self.stats = stats  # [scans, bytes, matches]
+
+    def _scan(self, string, pos, endpos):
+        stats = self.stats
+        stats[0] += 1
+        stats[1] += (len(string) if endpos is None else endpos) - pos
+
+    def finditer(self, string, pos=0, endpos=None):
+        self._scan(string, pos, endpos)
+        return self.rx.finditer(string, pos) if endpos is None else self.rx.finditer(string, pos, endpos)
+
+    def findall(self, string, pos=0, endpos=None):
+        self._scan(string, pos, endpos)
+        return self.rx.findall(string, pos) if endpos is None else self.rx.findall(string, pos, endpos)
+
+    def search(self, string, pos=0, endpos=None):
+        self._scan(string, pos, endpos)
+        return self.rx.search(string, pos) if endpos is None else self.rx.search(string, pos, endpos)
+
+    def sub(self, repl, string, count=0):
+        self._scan(string, 0, None)
+        return self.rx.sub(repl, string, count)
+
+    def match(self, string, pos=0, endpos=None):
+        self.stats[2] += 1
+        return self.rx.match(string, pos) if endpos is None else self.rx.match(string, pos, endpos)
+
+    def __getattr__(self, key):
+        return getattr(self.rx, key)
+
+
+def _regex_label(name, attr, val):
+    r"""Helper. Short label of element regex `pats.melem(name, attr, val)`, e.g. `a[href]`."""
+    label = '*' if name == pats.anyTag else name
+    if attr:
+        label += '[{}]'.format(attr) if val is True else '[{}={}]'.format(attr, val)
+    return label if len(label) <= 48 else label[:45] + '...'
+
+
+class Profile(object):
+    r"""
+    Counters of pdom hot paths, see profile().
+
+    Counters are collected by wrappers, which are swapped in place of original
+    functions (in all pdom modules) on start() and restored on stop().
+    If profiling is not running, the original code runs, no checks at all.
+    Profiles can be nested (stop in reverse order), but it's not thread-safe:
+    other threads are counted too while profile is running.
+
+    Counters (see as_dict()):
+
+        find_node    closing tag searches: calls and bytes walked (from tag end to closing tag end)
+        regex        element regex scans by pattern: scans, bytes and single tag matches
+        nodes        Node objects created
+        attrs        full attribute parses (Node.attrs) and single attribute lookups (get_attr)
+        text         tag strips (text without tags): calls and bytes, text projections built
+        cache        compiled selector cache hits and misses
+        selectors    per selector calls and wall time
+    """
+
+    def __init__(self):
+        self._swapped = None
+        self.reset()
+
+    def reset(self):
+        r"""Clear all counters."""
+        self.find_node = [0, 0]                         # calls, bytes
+        self.regex = defaultdict(lambda: [0, 0, 0])     # label: scans, bytes, matches
+        self.nodes = 0
+        self.attrs = [0, 0]                             # parses, lookups
+        self.text = [0, 0, 0, 0]                        # strips, bytes, projections, bytes
+        self.cache = [0, 0]                             # hits, misses
+        self.selectors = defaultdict(lambda: [0, 0.0])  # selector: calls, time
+        self._group_names = {}
+        self._depth = 0
+
+    @property
+    def running(self):
+        r"""True if profile is collecting counters."""
+        return self._swapped is not None
+
+    # --- wrappers ---
+
+    def _wrappers(self):
+        r"""Helper. Returns list of (original, wrapper) of all hooks."""
+        find_node, melem_re = _base.find_node, _msearch.melem_re
+        attrs_dict, attr_value = _base._attrs_dict, _base.attr_value
+        compile_selector, selector_cache = _mselect.compile_selector, _mselect._selector_cache
+        select_group, select_columnar = _mselect._select_group, _mselect._select_columnar
+        find_root_tags, find_first_tag = _msearch.find_root_tags, _msearch.find_first_tag
+        select_union, select_fused = _mselect._select_union, _mselect._select_fused
+        regex_stats, proxies, group_names = self.regex, {}, self._group_names
+
+        def find_node_wrapper(name, match, item, ms, me):
+            found = find_node(name, match, item, ms, me)
+            self.find_node[0] += 1
+            self.find_node[1] += found[4] - me
+            return found
+
+        def melem_re_wrapper(name, attr, val):
+            rx = melem_re(name, attr, val)
+            try:
+                return proxies[id(rx)][1]
+            except KeyError:
+                pass
+            proxy = _CountingRegex(rx, regex_stats[_regex_label(name, attr, val)])
+            proxies[id(rx)] = rx, proxy  # keep rx, id is valid
+            return proxy
+
+        def attrs_dict_wrapper(found):
+            self.attrs[0] += 1
+            return attrs_dict(found)
+
+        def attr_value_wrapper(rx, tagstr, default=None):
+            self.attrs[1] += 1
+            return attr_value(rx, tagstr, default)
+
+        def compile_selector_wrapper(selector, *args, **kwargs):
+            if not isinstance(selector, _mselect.CompiledSelector):
+                key = _mselect._selector_key(selector, *args, **kwargs)
+                self.cache[0 if key in selector_cache else 1] += 1
+            compiled = compile_selector(selector, *args, **kwargs)
+            group_names[id(compiled.group)] = compiled.group, compiled.selector
+            return compiled
+
+        def timed(func):
+            def wrapper(*args, **kwargs):
+                group = args[2] if func is select_group else args[1]
+                self._depth += 1
+                t = _timer()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    elapsed = _timer() - t
+                    self._depth -= 1
+                    if not self._depth:  # nested calls are included
+                        try:
+                            name = group_names[id(group)][1]
+                        except KeyError:
+                            name = repr(group)
+                        stats = self.selectors[name]
+                        stats[0] += 1
+                        stats[1] += elapsed
+            return wrapper
+
+        def scans(func, label):
+            stats = regex_stats[label]
+            def wrapper(item, *args, **kwargs):
+                stats[0] += 1
+                stats[1] += len(item)
+                return func(item, *args, **kwargs)
+            return wrapper
+
+        def plan_scans(func, label):
+            stats = regex_stats[label]
+            def wrapper(res, html, plan):
+                for item in html:
+                    stats[0] += 1
+                    stats[1] += len(_base._tostr(item))
+                return func(res, html, plan)
+            return wrapper
+
+        def node_init(node, tagstr, item=None, tagindex=None):
+            self.nodes += 1
+            node_init.original(node, tagstr, item, tagindex)
+        node_init.original = Node.__init__
+
+        text_stats = self.text
+        remove_tags = _base.remove_tags_re
+
+        class _TextRegex(_CountingRegex):
+            __slots__ = ()
+
+            def sub(self, repl, string, count=0):
+                text_stats[0] += 1
+                text_stats[1] += len(string)
+                return self.rx.sub(repl, string, count)
+
+            def finditer(self, string, pos=0, endpos=None):
+                text_stats[2] += 1
+                text_stats[3] += len(string)
+                return self.rx.finditer(string, pos) if endpos is None else self.rx.finditer(string, pos, endpos)
+
+        remove_tags_proxy = _TextRegex(remove_tags, [0, 0, 0])
+
+        return [
+            (find_node, find_node_wrapper),
+            (melem_re, melem_re_wrapper),
+            (attrs_dict, attrs_dict_wrapper),
+            (attr_value, attr_value_wrapper),
+            (compile_selector, compile_selector_wrapper),
+            (select_group, timed(select_group)),
+            (select_columnar, timed(select_columnar)),
+            (find_root_tags, scans(find_root_tags, 'root-level tags')),
+            (find_first_tag, scans(find_first_tag, 'first tag')),
+            (select_union, plan_scans(select_union, 'union scan')),
+            (select_fused, plan_scans(select_fused, 'fused scan')),
+            (remove_tags, remove_tags_proxy),
+            (Node.__init__, node_init),
+        ]
+
+    # --- control ---
+
+    def start(self):
+        r"""Start collecting counters (swap hooks in)."""
+        if self._swapped is not None:
+            return self
+        hooks = self._wrappers()
+        node_init = hooks[-1][1]
+        self._swapped = swap_functions(hooks[:-1])
+        self._swapped.append((Node, '__init__', node_init.original))
+        Node.__init__ = node_init
+        return self
+
+    def stop(self):
+        r"""Stop collecting counters (restore original functions)."""
+        if self._swapped is None:
+            return self
+        restore_functions(self._swapped)
+        self._swapped = None
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    # --- results ---
+
+    def as_dict(self):
+        r"""Returns counters as dict (plain values, can be dumped to JSON)."""
+        return {
+            'find_node': {'calls': self.find_node[0], 'bytes': self.find_node[1]},
+            'regex': {label: {'scans': s[0], 'bytes': s[1], 'matches': s[2]}
+                      for label, s in self.regex.items() if s[0] or s[2]},
+            'nodes': self.nodes,
+            'attrs': {'parses': self.attrs[0], 'lookups': self.attrs[1]},
+            'text': {'strips': self.text[0], 'bytes': self.text[1],
+                     'projections': self.text[2], 'projection_bytes': self.text[3]},
+            'cache': {'hits': self.cache[0], 'misses': self.cache[1]},
+            'selectors': {name: {'calls': s[0], 'time': s[1]} for name, s in self.selectors.items()},
+        }
+
+    def table(self):
+        r"""Returns counters as pretty table (str)."""
+        rows = [
+            ('find_node (closing tags)', self.find_node[0], self.find_node[1]),
+            ('Node objects', self.nodes, ''),
+            ('attribute parses (all)', self.attrs[0], ''),
+            ('attribute lookups (single)', self.attrs[1], ''),
+            ('text strips', self.text[0], self.text[1]),
+            ('text projections', self.text[2], self.text[3]),
+            ('selector cache hits', self.cache[0], ''),
+            ('selector cache misses', self.cache[1], ''),
+        ]
+        regex = sorted(((label, s) for label, s in self.regex.items() if s[0] or s[2]),
+                       key=lambda x: (-x[1][1], x[0]))
+        selectors = sorted(self.selectors.items(), key=lambda x: (-x[1][1], x[0]))
+        width = max([len(r[0]) for r in rows] + [len(label) + 2 for label, _ in regex]
+                    + [len(name) + 2 for name, _ in selectors])
+        lines = ['{:{w}}  {:>9} {:>11}'.format('counter', 'count', 'bytes', w=width)]
+        lines += ['{:{w}}  {:>9} {:>11}'.format(*row, w=width) for row in rows]
+        if regex:
+            lines.append('{:{w}}  {:>9} {:>11} {:>9}'.format('regex scans', 'scans', 'bytes', 'matches', w=width))
+            lines += ['  {:{w}}  {:>9} {:>11} {:>9}'.format(label, *s, w=width - 2) for label, s in regex]
+        if selectors:
+            lines.append('{:{w}}  {:>9} {:>11}'.format('selectors', 'calls', 'time [ms]', w=width))
+            lines += ['  {:{w}}  {:>9} {:>11.3f}'.format(name, s[0], s[1] * 1000, w=width - 2)
+                      for name, s in selectors]
+        return '\n'.join(lines)
+
+    def __str__(self):
+        return self.table()
+
+
+def profile():
+    r"""
+    Returns Profile to collect counters of pdom hot paths.
+
+    >>> with pdom.profile() as p:
+    ...     pdom.select(html, 'ul li.item a::attr(href)')
+    >>> print(p.table())
+    >>> p.as_dict()['find_node']['calls']
+
+    Hooks are swapped in on enter and restored on exit, code runs without any
+    overhead if profile is not running. Use `p.start()` and `p.stop()` for
+    sampling, counters are accumulated until `p.reset()`.
+    """
+    return Profile()
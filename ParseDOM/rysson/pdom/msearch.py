@@ -4,12 +4,13 @@ from __future__ import absolute_import, division, unicode_literals, print_functi
 import re
 from inspect import isclass
 
-from .base import PY2
-from .base import NoResult, Result, MissingAttr, TagPosition, ItemSource
+from .base import PY2, base_str
+from .base import NoResult, Result, ResultParam, MissingAttr, TagPosition, ItemSource
 from .base import regex, pats, remove_tags_re
 from .base import _tostr, _make_html_list, find_node
-from .base import Node, DomMatch
+from .base import Node, NodeList, Columns, DomMatch
 from .base import isrealsequence
+from .mindex import struct_index
 
 
 
@@ -40,6 +41,62 @@ def find_closing(name, match, item, ms, me):
     return cs, ce
 
 
+class BreakAtrrLoop(Exception):
+    r"""Helper. Break attribute loop in dom_search()."""
+
+
+#: Cache of element regex, see melem_re().
+_melem_cache = {}
+
+#: Max size of element regex cache.
+MELEM_CACHE_SIZE = 1024
+
+
+def melem_re(name, attr, val):
+    r"""Helper. Returns compiled (cached) element regex `pats.melem(name, attr, val)`."""
+    key = name, attr, val, val.__class__  # True == 1
+    try:
+        return _melem_cache[key]
+    except KeyError:
+        pass
+    except TypeError:  # unhashable value
+        return re.compile(pats.melem(name, attr, val), re.DOTALL | re.IGNORECASE)
+    if len(_melem_cache) >= MELEM_CACHE_SIZE:
+        _melem_cache.clear()
+    rx = _melem_cache[key] = re.compile(pats.melem(name, attr, val), re.DOTALL | re.IGNORECASE)
+    return rx
+
+
+def tag_args(name, attrs):
+    r"""
+    Helper. Returns list of `pats.melem()` arguments (name, attr, val) for tag `name` with `attrs`.
+
+    One item per attribute value, see tag_regexes().
+    """
+    name = _tostr(name).strip()
+    if not name or name == '*':
+        name = pats.anyTag   # any tag
+    args = []
+    for key, vals in (attrs or {None: None}).items():
+        if not isinstance(vals, list):
+            vals = [ vals ]
+        elif not vals:   # empty values means any value
+            vals = [ True ]
+        for val in vals:
+            vkey = None if key and val is None else key
+            args.append((name, vkey, val))
+    return args
+
+
+def tag_regexes(name, attrs):
+    r"""
+    Helper. Returns list of regex for tag `name` with `attrs`, see dom_search().
+
+    Tag string matches if all regex match whole tag (one regex per attribute value).
+    """
+    return [melem_re(*args) for args in tag_args(name, attrs)]
+
+
 def find_root_tags(item, tag, attr, val):
     r"""
     Generator for root-level tags.
@@ -69,6 +126,161 @@ def find_first_tag(item, tag, attr, val):
         yield node  # yield only first and matching tag, not alien
 
 
+def find_sibling_tags(node, rxs, first_only=False):
+    r"""
+    Generator for following sibling tags of `node`.
+
+    Nodes are in `node` item (no copy), siblings are taken from the structural
+    index, so scanning stops at the end of the parent. If `first_only` only
+    the next sibling is checked.
+    """
+    item = node.item
+    for ts, cs in struct_index(item).siblings(node.ts):
+        for rx in rxs:
+            r = rx.match(item, ts, cs)
+            if not r or r.end() != cs:
+                break
+        else:
+            yield Node(tagstr=item[ts:cs], tagindex=(ts, cs), item=item)
+        if first_only:
+            break
+
+
+#: Convert retrun item type to enum.
+_rtype2enum = {
+    True:     Result.Node,
+    False:    Result.Content,
+    None:     Result.Content,
+    Node:     Result.Node,
+    DomMatch: Result.DomMatch,
+}
+
+
+def _ritem_enum(ritem):
+    r"""Helper. Convert requested item (ret) to Result if possible."""
+    if PY2 and type(ritem) is int:
+        return ritem
+    return _rtype2enum.get(ritem, ritem)
+
+
+#: NodeList methods for results, which do not need Node object.
+_nodelist_results = {
+    Result.Content:   NodeList.content,
+    Result.OuterHTML: NodeList.outer_html,
+    Result.Text:      NodeList.text,
+}
+
+
+def _nodelist_getters(ret):
+    r"""Helper. Returns NodeList methods for requested items or None if Node is needed."""
+    try:
+        return [_nodelist_results[_ritem_enum(ritem)] for ritem in ret]
+    except (KeyError, TypeError):
+        return None
+
+
+def _intersect_nodes(lst, lst2):
+    r"""Helper. Delete from `lst` anything missing in `lst2` (compare tags)."""
+    if isinstance(lst2, NodeList):
+        matches = set(lst2.tagstrs())
+    else:
+        matches = set(n.tagstr for n in lst2)
+    if isinstance(lst, NodeList):
+        return lst.select([i for i in range(len(lst)) if lst.tagstr(i) in matches])
+    return [n for n in lst if n.tagstr in matches]
+
+
+#: Missing attribute marker (see _compile_ret()).
+_missing = object()
+
+
+#: Extractors for results: extractor(node) -> value.
+_result_extractors = {
+    Result.Node:      lambda node: node,
+    Result.Content:   lambda node: node.content,
+    Result.OuterHTML: lambda node: node.outerHTML,
+    Result.Text:      lambda node: node.text,
+    Result.DomMatch:  lambda node: DomMatch(node.attrs, node.content),
+    Result.NoResult:  lambda node: NoResult(),
+}
+
+
+def _compile_ret(ret, skip_missing):
+    r"""
+    Helper. Compile requested items into extractors.
+
+    Parameters
+    ----------
+    ret : list
+        List of requested items (Result, attribute name, etc.),
+        already converted by _ritem_enum().
+    skip_missing : bool
+        If True missing attributes are skipped, else None is used.
+
+    Returns
+    -------
+    tuple
+        Tuple of extractors, extractor(node) -> value. If `skip_missing`
+        extractor returns `_missing` for missing attribute.
+    """
+    missing = _missing if skip_missing else None
+    extractors = []
+    single = not _parse_all_attrs(ret)
+    for ritem in ret:
+        try:
+            extractors.append(_result_extractors[ritem])
+        except (KeyError, TypeError):  # attribute
+            if single and isinstance(ritem, base_str) and ritem == ritem.lower():
+                # only this attribute is parsed
+                extractors.append(lambda node, attr=ritem: node.get_attr(attr, missing))
+            else:
+                extractors.append(lambda node, attr=ritem: node.attrs.get(attr, missing))
+    return tuple(extractors)
+
+
+def _parse_all_attrs(ret):
+    r"""Helper. True if all attributes are needed (DomMatch or more then one attribute)."""
+    if Result.DomMatch in ret:
+        return True
+    return sum(1 for ritem in ret if ritem not in _result_extractors) > 1
+
+
+def _first_nodes(found, item, nodefilter, limit):
+    r"""Helper. Returns up to `limit` nodes from regex `found` matches (passing `nodefilter`), stops scanning."""
+    lst = []
+    for r in found:
+        node = Node(tagstr=r.group(), tagindex=r.span(), item=item)
+        if nodefilter is None or nodefilter(node):
+            lst.append(node)
+            if len(lst) >= limit:
+                break
+    return lst
+
+
+def _node_values(node, extractors, skip_missing):
+    r"""
+    Helper. Get requested values from found node.
+
+    Parameters
+    ----------
+    node : Node
+        Found node.
+    extractors : tuple
+        Compiled requested items, see _compile_ret().
+    skip_missing : bool
+        If True missing attributes are skipped, else None is used.
+
+    Returns
+    -------
+    list
+        Values for all requested items.
+    """
+    values = [get(node) for get in extractors]
+    if skip_missing and _missing in values:
+        values = [v for v in values if v is not _missing]
+    return values
+
+
 def dom_search(html, name=None, attrs=None, ret=None, exclude_comments=False):
     """
     Simple parse HTML/XML to get tags.
@@ -115,19 +327,6 @@ def dom_search(html, name=None, attrs=None, ret=None, exclude_comments=False):
     if not name or name == '*':
         name = pats.anyTag   # any tag
 
-    class BreakAtrrLoop(Exception): pass
-
-    # convert retrun item type to enum
-    rtype2enum = {
-        True:     Result.Node,
-        False:    Result.Content,
-        None:     Result.Content,
-        Node:     Result.Node,
-        DomMatch: Result.DomMatch,
-    }
-    #elif isclass(ritem) and issubclass(ritem, Node):
-    #    ritem = Result.Node
-
     ret_lst, ret_nodes = [], []
 
     # Get details about expected result type
@@ -136,19 +335,29 @@ def dom_search(html, name=None, attrs=None, ret=None, exclude_comments=False):
         separate = ret.separate
         sync = ret.sync
         skip_missing = ret.missing
-        nodefilter = ret.nodefilter or (lambda n: True)
+        nodefilter = ret.nodefilter
         position = ret.position
         source = ret.source
+        columnar = ret.columnar
+        limit = ret.limit
+        values = ret.values
         ret = ret.args  # get requested ret
     except AttributeError:
-        separate = sync = False
+        separate = sync = columnar = False
         skip_missing = MissingAttr.SkipIfDirect
-        nodefilter = lambda n: True
+        nodefilter = values = None
         position = TagPosition.Any
         source = ItemSource.Content
+        limit = None
+    # the only one regex scan (no intersection), it can be stopped after `limit` nodes
+    lazy = limit is not None and position == TagPosition.Any and source != ItemSource.Siblings and \
+        sum(len(v) if isinstance(v, list) and v else 1 for v in (attrs or {None: None}).values()) == 1
 
     # Return list of values if ret is list  [a] -> [x]
     # otherwise return just values          a   -> x
+    if columnar:
+        separate = sync = False
+        parts = []
     if isinstance(ret, (list, tuple)):
         retlstadd = ret_lst.append
         skip_missing = skip_missing == MissingAttr.SkipAll
@@ -157,6 +366,21 @@ def dom_search(html, name=None, attrs=None, ret=None, exclude_comments=False):
         retlstadd, ret = ret_lst.extend, [ ret ]
         skip_missing = skip_missing != MissingAttr.NoSkip
         sync_none = None if sync is True else sync
+    compiled = getattr(retarg, '_compiled', None)
+    if compiled is None or compiled[0] != skip_missing:
+        ret = [_ritem_enum(ritem) for ritem in ret]
+        compiled = (skip_missing, ret, _compile_ret(ret, skip_missing), _nodelist_getters(ret),
+                    _parse_all_attrs(ret))
+        if isinstance(retarg, ResultParam):
+            retarg._compiled = compiled  # reuse in next calls (see CompiledSelector)
+    _, ret, extractors, getters, batch_attrs = compiled
+    if skip_missing:
+        values = None
+    # NodeList is used only if Node objects are not needed at all
+    if separate:
+        getters = None
+    use_nodelist = columnar or getters is not None
+    sibling_rxs = None
 
     for ii, item in enumerate(html):
         if isrealsequence(item):
@@ -169,100 +393,91 @@ def dom_search(html, name=None, attrs=None, ret=None, exclude_comments=False):
             #print('search - None')
             ret_lst += [item]
             continue
-        item = _tostr(item, source=source)
-        if exclude_comments:
-            item = re_comments.sub(item, '')
-        if not item:
-            continue
-
-        lst = None
-        try:
-            for key, vals in (attrs or {None: None}).items():
-                if not isinstance(vals, list):
-                    vals = [ vals ]
-                elif not vals:   # empty values means any value
-                    vals = [ True ]
-                for val in vals:
-                    vkey = key
-                    #print(f'-- key: {vkey!r}, val: "{val}"')
-                    if key and val is None:  # Skip this attribute
-                        vkey = None
-                        #print(f'-> key: {vkey!r}, val: "{val}"')
-                    #print('TagPos', position, 'PAT', pats.melem(name, vkey, val))
-                    if position == TagPosition.RootLevel:
-                        gen = find_root_tags(item, tag=name, attr=vkey, val=val)
-                    elif position == TagPosition.FirstOnly:
-                        gen = find_first_tag(item, tag=name, attr=vkey, val=val)
-                    else:
-                        gen = (Node(tagstr=r.group(), tagindex=r.span(), item=item)
-                               for r in re.finditer(pats.melem(name, vkey, val), item, re.DOTALL | re.IGNORECASE))
-                    lst2 = [node for node in gen if nodefilter(node)]
-                    #lst2 = list((r.group(), r.span()) for r in re.finditer(pats.melem(name, vkey, val), item, re.DOTALL | re.IGNORECASE))
-                    #print(' L2', lst2)
-                    #print(' L ', lst)
-                    if lst is None:   # First match
-                        lst = lst2
-                    else:             # Delete anything missing from the next list.
-                        matches = set(n.tagstr for n in lst2)
-                        lst = list(n for n in lst if n.tagstr in matches)
-                    if not lst:
-                        if sync:
-                            ret_lst.append(sync_none)
-                            if separate:
-                                ret_nodes.append(sync_none)
-                        break
-        except BreakAtrrLoop:
-            pass
+        if source == ItemSource.Siblings and isinstance(item, Node):
+            if sibling_rxs is None:
+                sibling_rxs = tag_regexes(name, attrs)
+            lst = list(find_sibling_tags(item, sibling_rxs, first_only=position == TagPosition.FirstOnly))
+            item = item.item
+        else:
+            item = _tostr(item, source=source)
+            if exclude_comments:
+                item = re_comments.sub(item, '')
+            if not item:
+                continue
+            lst = None
+            try:
+                for key, vals in (attrs or {None: None}).items():
+                    if not isinstance(vals, list):
+                        vals = [ vals ]
+                    elif not vals:   # empty values means any value
+                        vals = [ True ]
+                    for val in vals:
+                        vkey = key
+                        #print(f'-- key: {vkey!r}, val: "{val}"')
+                        if key and val is None:  # Skip this attribute
+                            vkey = None
+                            #print(f'-> key: {vkey!r}, val: "{val}"')
+                        #print('TagPos', position, 'PAT', pats.melem(name, vkey, val))
+                        if position == TagPosition.RootLevel:
+                            lst2 = list(find_root_tags(item, tag=name, attr=vkey, val=val))
+                        elif position == TagPosition.FirstOnly:
+                            lst2 = list(find_first_tag(item, tag=name, attr=vkey, val=val))
+                        else:
+                            found = melem_re(name, vkey, val).finditer(item)
+                            if lazy:
+                                lst2 = _first_nodes(found, item, nodefilter, limit)
+                            elif not use_nodelist:
+                                lst2 = [Node(tagstr=r.group(), tagindex=r.span(), item=item) for r in found]
+                            else:
+                                lst2 = NodeList(item, (r.span() for r in found))
+                        #print(' L2', lst2)
+                        #print(' L ', lst)
+                        if lst is None:   # First match
+                            lst = lst2
+                        else:             # Delete anything missing from the next list.
+                            lst = _intersect_nodes(lst, lst2)
+                        if not lst:
+                            raise BreakAtrrLoop()
+            except BreakAtrrLoop:
+                pass
+        if lst and nodefilter is not None and not lazy:
+            lst = lst.filter(nodefilter) if isinstance(lst, NodeList) else [n for n in lst if nodefilter(n)]
+        if lst and limit is not None and not lazy:
+            lst = lst[:limit]
         if not lst:
+            if sync:
+                ret_lst.append(sync_none)
+                if separate:
+                    ret_nodes.append(sync_none)
             continue
         #print('LST', lst)
 
+        if columnar:
+            parts.append(lst if isinstance(lst, NodeList) else NodeList.from_nodes(item, lst))
+            continue
+        if isinstance(lst, NodeList):
+            # work directly on arrays, Node objects are not needed
+            for i in range(len(lst)):
+                retlstadd([get(lst, i) for get in getters])
+            continue
+
+        if batch_attrs:
+            Node.parse_attrs(lst)
         for node in lst:
             #print('MATCH', match, matchIndex)
-            lst2 = []
             if separate:
                 ret_nodes.append(node)
-            for ritem in ret:
-                if PY2:
-                    if type(ritem) is not int:
-                        ritem = rtype2enum.get(ritem, ritem)
-                else:
-                    ritem = rtype2enum.get(ritem, ritem)
-                #print('  -> ritem', ritem)
-                if ritem == Result.Node:
-                    # Get full node (content and all attributes)
-                    lst2.append(node)
-                elif ritem == Result.Content:
-                    # Element content (innerHTML)
-                    lst2.append(node.content)
-                elif ritem == Result.OuterHTML:
-                    # Get outerHTML - full element (tag and content)
-                    lst2.append(node.outerHTML)
-                elif ritem == Result.Text:
-                    # Only text (remove all tags from content)
-                    lst2.append(remove_tags_re.sub('', node.content))
-                elif ritem == Result.DomMatch:
-                    # Get old node (content and all attributes)
-                    lst2.append(DomMatch(node.attrs, node.content))
-                elif ritem == Result.NoResult:
-                    # Match tag, but return nothing
-                    lst2.append(NoResult())
-                else:   # attribute
-                    try:
-                        lst2.append(node.attrs[ritem])
-                    except KeyError:
-                        if not skip_missing:
-                            lst2.append(None)
+            lst2 = values(node) if values is not None else _node_values(node, extractors, skip_missing)
             if lst2 or not skip_missing:
                 retlstadd(lst2)
 
+    if columnar:
+        return Columns(parts, ret) if not ret_lst else ret_lst
     if separate:
         ret_lst =  ret_lst, ret_nodes
     #print('$$$', repr(ret_lst))  # XXX
     return ret_lst
 
-
-
 def main():
     from .base import ResultParam
     from .base import aWord, aWordStarts, aStarts, aEnds, aContains
@@ -356,6 +571,5 @@ def main():
     def printres(*args):
         print('\033[33;1m>\033[0m', *args, sep=' \033[33m|\033[0m ', end=' \033[33m|\033[0m\n')
 
-
 if __name__ == '__main__':
     main()
@@ -1,31 +1,54 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, unicode_literals, print_function
 
-from collections import defaultdict
-
-from .base import _make_html_list
-from .base import base_str, PY2
-from .base import Result, ResultParam, MissingAttr
-from .base import pats
-from .msearch import dom_search
+import re
+from collections import defaultdict, OrderedDict
+
+from .base import _make_html_list, _tostr
+from .base import base_str
+from .base import Result, ResultParam, MissingAttr, TagPosition, ItemSource
+from .base import Node, pats, regex
+from .base import isrealsequence
+from .msearch import dom_search, tag_args, tag_regexes, _missing
+from .mcodegen import selector_code
+from .moptimize import optimize
 
 from .selectorparser import parse as parse_selector
 from .selectorparser import Selector, SetSelector, OrderedSetSelector, GroupSelector
+from .selectorparser import WordFilter
 
 
 # -------  DOM Select -------
 
 
-class SetSelPartData:
-    def __init__(self, res):
-        self.nth = 1
-        if PY2:
-            self.res = res
-        else:
-            self.res = list(res)
+def _selector_param(sel, sync, limit=None):
+    r"""
+    Helper. Returns ResultParam for dom_search() for single selector `sel`.
+
+    ResultParam is kept in selector, so compiled results are reused
+    if the same selector is used again (see CompiledSelector). Node filters
+    and result extractors are generated code, see selector_code().
+    """
+    pkey = sync if limit is None else (sync, limit)
+    try:
+        return sel._params[pkey]
+    except KeyError:
+        pass
+    code = selector_code(sel)
+    nodefilter = code.nodefilter
+    if sel.result:
+        param = ResultParam(sel.result, missing=MissingAttr.NoSkip,
+                            separate=True, sync=sync, nodefilter=nodefilter,
+                            position=sel.elem_pos, source=sel.item_source, limit=limit,
+                            values=code.values)
+    else:
+        param = ResultParam(Result.Node, sync=sync, nodefilter=nodefilter,
+                            position=sel.elem_pos, source=sel.item_source, limit=limit)
+    sel._params[pkey] = param
+    return param
 
 
-def _select_desc(res, html, selectors_desc, sync=False):
+def _select_desc(res, html, selectors_desc, sync=False, limit=None):
     r"""
     Select descending tags "A B". Supports aternatives "{A, B}".
 
@@ -38,7 +61,11 @@ def _select_desc(res, html, selectors_desc, sync=False):
         List of descending selectors. Each item can be aternativr list.
     sync : boll or Result.RemoveItem, default False
         if not False run dp,search in sync mode (returns None if not match).
+    limit : int or None
+        Max number of results of the last selector in every its HTML part.
+        The first `limit` results are the same like without limit.
     """
+    last = selectors_desc[-1] if selectors_desc else None
     part, tree, out_stack = html, None, []
     # Go through descending selector
     #print('=======  SINGLE LIST', selectors_desc.__class__.__name__, selectors_desc)
@@ -50,42 +77,25 @@ def _select_desc(res, html, selectors_desc, sync=False):
             subhtml = list(part if tree is None else tree)
             subpart = [part] if tree else []
             if isinstance(single_selector, OrderedSetSelector):
-                used = {}
-                for sel in single_selector:
-                    selhash = hash(sel)
-                    #print('SEL-SET', sel, hash(sel), selhash in used, used)
-                    if selhash in used:
-                        res2 = used[selhash]
-                        res2.nth += 1  # auto nth
-                    else:
-                        #res2 = []
-                        #_select_desc(res2, subhtml, sel, sync=True)
-                        res2 = [_select_desc([], sub2html, sel, sync=True) for sub2html in subhtml]
-                        res2 = SetSelPartData(zip(*res2))  # nth, res2
-                        #print('mix!!! SH', subhtml)
-                        #print('mix!!! SR', res2)
-                        used[selhash] = res2
-                    #print('mix!!! sh', subhtml)
-                    #print('mix!!! sr', res2)
-
-                    look = sel[-1] if isinstance(sel, list) and sel else sel
-                    nth = look.nth if isinstance(look, Selector) and look.nth else res2.nth
-                    res2.nth = nth
-                    if not res2:
-                        return []
-                    try:
-                        res2 = res2.res[nth - 1]
-                    except IndexError:
+                if not subhtml:
+                    return []
+                members, trie, limits = _set_members(single_selector)
+                # only `limit` (the max nth) results of every distinct member are found
+                shared = [_select_shared(sub2html, trie, len(limits), sync=True, limits=limits)
+                          for sub2html in subhtml]
+                for index, nth in members:
+                    #print('SEL-SET', index, nth)
+                    # nth result in every sub-html, all have to exist
+                    res2 = tuple(r[index][nth - 1] if len(r[index]) >= nth else _missing for r in shared)
+                    if _missing in res2:
                         return []
                     #print('mix!!! sr0', res2)
                     subpart.append(res2)
                     #print('mix!!! sbP', subpart)
             else:
                 # non-ordered set selector, always find first
-                for sel in single_selector:
-                    #print('SEL-SET', sel)
-                    res2 = []
-                    _select_desc(res2, subhtml, sel, sync=True)
+                trie = _path_trie(single_selector)
+                for res2 in _select_shared(subhtml, trie, len(single_selector), sync=True):
                     #print('mix!!! sh', subhtml)
                     #print('mix!!! sr', res2)
                     if not res2:
@@ -106,13 +116,13 @@ def _select_desc(res, html, selectors_desc, sync=False):
         tag = '' if sel.tag == '*' else sel.tag
         # node id, class, attribute selectors or pseudoclasses (what to return)
         rsync = False if not sync else True if sel.optional else Result.RemoveItem
-        nodefilter = (lambda n: all(f(n) for f in sel.nodefilterlist)) if sel.nodefilterlist else None
+        slimit = limit if sel is last else None
+        if sel.limit is not None:  # unique #id or existence check, see moptimize
+            slimit = sel.limit if slimit is None else min(slimit, sel.limit)
         if sel.result:
             #print(f'dom_search({part if tree is None else tree!r}, tag={tag!r}, ret={dict(attrs)}, sync={rsync}, separate=True)')
             part, tree = dom_search(part if tree is None else tree, tag, attrs=dict(sel.attrs),
-                                    ret=ResultParam(sel.result, missing=MissingAttr.NoSkip,
-                                                    separate=True, sync=rsync, nodefilter=nodefilter,
-                                                    position=sel.elem_pos, source=sel.item_source))
+                                    ret=_selector_param(sel, rsync, slimit))
             if not tree:
                 #print('PART', part, 'RETURN.')
                 #print('TREE', tree, 'RETURN!')
@@ -131,8 +141,7 @@ def _select_desc(res, html, selectors_desc, sync=False):
         else:
             #print(f'dom_search({part if tree is None else tree!r}, tag={tag!r}, attrs={dict(sel.attrs)}, sync={rsync})')
             part, tree = dom_search(part if tree is None else tree, tag, attrs=dict(sel.attrs),
-                                    ret=ResultParam(Result.Node, sync=rsync, nodefilter=nodefilter,
-                                                    position=sel.elem_pos, source=sel.item_source)), None
+                                    ret=_selector_param(sel, rsync, slimit)), None
             if not part:
                 #print('PART', part, 'RETURN!')
                 #print('TREE', tree, 'RETURN.')
@@ -154,15 +163,499 @@ def _select_desc(res, html, selectors_desc, sync=False):
     return res
 
 
-def _select_group(res, html, group_selector):
-    # Go through set selector
+class _PathTrie(object):
+    r"""
+    Helper. Prefix trie of selector paths, see _select_shared().
+
+    Paths with the same first step (equal Selector.key, no results) are
+    grouped, the step is evaluated once and its nodes fan out to the rest
+    of paths.
+
+    Parameters
+    ----------
+    paths : list of (int, SelectorPath)
+        Paths with their indexes (position in group or set).
+    """
+
+    __slots__ = ('paths', 'children', 'indexes')
+
+    def __init__(self, paths):
+        self.paths, self.children = [], []
+        self.indexes = [index for index, path in paths]
+        groups = {}
+        for index, path in paths:
+            step = path[0] if isinstance(path, list) and len(path) > 1 else None
+            if not isinstance(step, Selector) or step.result:
+                self.paths.append((index, path))  # not shared
+                continue
+            if step.key not in groups:
+                groups[step.key] = []
+                self.children.append((step, groups[step.key]))
+            groups[step.key].append((index, path[1:]))
+        children, self.children = self.children, []
+        for step, grp in children:
+            if len(grp) == 1:
+                index, rest = grp[0]
+                self.paths.append((index, [step] + rest))
+            else:
+                self.children.append((step, _PathTrie(grp)))
+
+    @property
+    def shared(self):
+        r"""True if any step is shared."""
+        return bool(self.children)
+
+
+def _path_trie(paths):
+    r"""Helper. Returns (cached) _PathTrie for group or set selector `paths`."""
+    try:
+        return paths._trie
+    except AttributeError:
+        pass
+    trie = paths._trie = _PathTrie(list(enumerate(paths)))
+    return trie
+
+
+def _set_members(set_selector):
+    r"""
+    Helper. Returns (cached) distinct members of ordered set selector.
+
+    Returns list of (distinct path index, nth) for every member, _PathTrie
+    of distinct paths and list of the max nth for every distinct path.
+    Members with equal keys (e.g. `a:1` and `a:2`) have the same results,
+    only `nth` differs. Without `:N` the next (auto) nth is used.
+    """
+    try:
+        return set_selector._members
+    except AttributeError:
+        pass
+    keys, paths, members, limits, last_nth = {}, [], [], [], []
+    for sel in set_selector:
+        if sel.key not in keys:
+            keys[sel.key] = index = len(paths)
+            paths.append(sel)
+            limits.append(0)
+            last_nth.append(0)
+        index = keys[sel.key]
+        look = sel[-1] if isinstance(sel, list) and sel else sel
+        nth = look.nth if isinstance(look, Selector) and look.nth else last_nth[index] + 1  # auto nth
+        last_nth[index] = nth
+        members.append((index, nth))
+        limits[index] = max(limits[index], nth)
+    set_selector._members = members, _PathTrie(list(enumerate(paths))), limits
+    return set_selector._members
+
+
+def _select_shared(html, trie, count, sync=False, limits=None):
+    r"""
+    Select all paths in `trie` (see _PathTrie), shared steps are evaluated once.
+
+    Returns list of `count` results (results of every path, like _select_desc()).
+    If `limits` is used, only first `limits[index]` results of path `index`
+    in every HTML part are found.
+    """
+    results = [None] * count
+    _select_trie(results, html, trie, sync, limits)
+    return results
+
+
+def _select_trie(results, html, trie, sync, limits=None):
+    r"""Helper. Select paths of `trie` node into `results`, see _select_shared()."""
+    for index, path in trie.paths:
+        results[index] = _select_desc([], html, path, sync=sync, limit=limits and limits[index])
+    for step, sub in trie.children:
+        part = _select_desc([], html, [step], sync=sync)
+        if part:
+            _select_trie(results, part, sub, sync, limits)
+        else:
+            for index in sub.indexes:
+                results[index] = []
+
+
+class _UnionMember(object):
+    r"""
+    Helper. Single alternative (the last selector of path) in union, see _Union.
+
+    Parameters
+    ----------
+    sel : Selector
+        The last selector of group path.
+    """
+
+    __slots__ = ('tag', 'rx', 'nodefilter', 'values')
+
+    def __init__(self, sel):
+        self.tag = '' if sel.tag == '*' else sel.tag.lower()
+        # tag name is checked by _Union already
+        self.rx = tag_regexes(self.tag, dict(sel.attrs)) if sel.attrs else ()
+        code = selector_code(sel)
+        self.nodefilter = code.nodefilter
+        self.values = code.values
+
+    def match(self, item, ts, cs):
+        r"""True if tag `item[ts:cs]` matches tag name and attributes."""
+        for rx in self.rx:
+            r = rx.match(item, ts, cs)
+            if not r or r.end() != cs:
+                return False
+        return True
+
+
+class _TagMembers(dict):
+    r"""Helper. Union members for tag name (case-insensitive), see _Union."""
+
+    __slots__ = ('members', )
+
+    def __init__(self, members):
+        self.members = members
+
+    def __missing__(self, tag):
+        lower = tag.lower()
+        members = self[tag] = [m for m in self.members if m.tag in (lower, '')]
+        return members
+
+
+class _Union(object):
+    r"""
+    Helper. Group selector (A, B) evaluated in one scan, see _union_plan().
+
+    Paths share the same `prefix` (can be empty), the last selectors
+    (`members`) are found by one regex with all tag names.
+    """
+
+    __slots__ = ('prefix', 'members', 'rx', 'by_tag')
+
+    def __init__(self, prefix, members):
+        self.prefix = prefix
+        self.members = members
+        tags = set(m.tag for m in members)
+        name = pats.anyTag if '' in tags else '|'.join(sorted(tags))
+        self.rx = regex(r'<(?P<tag>{tag})(?=[\s/>]){anyAttr}\s*/?>'.format(tag=name, **pats),
+                        re.DOTALL | re.IGNORECASE)
+        #: Members for tag name, any tag members are in all lists.
+        self.by_tag = _TagMembers(members)
+
+
+def _union_plan(group_selector):
+    r"""
+    Helper. Returns _Union for group selector or None if it can't be evaluated in one scan.
+
+    All paths must have the same prefix (without results) and the last
+    selector must be simple (tag, attributes, filters, any position, no limit).
+    All last selectors must have the same results, so node matched by many
+    paths gives the same row and nothing is lost if it's returned once.
+    """
+    if len(group_selector) < 2:
+        return None
+    prefix = pkey = result = None
+    members = []
+    for path in group_selector:
+        if not path or not all(isinstance(sel, Selector) for sel in path):
+            return None
+        sel = path[-1]
+        if (sel.elem_pos != TagPosition.Any or sel.item_source != ItemSource.Content
+                or sel.result == [Result.NoResult] or sel.limit is not None
+                or any(s.result for s in path[:-1])):
+            return None
+        if result is None:
+            result = sel.result
+        elif sel.result != result:
+            return None
+        key = [s.key for s in path[:-1]]
+        if prefix is None:
+            prefix, pkey = path[:-1], key
+        elif key != pkey:
+            return None
+        members.append(_UnionMember(sel))
+    return _Union(prefix, members)
+
+
+def _select_union(res, html, union):
+    r"""
+    Select group selector (A, B) in one scan, see _Union.
+
+    Results are in document order, node matched by many alternatives
+    is returned once (all alternatives have the same results).
+    """
+    if union.prefix:
+        html = _select_desc([], html, union.prefix)
+    by_tag = union.by_tag
+    for item in html:
+        item = _tostr(item)
+        if not item:
+            continue
+        for r in union.rx.finditer(item):
+            ts, cs = r.span()
+            node = None
+            for m in by_tag[r.group('tag')]:
+                if not m.rx or m.match(item, ts, cs):
+                    if node is None:
+                        node = Node(tagstr=r.group(), item=item, tagindex=(ts, cs))
+                    if m.nodefilter is None or m.nodefilter(node):
+                        res.append(node if m.values is None else m.values(node))
+                        break
+    return res
+
+
+#: Attribute name captured in fused regex (see _Fused).
+_fused_attr_re = re.compile(r'[\w-]+$')
+
+
+class _Fused(object):
+    r"""
+    Helper. Simple selector (e.g. `a[href]::attr(href)`) fused into one regex, see _fused_plan().
+
+    Tag attributes are matched one by one and every needed attribute (results
+    and `.class` words) has its own named group, so values are captured
+    directly by the scan. Group keeps the last matched attribute (the last
+    one wins like in Node.attrs). Node is not created, closing tag is never
+    searched. Selector attribute (e.g. `[href]`) is checked by lookahead.
+
+    Parameters
+    ----------
+    name : str
+        Tag name pattern, see tag_args().
+    attr : str or None
+        Attribute name pattern, see pats.melem().
+    val : str or bool or None
+        Attribute value pattern, see pats.melem().
+    results : list of str
+        Requested attributes (lower case).
+    words : list of WordFilter
+        Word filters checked on captured values.
+    """
+
+    __slots__ = ('rx', 'results', 'words', 'groups')
+
+    def __init__(self, name, attr, val, results, words):
+        self.results = results
+        self.words = words
+        names = list(results)
+        for wf in words:
+            names += [a.lower() for a, _, _ in wf.checks]
+        names = list(OrderedDict.fromkeys(names))
+        # group is the whole attribute (name and value), it's always set if attribute exists
+        caps = ''.join(r'''(?P<v{i}>{aname}(?![\w-]){anyAttrVal})|'''.format(i=i, aname=re.escape(aname), **pats)
+                       for i, aname in enumerate(names))
+        cond = ''
+        if attr:
+            # the same like pats.melem(), but the first attribute is found from left
+            cond = r'''(?=(?:\s+{anyAttrName}{anyAttrVal})*?{attr}{anyAttr}\s*/?>)'''.format(
+                attr=pats.mattr(attr, val), **pats)
+        self.rx = regex(r'''<{tag}{cond}(?:\s+(?:{caps}{anyAttrName}{anyAttrVal}))*\s*/?>'''
+                        .format(tag=pats.mtag(name), cond=cond, caps=caps, **pats),
+                        re.DOTALL | re.IGNORECASE)
+        #: Group index (in match.groups()) and name length by attribute.
+        self.groups = {aname: (self.rx.groupindex['v{}'.format(i)] - 1, len(aname))
+                       for i, aname in enumerate(names)}
+
+
+def _fused_plan(group_selector):
+    r"""
+    Helper. Returns _Fused for group selector or None if the general engine is needed.
+
+    Only single selector (no path) with attribute results, any position,
+    one tag regex (see tag_regexes()) and word filters only (`.class`)
+    could be fused. Nothing depends on closing tags there.
+    """
+    if len(group_selector) != 1 or len(group_selector[0]) != 1:
+        return None
+    sel = group_selector[0][0]
+    if (not isinstance(sel, Selector) or sel.elem_pos != TagPosition.Any
+            or sel.item_source != ItemSource.Content or sel.optional or not sel.result
+            or sel.limit is not None  # stops after the first hit (e.g. #id)
+            or not all(isinstance(f, WordFilter) for f in sel.nodefilterlist)):
+        return None
+    for ritem in sel.result:
+        # upper case attribute is never found (see _compile_ret()), leave it to the general engine
+        if not isinstance(ritem, base_str) or ritem != ritem.lower() or not _fused_attr_re.match(ritem):
+            return None
+    if not all(_fused_attr_re.match(a) for wf in sel.nodefilterlist for a, _, _ in wf.checks):
+        return None
+    args = tag_args('' if sel.tag == '*' else sel.tag, dict(sel.attrs))
+    if len(args) != 1:
+        return None
+    name, attr, val = args[0]
+    if val is False:  # [attr!=val]
+        return None
+    return _Fused(name, attr, val, results=list(sel.result), words=list(sel.nodefilterlist))
+
+
+def _select_fused(res, html, fused):
+    r"""
+    Select simple selector by one fused regex, see _Fused.
+
+    Results are the same like in _select_desc(): list of attribute values
+    (None if missing) for every found tag.
+    """
+    groups, words = fused.groups, fused.words
+    results = [groups[attr] for attr in fused.results]
+    g = None
+
+    def value(index):
+        i, n = index
+        v = g[i]
+        if v is None:
+            return None
+        v = v[n+1:]  # skip name and '='
+        return v[1:-1] if v[:1] in ('"', "'") else v
+
+    def get_tokens(attr):
+        return frozenset((value(groups[attr.lower()]) or '').lower().split())
+
+    for item in html:
+        item = _tostr(item)
+        if not item:
+            continue
+        for r in fused.rx.finditer(item):
+            g = r.groups()
+            if words and not all(wf.check(get_tokens) for wf in words):
+                continue
+            res.append([value(index) for index in results])
+    return res
+
+
+def _select_group(res, html, group_selector, grouped=True):
+    r"""
+    Select group selector (A, B).
+
+    Results of A are followed by results of B. If `grouped` is false and all
+    paths could be evaluated in one scan (see _union_plan()) results are
+    in document order without duplicates.
+    """
     assert isinstance(group_selector, GroupSelector)
+    if not any(item is None or isrealsequence(item) for item in html):
+        try:
+            fused = group_selector._fused
+        except AttributeError:
+            fused = group_selector._fused = _fused_plan(group_selector)
+        if fused is not None:
+            return _select_fused(res, html, fused)
+    if not grouped and not any(item is None or isrealsequence(item) for item in html):
+        try:
+            union = group_selector._union
+        except AttributeError:
+            union = group_selector._union = _union_plan(group_selector)
+        if union is not None:
+            return _select_union(res, html, union)
+    trie = _path_trie(group_selector)
+    if trie.shared:
+        for res2 in _select_shared(html, trie, len(group_selector)):
+            res += res2
+        return res
+    # Go through set selector
     for sel in group_selector:
         #print('SEL-SET', sel)
         _select_desc(res, html, sel)
+    return res
 
 
-def dom_select(html, selectors):
+class CompiledSelector(object):
+    r"""
+    Parsed selector, can be used in dom_select() many times.
+
+    Selector is parsed once and dom_search() results extraction is compiled
+    on the first use, next calls use it directly.
+
+    Parameters
+    ----------
+    selector : str
+        Selector string, see dom_select().
+    unique_ids : bool, default False
+        If True ids are unique in the document and `#id` steps stop after
+        the first hit, see moptimize.optimize().
+
+    Attributes
+    ----------
+    group : GroupSelector
+        Parsed and optimized selector, see moptimize.optimize().
+    rules : list of str
+        Names of applied optimizer rules.
+    """
+
+    __slots__ = ('selector', 'unique_ids', 'group', 'rules')
+
+    def __init__(self, selector, unique_ids=False):
+        self.selector = selector
+        self.unique_ids = unique_ids
+        self.rules = []
+        self.group = optimize(parse_selector(selector), self.rules, unique_ids=unique_ids)
+
+    def __repr__(self):
+        if self.unique_ids:
+            return 'CompiledSelector({!r}, unique_ids=True)'.format(self.selector)
+        return 'CompiledSelector({!r})'.format(self.selector)
+
+    def source(self):
+        r"""Returns generated Python code of all selectors (for debugging), see selector_code()."""
+        def walk(items):
+            for item in items:
+                if isinstance(item, Selector):
+                    yield selector_code(item).source
+                else:
+                    for src in walk(item):
+                        yield src
+        return '\n'.join(walk(self.group))
+
+
+#: Cache of compiled selectors.
+_selector_cache = {}
+
+#: Max size of compiled selectors cache.
+SELECTOR_CACHE_SIZE = 256
+
+
+def _selector_key(selector, unique_ids=False):
+    r"""Helper. Key of compiled selectors cache."""
+    return (selector, True) if unique_ids else selector
+
+
+def compile_selector(selector, unique_ids=False):
+    r"""
+    Returns compiled selector (CompiledSelector). Last used selectors are cached.
+
+    If `unique_ids` is True `#id` steps stop after the first hit, use it only
+    if the page has unique ids, see CompiledSelector.
+    """
+    if isinstance(selector, CompiledSelector):
+        return selector
+    key = _selector_key(selector, unique_ids)
+    try:
+        return _selector_cache[key]
+    except KeyError:
+        pass
+    if len(_selector_cache) >= SELECTOR_CACHE_SIZE:
+        _selector_cache.clear()
+    compiled = _selector_cache[key] = CompiledSelector(selector, unique_ids=unique_ids)
+    return compiled
+
+
+def _select_columnar(html, group_selector):
+    r"""
+    Select nodes and returns Columns (see ResultParam) for the last selector.
+
+    Only single path without results in the middle is supported.
+    """
+    if len(group_selector) != 1:
+        raise ValueError('Columnar select needs single selector path (no "A, B")')
+    path = group_selector[0]
+    sel = path[-1]
+    if not isinstance(sel, Selector) or any(not isinstance(s, Selector) or s.result for s in path[:-1]):
+        raise ValueError('Columnar select supports results on the last selector only')
+    if len(path) > 1:
+        html = _select_desc([], html, path[:-1])
+    tag = '' if sel.tag == '*' else sel.tag
+    try:
+        param = sel._params['columnar']
+    except KeyError:
+        param = sel._params['columnar'] = ResultParam(sel.result or [Result.Node],
+                                                      nodefilter=_selector_param(sel, False).nodefilter,
+                                                      position=sel.elem_pos, source=sel.item_source,
+                                                      columnar=True)
+    return dom_search(html, tag, attrs=dict(sel.attrs), ret=param)
+
+
+def dom_select(html, selectors, columnar=False, grouped=True):
     r"""
     Find data in HTML by CSS / jQuery simplified selector.
 
@@ -170,8 +663,17 @@ def dom_select(html, selectors):
     ----------
     html : str or bytes or Node or DomMatch or list of str or list of bytes or list of Node
         HTML/XML source. Directly or list of HTML/XML parts.
-    selectors : str or list of str
-        Selector (or list of selectors).
+    selectors : str or CompiledSelector or list of str
+        Selector (or list of selectors), see also compile_selector().
+    columnar : bool, default False
+        If True returns Columns (one column per result, e.g. `a::attr(href, title)`),
+        see ResultParam. Only single path selectors are supported.
+    grouped : bool, default True
+        If True results of group selector (`A, B`) are grouped: all A, then all B.
+        If False and paths could be found in one scan (simple last selectors
+        with common prefix and the same results, e.g. `a, img` or
+        `ul a(href), ul img(href)`), results are in document order without
+        duplicates. Otherwise results are grouped anyway.
 
     See CSS and jQuery selectors for base knowlage. This function support
     only a few selectors plus some extra extension.
@@ -181,7 +683,7 @@ def dom_select(html, selectors):
         - #id          The element with id
         - .class       All elements with class
         - tag          All <tag> elements
-        - E1, E1       Or, all E1 and all E2 matched elements
+        - E1, E2       Or, all E1 and all E2 matched elements
         - E1 E2        Parent descendant, all E2 elements that are descendants of a E1 element
         - [attr]       All elements with a attribute `attr`
         - [attr=val]   All elements with a attribute value equal `val`
@@ -233,7 +735,7 @@ def dom_select(html, selectors):
     #
     #print(' --- search for "{}"'.format(selectors))
     ret = []
-    if isinstance(selectors, base_str):
+    if isinstance(selectors, (base_str, CompiledSelector)):
         ret = None
         selectors = [ selectors ]
 
@@ -241,10 +743,13 @@ def dom_select(html, selectors):
 
     # all selector from list
     for selgrp in selectors:
-        selgrp = parse_selector(selgrp)
+        selgrp = compile_selector(selgrp).group
         # Go through set selector
-        res = []  # All matches for single selector
-        _select_group(res, html, selgrp)
+        if columnar:
+            res = _select_columnar(html, selgrp)
+        else:
+            res = []  # All matches for single selector
+            _select_group(res, html, selgrp, grouped=grouped)
         #print('RES', res)
         if ret == None:
             ret = res
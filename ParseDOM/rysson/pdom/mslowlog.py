@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, unicode_literals, print_function
+
+import os
+import io
+import json
+import time
+import hashlib
+import threading
+from collections import deque
+from timeit import default_timer as _timer
+
+from . import msearch as _msearch
+from . import mselect as _mselect
+from .base import Node, _tostr, _make_html_list, isrealsequence
+from .mprofile import swap_functions, restore_functions
+
+
+def _document(html):
+    r"""Helper. Returns document text of dom_select() / dom_search() input (parts are joined)."""
+    parts = []
+    for item in _make_html_list(html):
+        if isrealsequence(item):
+            parts.append(_document(item))
+        elif isinstance(item, Node):
+            parts.append(item.outerHTML)
+        else:
+            parts.append(_tostr(item))
+    return ''.join(parts)
+
+
+def fingerprint(text):
+    r"""Returns short document fingerprint (first 12 hex digits of SHA-1 of UTF-8 text)."""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+
+
+def _count(res):
+    r"""Helper. Number of items in dom_search() / dom_select() result."""
+    if isinstance(res, tuple):  # separate results: (values, nodes)
+        res = res[0]
+    try:
+        return len(res)
+    except TypeError:  # generator, Columns etc.
+        return None
+
+
+class SlowLog(object):
+    r"""
+    Log of slow dom_select() and dom_search() calls, see slow_log().
+
+    Every top-level call (not steps of dom_select()) longer then `threshold`
+    is recorded as dict:
+
+        time         call end (Unix time)
+        func         'dom_select' or 'dom_search'
+        selector     selector string (dom_search: name, attrs and ret)
+        size         document size (characters)
+        fingerprint  short document hash, see fingerprint()
+        candidates   nodes found by all dom_search() steps (dom_select only)
+        results      number of results (None if unknown)
+        elapsed      call time [s]
+        error        exception class name or None
+        capture      path of saved document or None
+
+    Records are kept in ring buffer `records` and appended to rotating JSONL
+    file `path` (if used). Document is saved to `capture` directory (once per
+    fingerprint). Document size and fingerprint are computed for slow calls
+    only, fast calls pay for two timer calls.
+
+    Parameters
+    ----------
+    threshold : float
+        Minimal time [s] of logged call.
+    size : int
+        Max number of records in `records` ring buffer.
+    path : str or None
+        JSONL file to append records to.
+    max_bytes : int
+        JSONL file is rotated (`path.1`, `path.2`, ...) if it's longer.
+    backups : int
+        Number of rotated JSONL files.
+    capture : str or None
+        Directory to save documents of slow calls (`<fingerprint>.html`).
+    """
+
+    def __init__(self, threshold=0.5, size=100, path=None, max_bytes=1024*1024, backups=3, capture=None):
+        self.threshold = threshold
+        self.records = deque(maxlen=size)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.capture = capture
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._swapped = None
+
+    @property
+    def running(self):
+        r"""True if calls are logged."""
+        return self._swapped is not None
+
+    def _wrapper(self, func, name):
+        r"""Helper. Returns timing wrapper of dom_select() or dom_search()."""
+        local = self._local
+
+        def wrapper(html, *args, **kwargs):
+            if getattr(local, 'depth', 0):
+                # step of outer call, count found nodes only
+                res = func(html, *args, **kwargs)
+                count = _count(res)
+                if count:
+                    local.candidates += count
+                return res
+            local.depth, local.candidates = 1, 0
+            res = error = None
+            t = _timer()
+            try:
+                res = func(html, *args, **kwargs)
+                return res
+            except Exception as exc:
+                error = exc.__class__.__name__
+                raise
+            finally:
+                elapsed = _timer() - t
+                local.depth = 0
+                if elapsed >= self.threshold:
+                    self._record(name, html, args, kwargs, res, error, elapsed, local.candidates)
+        return wrapper
+
+    def _record(self, name, html, args, kwargs, res, error, elapsed, candidates):
+        r"""Helper. Add record of slow call."""
+        if name == 'dom_select':
+            selector = args[0] if args else kwargs.get('selectors')
+            selector = getattr(selector, 'selector', selector)  # CompiledSelector
+            if not isinstance(selector, (type(''), type(b''))):
+                selector = [getattr(sel, 'selector', sel) for sel in selector]
+        else:
+            params = dict(zip(('name', 'attrs', 'ret'), args), **kwargs)
+            selector = 'name={!r}, attrs={!r}, ret={!r}'.format(params.get('name'), params.get('attrs'),
+                                                               params.get('ret'))
+            candidates = None
+        try:
+            doc = _document(html)
+        except Exception:
+            doc = ''
+        record = {
+            'time': time.time(),
+            'func': name,
+            'selector': selector,
+            'size': len(doc),
+            'fingerprint': fingerprint(doc),
+            'candidates': candidates,
+            'results': _count(res),
+            'elapsed': elapsed,
+            'error': error,
+            'capture': None,
+        }
+        with self._lock:
+            if self.capture:
+                record['capture'] = self._capture(doc, record['fingerprint'])
+            self.records.append(record)
+            if self.path:
+                self._write(record)
+
+    def _capture(self, doc, fp):
+        r"""Helper. Save document to capture directory, returns its path."""
+        path = os.path.join(self.capture, '{}.html'.format(fp))
+        try:
+            if not os.path.exists(path):
+                if not os.path.isdir(self.capture):
+                    os.makedirs(self.capture)
+                with io.open(path, 'w', encoding='utf-8') as f:
+                    f.write(doc)
+        except (IOError, OSError):
+            return None
+        return path
+
+    def _write(self, record):
+        r"""Helper. Append record to JSONL file, rotate it if it's too long."""
+        line = json.dumps(record, default=repr) + '\n'
+        try:
+            if os.path.exists(self.path) and os.path.getsize(self.path) + len(line) > self.max_bytes:
+                for i in range(self.backups - 1, 0, -1):
+                    src = '{}.{}'.format(self.path, i)
+                    if os.path.exists(src):
+                        os.rename(src, '{}.{}'.format(self.path, i + 1))
+                if self.backups > 0:
+                    os.rename(self.path, '{}.1'.format(self.path))
+                else:
+                    os.remove(self.path)
+            with io.open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line if isinstance(line, type('')) else line.decode('utf-8'))
+        except (IOError, OSError):
+            pass  # log never breaks selecting
+
+    def start(self):
+        r"""Start logging (swap dom_select() and dom_search() wrappers in)."""
+        if self._swapped is None:
+            dom_select, dom_search = _mselect.dom_select, _msearch.dom_search
+            self._swapped = swap_functions([(dom_select, self._wrapper(dom_select, 'dom_select')),
+                                            (dom_search, self._wrapper(dom_search, 'dom_search'))])
+        return self
+
+    def stop(self):
+        r"""Stop logging (restore original functions)."""
+        if self._swapped is not None:
+            restore_functions(self._swapped)
+            self._swapped = None
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def slow_log(threshold=0.5, size=100, path=None, max_bytes=1024*1024, backups=3, capture=None):
+    r"""
+    Start logging of slow dom_select() and dom_search() calls, returns SlowLog.
+
+    >>> log = pdom.slow_log(0.2, path='/tmp/pdom-slow.jsonl', capture='/tmp/pdom-pages')
+    >>> ...
+    >>> for rec in log.records:
+    ...     print(rec['elapsed'], rec['selector'], rec['fingerprint'])
+
+    Wrappers replace references in pdom (and its top package) modules, start
+    it before `from pdom import select` in other modules or call `pdom.select()`.
+    Use `log.stop()` or `with pdom.slow_log(...) as log:` to stop logging.
+    See SlowLog for parameters and record fields.
+    """
+    return SlowLog(threshold=threshold, size=size, path=path, max_bytes=max_bytes,
+                   backups=backups, capture=capture).start()
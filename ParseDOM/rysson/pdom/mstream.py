@@ -0,0 +1,440 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, unicode_literals, print_function
+
+import re
+import codecs
+from copy import copy
+from collections import deque
+
+from .base import type_str, type_bytes, base_str
+from .base import MissingAttr, TagPosition, ItemSource
+from .base import pats, Response
+from .base import _tostr
+from .base import Node
+from .msearch import _node_values, _ritem_enum, _compile_ret, tag_regexes
+from .mselect import _select_desc, _select_group
+from .mselect import CompiledSelector, compile_selector
+from .selectorparser import Selector, SelectorPath, GroupSelector
+from .mcodegen import _struct_pseudo
+
+
+#: Default size of chunk read from file-like objects and responses.
+CHUNK_SIZE = 64 * 1024
+
+#: Collected chunks size when buffer is always scanned.
+SCAN_SIZE = 16 * 1024
+
+nodeTag_re = re.compile(pats.nodeTag, re.DOTALL)
+
+#: Tag cut by the end of buffer (no `>` outside quotes up to the end).
+incompleteTag_re = re.compile(r'''<(?:/?[\w-]|/?\Z)(?:[^>"']|"[^"]*"|'[^']*')*(?:"[^"]*|'[^']*)?\Z''', re.DOTALL)
+
+
+def _iter_read(source, chunk_size):
+    r"""Helper. Generate chunks from file-like object."""
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def _iter_text(source, chunk_size=CHUNK_SIZE):
+    r"""
+    Helper. Generate text chunks from streamed source.
+
+    Parameters
+    ----------
+    source : str or bytes or Response or file-like or iterable
+        HTML/XML source. Single string, requests.Response (`stream=True`
+        is welcome), file-like object (with read()) or any iterable
+        of str or bytes chunks.
+    chunk_size : int
+        Size of chunk read from Response or file-like object.
+
+    Bytes are decoded incrementally, so multi-byte characters can be
+    split between chunks.
+    """
+    encoding = None
+    if isinstance(source, (type_str, type_bytes)):
+        chunks = [source]
+    elif Response and isinstance(source, Response):
+        chunks, encoding = source.iter_content(chunk_size), source.encoding
+    elif hasattr(source, 'read'):
+        chunks = _iter_read(source, chunk_size)
+    else:
+        chunks = source
+    decoder = None
+    for chunk in chunks:
+        if isinstance(chunk, type_bytes):
+            if decoder is None:
+                try:
+                    decoder = codecs.getincrementaldecoder(encoding or 'utf-8')(errors='replace')
+                except LookupError:
+                    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            chunk = decoder.decode(chunk)
+        if chunk:
+            yield chunk
+    if decoder is not None:
+        chunk = decoder.decode(b'', True)
+        if chunk:
+            yield chunk
+
+
+def _close_source(source):
+    r"""Helper. Close streamed source (Response, file, generator) if it is possible."""
+    close = getattr(source, 'close', None)
+    if close is not None:
+        close()
+
+
+def _incomplete(text, start, end):
+    r"""Helper. Returns position of tag cut by the end of buffer in `text[start:end]` or -1."""
+    p = text.find('<', start, end)
+    while p >= 0:
+        if incompleteTag_re.match(text, p):
+            return p
+        p = text.find('<', p + 1, end)
+    return -1
+
+
+class _StreamMatcher(object):
+    r"""
+    Helper. Check if streamed tag matches tag name and attributes.
+
+    Parameters
+    ----------
+    name : str or None
+        Tag name ot None if you want to match any tag. Can be regex string.
+    attrs : dict or None
+        Attributes to match, the same like in dom_search().
+    position : TagPosition
+        Which tags could match: any, root-level or first only.
+    nodefilter : callable or None
+        Filter found (closed) nodes: nodefilter(node) -> bool.
+    data
+        Any user data (e.g. selector path).
+    """
+
+    __slots__ = ('rx', 'position', 'nodefilter', 'data')
+
+    def __init__(self, name=None, attrs=None, position=TagPosition.Any, nodefilter=None, data=None):
+        self.rx = tag_regexes(name, attrs)
+        self.position = position
+        self.nodefilter = nodefilter
+        self.data = data
+
+    def match(self, text, ts, cs):
+        r"""True if tag `text[ts:cs]` matches."""
+        for rx in self.rx:
+            r = rx.match(text, ts, cs)
+            if not r or r.end() != cs:
+                return False
+        return True
+
+
+class _Candidate(object):
+    r"""Helper. Matched tag waiting for its closing tag."""
+
+    __slots__ = ('ts', 'cs', 'ce', 'te', 'matcher')
+
+    def __init__(self, ts, cs, matcher):
+        self.ts, self.cs, self.ce, self.te = ts, cs, None, None
+        self.matcher = matcher
+
+
+def _stream_nodes(source, matchers, chunk_size=CHUNK_SIZE):
+    r"""
+    Helper. Find nodes in streamed HTML.
+
+    Generates `(matcher, node)` in document order (order of opening tags)
+    as soon as node closing tag has arrived. All tags are tracked in one
+    pass, closing tags are resolved exactly like in find_node().
+
+    Scanning stops on tag cut by the end of buffer (see _incomplete()), so
+    results do not depend on chunk boundaries.
+
+    The buffer keeps text from the oldest not closed candidate only,
+    older text is dropped. Yielded nodes are detached: node item is node
+    outerHTML, so nodes do not hold the stream buffer.
+
+    Structural pseudo-classes (e.g. :first-child) see the node only,
+    _select_iter() does not stream such selectors.
+    """
+    text, base = '', 0      # buffer and absolute offset of its first character
+    pos = 0                 # absolute scan position
+    stack = []              # open elements: (name, candidates or None)
+    pending = deque()       # candidates in document order
+    first = True            # the first tag in the document (TagPosition.FirstOnly)
+    collected, size = [], 0
+
+    def node_of(cand):
+        off = cand.ts - base
+        outer = text[off : cand.te - base]
+        node = Node(tagstr=outer[:cand.cs - cand.ts], item=outer, tagindex=(0, cand.cs - cand.ts))
+        node.ce, node.te = cand.ce - cand.ts, cand.te - cand.ts
+        return node
+
+    chunks = _iter_text(source, chunk_size)
+    while True:
+        chunk = next(chunks, None)
+        eof = chunk is None
+        if not eof:
+            collected.append(chunk)
+            size += len(chunk)
+            if size < SCAN_SIZE and size < len(text):
+                continue  # wait for more data, amortize joining of long buffer
+        if collected:
+            text = ''.join([text] + collected)
+            collected, size = [], 0
+        rel = last = pos - base
+        hold = -1  # unfinished tag, scanning stops there and waits for more data
+        for r in nodeTag_re.finditer(text, rel):
+            ts, cs = r.span()
+            if not eof and ts != last and text.find('<', last, ts) >= 0:
+                # tag-like text in attribute value of unfinished tag is not a tag
+                hold = _incomplete(text, last, ts)
+                if hold >= 0:
+                    break
+            last = cs
+            name = r.group('beg')
+            if name:
+                cands = None
+                for matcher in matchers:
+                    if matcher.position == TagPosition.RootLevel and stack:
+                        continue
+                    if matcher.position == TagPosition.FirstOnly and not first:
+                        continue
+                    if matcher.match(text, ts, cs):
+                        cand = _Candidate(base + ts, base + cs, matcher)
+                        pending.append(cand)
+                        if cands is None:
+                            cands = []
+                        cands.append(cand)
+                first = False
+                if r.group('slf'):
+                    for cand in cands or ():
+                        cand.ce = cand.te = cand.cs
+                else:
+                    stack.append((name, cands))
+            else:
+                name = r.group('end')
+                while stack:
+                    sname, cands = stack.pop()
+                    for cand in cands or ():
+                        cand.ce, cand.te = base + ts, base + cs
+                    if sname == name:
+                        break
+            # yield as soon as possible (consumer can stop early)
+            while pending and pending[0].te is not None:
+                cand = pending.popleft()
+                node = node_of(cand)
+                if cand.matcher.nodefilter is None or cand.matcher.nodefilter(node):
+                    yield cand.matcher, node
+        if hold < 0:
+            hold = _incomplete(text, last, len(text))
+        pos = base + (hold if hold >= 0 else len(text))
+        if eof:
+            # not closed tags has no content, like in find_node()
+            for cand in pending:
+                if cand.te is None:
+                    cand.ce = cand.te = cand.cs
+            for cand in pending:
+                node = node_of(cand)
+                if cand.matcher.nodefilter is None or cand.matcher.nodefilter(node):
+                    yield cand.matcher, node
+            break
+        # drop text which is no longer needed
+        keep = min(pending[0].ts, pos) if pending else pos
+        if keep - base > len(text) // 2:
+            text, base = text[keep - base:], keep
+
+
+def dom_search_iter(html, name=None, attrs=None, ret=None, chunk_size=CHUNK_SIZE, limit=None):
+    r"""
+    Incremental (streaming) dom_search().
+
+    Parameters
+    ----------
+    html : str or bytes or Response or file-like or iterable of str or bytes
+        HTML/XML source. Whole page or chunks (e.g. `Response.iter_content()`).
+    name : str or bytes or None
+        Tag name ot None if you want to match any tag. Can be regex string (e.g. "div|p").
+    attr : dict or None
+        Attributes to match or None if attributes has no matter. See dom_search().
+    ret : str or list of str or Node or DomMatch or ResultParam or False or None
+        What to return, the same like in dom_search().
+    chunk_size : int
+        Size of chunk read from Response or file-like object.
+    limit : int or None
+        Stop after `limit` items. Input is not read any more and it is closed
+        (if it has close() method, e.g. Response or file).
+
+    Yields
+    ------
+    Matched tags content or attribute or Node(), the same items like dom_search()
+    returns. Item is generated as soon as its closing tag arrives.
+
+    ResultParam `separate` and `sync` are not supported.
+    """
+    try:
+        skip_missing = ret.missing
+        nodefilter = ret.nodefilter
+        position = ret.position
+        ret = ret.args  # get requested ret
+    except AttributeError:
+        skip_missing = MissingAttr.SkipIfDirect
+        nodefilter = None
+        position = TagPosition.Any
+    if isinstance(ret, (list, tuple)):
+        direct = False
+        skip_missing = skip_missing == MissingAttr.SkipAll
+    else:
+        direct, ret = True, [ ret ]
+        skip_missing = skip_missing != MissingAttr.NoSkip
+    extractors = _compile_ret([_ritem_enum(ritem) for ritem in ret], skip_missing)
+    matcher = _StreamMatcher(name, attrs, position=position, nodefilter=nodefilter)
+    if limit is not None and limit <= 0:
+        return
+    count = 0
+    for _, node in _stream_nodes(html, [matcher], chunk_size=chunk_size):
+        values = _node_values(node, extractors, skip_missing)
+        if not direct:
+            values = [values] if values or not skip_missing else ()
+        for val in values:
+            count += 1
+            if count == limit:
+                _close_source(html)  # the last item, do not wait for next()
+                yield val
+                return
+            yield val
+
+
+def dom_select_iter(html, selectors, chunk_size=CHUNK_SIZE, limit=None):
+    r"""
+    Incremental (streaming) dom_select().
+
+    Parameters
+    ----------
+    html : str or bytes or Response or file-like or iterable of str or bytes
+        HTML/XML source. Whole page or chunks (e.g. `Response.iter_content()`).
+    selectors : str
+        Selector, see dom_select().
+    chunk_size : int
+        Size of chunk read from Response or file-like object.
+    limit : int or None
+        Stop after `limit` items. Input is not read any more and it is closed
+        (if it has close() method, e.g. Response or file).
+
+    Yields
+    ------
+    The same items like dom_select() returns. The first node of selector
+    path is streamed, rest of path is processed when the node is closed.
+
+    Items of group selector (A, B) are generated in document order.
+    If any selector path starts with set ({A, B}), the first selector uses node
+    position or siblings (e.g. `li:first-child`) or path uses siblings
+    (`A + B`, `A ~ B`), whole input is read first and items are the same
+    like dom_select() returns.
+    """
+    if limit is not None and limit <= 0:
+        return
+    count = 0
+    for row in _select_iter(html, selectors, chunk_size):
+        count += 1
+        if count == limit:
+            _close_source(html)  # the last item, do not wait for next()
+            yield row
+            return
+        yield row
+
+
+def dom_select_one(html, selectors, default=None, chunk_size=CHUNK_SIZE):
+    r"""
+    Find the first item by selector, see dom_select().
+
+    Parameters
+    ----------
+    html : str or bytes or Response or file-like or iterable of str or bytes
+        HTML/XML source. Whole page or chunks (e.g. `Response.iter_content()`).
+    selectors : str
+        Selector, see dom_select().
+    default
+        Returned if nothing is found.
+    chunk_size : int
+        Size of chunk read from Response or file-like object.
+
+    Returns
+    -------
+    The first item (the same like dom_select()[0]) or `default`.
+
+    Input is read only until the first item is found, then it is closed
+    (if it has close() method, e.g. Response or file). Useful for
+    `<link rel=next>` or `og:` meta tags in `<head>` of long pages.
+
+    >>> with requests.get(url, stream=True) as resp:
+    ...     title = dom_select_one(resp, 'meta[property="og:title"]::attr(content)')
+    """
+    for row in dom_select_iter(html, selectors, chunk_size=chunk_size, limit=1):
+        return row
+    return default
+
+
+def _key_context(key):
+    r"""Helper. True if filter key needs node context (structural pseudo-class or siblings)."""
+    if key == ItemSource.Siblings:
+        return True
+    if isinstance(key, tuple):
+        if len(key) == 2 and key[0] in _struct_pseudo:
+            return True
+        return any(_key_context(k) for k in key)
+    return False
+
+
+def _streamable(path):
+    r"""
+    Helper. True if selector path could be streamed, see _select_iter().
+
+    Streamed node is detached (see _stream_nodes()), so the first selector
+    can't use its parent or siblings (e.g. `:first-child`, `:has(+ a)`)
+    and the rest of path can't leave the node (`A + B`, `A ~ B`).
+    """
+    if not isinstance(path[0], Selector) or any(_key_context(key) for key in path[0].filterkeys):
+        return False
+    return not any(getattr(sel, 'item_source', None) == ItemSource.Siblings for sel in path[1:])
+
+
+def _select_iter(html, selectors, chunk_size):
+    r"""Helper. Generator for dom_select_iter() without limits."""
+    selgrp = compile_selector(selectors).group if isinstance(selectors, (base_str, CompiledSelector)) else selectors
+    if not isinstance(selgrp, GroupSelector):
+        selgrp = GroupSelector([selgrp])
+    if not all(_streamable(path) for path in selgrp):
+        res = []
+        _select_group(res, [''.join(_iter_text(html, chunk_size))], selgrp)
+        for row in res:
+            yield row
+        return
+    matchers = []
+    for path in selgrp:
+        sel = path[0]
+        tag = '' if sel.tag == '*' else sel.tag
+        nodefilter = None
+        if sel.nodefilterlist:
+            nodefilter = lambda n, flist=sel.nodefilterlist: all(f(n) for f in flist)
+        if len(path) == 1 and not sel.result:
+            rest = None  # node itself is the result
+        else:
+            # the node is found already, rest of path starts on its outerHTML
+            first = copy(sel)
+            first.elem_pos, first.nodefilterlist, first.filterkeys = TagPosition.FirstOnly, [], []
+            first._key, first._params = None, {}
+            rest = SelectorPath([first] + path[1:])
+        matchers.append(_StreamMatcher(tag, dict(sel.attrs), position=sel.elem_pos,
+                                       nodefilter=nodefilter, data=rest))
+    for matcher, node in _stream_nodes(html, matchers, chunk_size=chunk_size):
+        if matcher.data is None:
+            yield node
+        else:
+            for row in _select_desc([], [node.item], matcher.data):
+                yield row
@@ -1,14 +1,16 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, unicode_literals, print_function
 
+import re
 from collections import defaultdict
-from functools import reduce
-from operator import xor
+from bisect import bisect_right
+from itertools import islice
 
 from .base import aWord, aWordStarts, aStarts, aEnds, aContains
 from .base import s_attrSelectors, s_resSelectors, pats, regex
 from .base import Node, DomMatch, Result, TagPosition, ItemSource, ResultParam
-from .msearch import dom_search
+from .msearch import tag_regexes
+from .mindex import struct_index, nth_expr
 
 
 from arpeggio import Optional, ZeroOrMore, OneOrMore, EOF
@@ -36,9 +38,11 @@ def id_sel():      return '#', ident
 def class_sel():   return '.', ident
 def attr_op():     return R('[$^~|*]?=|~')
 def attr_sel():    return '[', ident, Optional(attr_op, val), ']'
-def pseudo_sel():  return ':', ident, Optional(ZeroOrMoreValBr)
+def nth_val():     return R(r'[-+]?\d*n\s*[-+]\s*\d+')   # an+b, other forms are `val`
+def pseudo_sel():  return ':', ident, Optional([ ("(", SP, nth_val, SP, ")"), ZeroOrMoreValBr ])
 def pseudo_not():  return ':not', '(', simple_sel, ')'
-def param_sel():   return [ id_sel, class_sel, attr_sel, pseudo_not, pseudo_sel ]
+def pseudo_has():  return ':has', '(', SP, Optional(path_type), sel_path, SP, ')'
+def param_sel():   return [ id_sel, class_sel, attr_sel, pseudo_not, pseudo_has, pseudo_sel ]
 def res_attr():    return "(", SP, val, ZeroOrMore(SP, ",", SP, val), SP, ")"
 def res_param():   return "::", ident, Optional(ZeroOrMoreValBr)
 def simple_sel():  return [ (tag, Optional(opt_tag), ZeroOrMore(param_sel)), OneOrMore(param_sel) ]
@@ -46,7 +50,7 @@ def one_sel():     return simple_sel, Optional(res_attr), ZeroOrMore(res_param)
 def oset_sel():    return "{", SP, sel_path, ZeroOrMore(SP, ",", SP, sel_path), SP, "}"
 def set_sel():     return "{{", SP, sel_path, ZeroOrMore(SP, ",", SP, sel_path), SP, "}}"
 def single_sel():  return [ one_sel, set_sel, oset_sel ]
-def path_type():   return R('\s*[>+]\s*|\s+')
+def path_type():   return R('\s*[>+~]\s*|\s+')
 def sel_path():    return single_sel, ZeroOrMore(path_type, single_sel)
 def selector():    return sel_path, ZeroOrMore(SP, ",", SP, sel_path), EOF
 
@@ -70,8 +74,9 @@ def dump(tree, lvl=0, path=None):
 
 
 #
-# TODO:  Remove __hash__ functions.
-#        Add custom names for part-hash (hash only for search, not whole object).
+# Selector key is canonical structural key: selectors with equal keys find
+# the same nodes with the same results (`nth` is not included).
+# Hash is the key hash, it's used to detect shared steps (see mselect).
 #
 
 class Selector(object):
@@ -80,45 +85,219 @@ class Selector(object):
         self.tag = tag or ''
         self.optional = False
         self.attrs, self.result, self.nodefilterlist = defaultdict(lambda: []), [], []
+        self.filterkeys = []  # key for every filter in nodefilterlist
+        self.words = defaultdict(lambda: [set(), set()])  # attr: [words, word prefixes], see WordFilter
         self.param = [] if param is None else list(param)
-        self._hash = None
+        self._key = None
         self.nth = nth
         self.elem_pos = {'>': TagPosition.RootLevel,
                          '+': TagPosition.FirstOnly, }.get(path_type, TagPosition.Any)
-        self.item_source = {'+': ItemSource.After, }.get(path_type, ItemSource.Content)
+        self.item_source = {'+': ItemSource.Siblings,
+                            '~': ItemSource.Siblings, }.get(path_type, ItemSource.Content)
+        self._params = {}  # ResultParam cache, see mselect._selector_param()
+        self._code = None  # generated code, see mcodegen.selector_code()
+        self.limit = None  # max number of found nodes in every HTML part, see moptimize
     def __repr__(self):
         return 'Selector(tag={tag!r}, attrs={attrs}, param={param}, result={result}, ' \
                 'elem_pos={elem_pos}, item_source={item_source})'.format(**vars(self))
     def __hash__(self):
-        if self._hash is None:
-            self._hash = hash(self.tag) ^ hash(self.optional) ^ \
-                    hash(str(sorted(self.attrs.items()))) ^ \
-                    hash(str(self.result)) ^ hash(str(self.nodefilterlist)) ^ \
-                    hash(self.elem_pos) ^ hash(self.item_source)
-        return self._hash
+        return hash(self.key)
+    @property
+    def key(self):
+        r"""Canonical structural key (tuple), filter functions are represented by `filterkeys`."""
+        if self._key is None:
+            self._key = (self.tag.lower(), self.optional,
+                         tuple((attr, tuple(vals)) for attr, vals in sorted(self.attrs.items())),
+                         tuple(self.result), tuple(self.filterkeys),
+                         self.elem_pos, self.item_source, self.limit)
+        return self._key
+    def add_filter(self, nodefilter, key, first=False):
+        r"""Add node filter with its canonical `key` (e.g. pseudo-class name and arguments)."""
+        if first:
+            self.nodefilterlist.insert(0, nodefilter)
+            self.filterkeys.insert(0, key)
+        else:
+            self.nodefilterlist.append(nodefilter)
+            self.filterkeys.append(key)
+        self._key = None
 
 class GroupSelector(list):
     r"""Main group selector (A, B)."""
     def __hash__(self):
-        return reduce(xor, map(hash, self))
+        return hash(self.key)
+    @property
+    def key(self):
+        return (self.__class__.__name__, tuple(sel.key for sel in self))
 
 class SelectorPath(list):
     r"""Selector path (A B, A > B)."""
-    def __hash__(self):
-        return reduce(xor, map(hash, self))
+    __hash__ = GroupSelector.__hash__
+    key = GroupSelector.key
 
 class SetSelector(list):
     r"""Set selector ( {A, B} )."""
-    def __hash__(self):
-        return reduce(xor, map(hash, self))
+    __hash__ = GroupSelector.__hash__
+    key = GroupSelector.key
 
 class OrderedSetSelector(SetSelector):
     r"""Ordered set selector ( {(A, B)} )."""
 
 
-def nodefilterFalse(n):
-    r"""Force node to does NOT match."""
-    return False
+class WordFilter(object):
+    r"""
+    Node filter for `.class`, `[attr~=val]` and `[attr|=val]` selectors.
+
+    Words are checked against node attribute word set (see Node.tokens()),
+    so `.a.b.c` is one set check and unquoted values are supported.
+
+    Parameters
+    ----------
+    words : dict
+        Attribute name: (words, word prefixes).
+    """
+
+    __slots__ = ('checks', )
+
+    def __init__(self, words):
+        self.checks = tuple((attr, frozenset(w.lower() for w in words),
+                             tuple(sorted(p.lower() for p in starts)))
+                            for attr, (words, starts) in sorted(words.items()))
+
+    def __call__(self, node):
+        return self.check(node.tokens)
+
+    def check(self, get_tokens):
+        r"""Check words, `get_tokens(attr)` returns set of attribute words (like Node.tokens())."""
+        for attr, words, starts in self.checks:
+            tokens = get_tokens(attr)
+            if not words <= tokens:
+                return False
+            for s in starts:
+                if not any(t.startswith(s) for t in tokens):
+                    return False
+        return True
+
+    def __repr__(self):
+        return 'WordFilter({!r})'.format([(a, sorted(w), list(s)) for a, w, s in self.checks])
+
+
+class NotFilter(object):
+    r"""
+    Node filter for `:not(selector)`, e.g. `:not(.ad)`, `:not([href^="http"])`.
+
+    Found tag is matched against the same tag regexes as positive selector
+    uses (see tag_regexes()), node filters of the selector are called.
+
+    Parameters
+    ----------
+    sel : Selector
+        Negated selector.
+    """
+
+    __slots__ = ('sel', 'rxs', 'filters')
+
+    def __init__(self, sel):
+        self.sel = sel
+        self.rxs = tag_regexes(sel.tag, dict(sel.attrs)) if sel.attrs or sel.tag.strip('*') else ()
+        self.filters = tuple(sel.nodefilterlist)
+
+    def __call__(self, node):
+        for rx in self.rxs:
+            if not rx.match(node.tagstr):
+                return True    # miss, :not() is true
+        for f in self.filters:
+            if not f(node):
+                return True
+        return False   # hit, :not() is false
+
+
+class HasFilter(object):
+    r"""
+    Node filter for `:has(relative selector)`, e.g. `:has(a.play)`, `:has(> li)`.
+
+    Relative selector is checked in the structural index of node part (see
+    StructIndex), tags are never searched in a copy of node content, so markup
+    inside attribute values is not confused with tags.
+
+    For every step of the relative selector all elements of the part which
+    match the step and the rest of the path are computed once (hits) and
+    cached in the index. Then every node is checked by lookup: descendants
+    are a range of hits (bisect), children and siblings are checked directly.
+
+    Parameters
+    ----------
+    path : SelectorPath
+        Relative selector path, the first selector combinator is relative
+        to filtered node (descendant by default).
+    """
+
+    __slots__ = ('steps', )
+
+    def __init__(self, path):
+        steps = []
+        for sel in path:
+            if not isinstance(sel, Selector):
+                raise ValueError(':has() does not support set selectors')
+            if sel.item_source == ItemSource.Siblings:
+                comb = '+' if sel.elem_pos == TagPosition.FirstOnly else '~'
+            else:
+                comb = '>' if sel.elem_pos == TagPosition.RootLevel else ' '
+            rxs = tag_regexes(sel.tag, dict(sel.attrs)) if sel.attrs or sel.tag.strip('*') else ()
+            steps.append((comb, rxs, tuple(sel.nodefilterlist)))
+        self.steps = tuple(steps)
+
+    def __call__(self, node):
+        index = struct_index(node.item)
+        if node.ts not in index.elems:
+            return False
+        return self._related(index, node.ts, 0)
+
+    def _hits(self, index, i):
+        r"""Helper. Returns (sorted list, set) of elements matching step `i` and next steps."""
+        key = self, i
+        try:
+            return index.memo[key]
+        except KeyError:
+            pass
+        comb, rxs, filters = self.steps[i]
+        item, elems, last = index.item, index.elems, i + 1 == len(self.steps)
+        hits = []
+        for ts in index.starts:
+            cs = elems[ts][4]
+            for rx in rxs:
+                r = rx.match(item, ts, cs)
+                if not r or r.end() != cs:
+                    break
+            else:
+                if filters:
+                    node = Node(tagstr=item[ts:cs], tagindex=(ts, cs), item=item)
+                    if not all(f(node) for f in filters):
+                        continue
+                if last or self._related(index, ts, i + 1):
+                    hits.append(ts)
+        hits = index.memo[key] = hits, frozenset(hits)
+        return hits
+
+    def _related(self, index, ts, i):
+        r"""Helper. True if element `ts` has related (by step `i` combinator) element matching steps from `i`."""
+        hits, hitset = self._hits(index, i)
+        if not hits:
+            return False
+        comb = self.steps[i][0]
+        if comb == ' ':
+            # any hit inside the content
+            end = index.ends.get(ts)
+            if end is None:
+                return False
+            n = bisect_right(hits, ts)
+            return n < len(hits) and hits[n] < end
+        if comb == '>':
+            related = index.children(ts)
+        else:
+            related = index.siblings(ts)
+            if comb == '+':
+                related = islice(related, 1)
+        return any(cts in hitset for cts, _ in related)
 
 
 class SelectorBuilderData(object):
@@ -155,6 +334,8 @@ class SelectorBuilder(object):
         self.skip = {'sp'}
         self._main_data = SelectorBuilderData()
         self._not_data = None
+        self._not_stack = []  # outer :not() data, :not(:not(A)) is allowed
+        self._data_stack = []  # outer builder data (:not() and :has() have their own)
         self.d = self._main_data
 
     @property
@@ -218,8 +399,13 @@ class SelectorBuilder(object):
                 self.d.cur_val = val
             self.d.cur_vals.append(val)
         elif name == 'pseudo_not':
+            self._not_stack.append(self._not_data)
+            self._data_stack.append(self.d)
             self.d = self._not_data = SelectorBuilderData()
             self._list_append(Selector())
+        elif name == 'pseudo_has':
+            self._data_stack.append(self.d)
+            self.d = SelectorBuilderData()
 
     def exit(self, name, parent, children):
         if DEBUG and __name__ == '__main__':
@@ -230,6 +416,11 @@ class SelectorBuilder(object):
         elif name in ('set_sel', 'oset_sel'):
             self.d.ss_path_type = None
             self._list_exit()
+        elif name == 'simple_sel':
+            self._compile_words()
+        elif name == 'attr_sel' and self.d.cur_attr_op in ('~=', '|='):
+            assert self.d.cur_ident is not None
+            self.sel.words[self.d.cur_ident][self.d.cur_attr_op == '|='].add(self.d.cur_val or '')
         elif name == 'attr_sel':
             assert self.d.cur_ident is not None
             try:
@@ -248,21 +439,20 @@ class SelectorBuilder(object):
                     raise KeyError('Pseudo-class "{op}" is not supported'.format(op=self.d.cur_ident))
                 nodefilter = fun(self.d.cur_val)
                 if nodefilter:
-                    self.sel.nodefilterlist.append(nodefilter)
+                    self.sel.add_filter(nodefilter, (self.d.cur_ident, tuple(self.d.cur_vals)))
         elif name == 'pseudo_not':
             if not self.inside_pseudo_not:
                 raise ValueError(':not() can NOT be empty')
-            if self.d == self._main_data:
-                raise ValueError(':not() can NOT be inside :not()')
-            self.d = self._main_data
-            try:
-                fun = self._pseudo_not
-            except AttributeError:
-                raise KeyError('Pseudo-class "{op}" is not supported'.format(op='not'))
-            nodefilter = fun(self.d.cur_val)
+            self.d = self._data_stack.pop()
+            nodefilter = self._pseudo_not(self.d.cur_val)
             if nodefilter:
-                self.sel.nodefilterlist.append(nodefilter)
-            self._not_data = None
+                self.sel.add_filter(nodefilter, ('not', self._not_data.sel.key))
+            self._not_data = self._not_stack.pop()
+        elif name == 'pseudo_has':
+            path = self.d.out[0]
+            self.d = self._data_stack.pop()
+            nodefilter = HasFilter(path)
+            self.sel.add_filter(nodefilter, ('has', path.key))
         elif (name == 'res_param' and self.d.cur_ident == 'attr') or name == 'res_attr':
             if not self.d.cur_vals:
                 raise IndexError('::attr() needs at least one attribute name')
@@ -287,10 +477,12 @@ class SelectorBuilder(object):
         elif cname == 'id_sel.ident':
             self.sel.attrs['id'].append(value)
         elif cname == 'class_sel.ident':
-            self.sel.attrs['class'].append(aWord(value))
+            self.sel.words['class'][0].add(value)
         elif name == 'ident':
             self.d.cur_ident, self.d.cur_attr_op = value.lower(), None
             self.d.cur_val, self.d.cur_vals = None, []
+        elif name == 'nth_val':
+            self.d.cur_val, self.d.cur_vals = value, [value]
         elif cname == 'attr_sel.attr_op':
             self.d.cur_attr_op = value
         elif name == 'path_type':
@@ -300,9 +492,27 @@ class SelectorBuilder(object):
         elif cname in ('oset_sel.', 'set_sel.') and value == ',':  # set selector separator
             self.d.path_type = self.d.ss_path_type
 
+    def _compile_words(self):
+        r"""
+        Helper. Add WordFilter for collected words.
+
+        Regex pre-selects tags only, attribute has to contain the longest word
+        (or prefix) as substring (it's necessary condition, no word boundaries).
+        """
+        sel = self.sel
+        if not sel.words:
+            return
+        for attr, (words, starts) in sel.words.items():
+            if not sel.attrs[attr]:
+                longest = max(sorted(words | starts), key=len)
+                sel.attrs[attr].append(aContains(re.escape(longest)) if longest else True)
+        # the first one, it's cheap
+        wordfilter = WordFilter(sel.words)
+        sel.add_filter(wordfilter, ('words', wordfilter.checks), first=True)
+
     def _pseudo_contains(self, value):
         def nodefilter(n, arg=value):
-            return arg in n.text
+            return n.contains_text(arg)
         return nodefilter
 
     def _pseudo_content_contains(self, value):
@@ -317,56 +527,81 @@ class SelectorBuilder(object):
         return nodefilter
 
     def _pseudo_has(self, value):
-        # TODO:  Fix: :has(c) in "<b z="<c>">"
-        rx = regex(pats.melem(value, None, None))
-        def nodefilter(n, rx=rx):
-            return rx.search(n.content)
-        return nodefilter
+        # quoted selector, e.g. :has("a b"), or selector list, e.g. :has(a, b)
+        if len(self.d.cur_vals) > 1:
+            raise ValueError(':has() supports one selector path only')
+        if not value:
+            raise ValueError(':has() can NOT be empty')
+        group = parse(value)
+        if len(group) != 1:
+            raise ValueError(':has() supports one selector path only')
+        return HasFilter(group[0])
 
     def _pseudo_empty(self, value):
         return lambda n: not n.content.strip()
 
     def _pseudo_first_child(self, value):
-        if self.sel.item_source != ItemSource.Content:
-            return nodefilterFalse
-        if self.inside_pseudo_not:
-            # Can't use shortcut in :not()
-            rx = regex(pats.anyElem)
-            def nodefilter(n):
-                return not rx.search(n.item[:n.tag_start])
-            return nodefilter
-        self.sel.elem_pos = TagPosition.FirstOnly
+        def nodefilter(n):
+            pos = struct_index(n.item).child_pos(n.ts)
+            return pos is not None and pos[0] == 1
+        return nodefilter
 
     def _pseudo_last_child(self, value):
-        rx = regex(pats.anyElem)
         def nodefilter(n):
-            return not rx.search(n.item[n.tag_end:])
+            pos = struct_index(n.item).child_pos(n.ts)
+            return pos is not None and pos[0] == pos[1]
         return nodefilter
 
     def _pseudo_only_child(self, value):
-        nodefilter = self._pseudo_first_child(value)
-        return nodefilter or self._pseudo_last_child(value)
+        def nodefilter(n):
+            pos = struct_index(n.item).child_pos(n.ts)
+            return pos is not None and pos[1] == 1
+        return nodefilter
+
+    def _pseudo_nth_child(self, value):
+        match = nth_expr(value)
+        def nodefilter(n):
+            pos = struct_index(n.item).child_pos(n.ts)
+            return pos is not None and match(pos[0])
+        return nodefilter
+
+    def _pseudo_nth_last_child(self, value):
+        match = nth_expr(value)
+        def nodefilter(n):
+            pos = struct_index(n.item).child_pos(n.ts)
+            return pos is not None and match(pos[1] - pos[0] + 1)
+        return nodefilter
 
     def _pseudo_first_of_type(self, value):
-        if self.sel.item_source != ItemSource.Content:
-            return nodefilterFalse
         def nodefilter(n):
-            rx = regex(pats.melem(n.name, None, None))
-            return not rx.search(n.item[:n.tag_start])
+            pos = struct_index(n.item).type_pos(n.ts)
+            return pos is not None and pos[0] == 1
         return nodefilter
 
     def _pseudo_last_of_type(self, value):
         def nodefilter(n):
-            rx = regex(pats.melem(n.name, None, None))
-            return not rx.search(n.item[n.tag_end:])
+            pos = struct_index(n.item).type_pos(n.ts)
+            return pos is not None and pos[0] == pos[1]
         return nodefilter
 
     def _pseudo_only_of_type(self, value):
-        if self.sel.item_source != ItemSource.Content:
-            return nodefilterFalse
         def nodefilter(n):
-            rx = regex(pats.melem(n.name, None, None))
-            return not rx.search(n.item[:n.tag_start]) and not rx.search(n.item[n.tag_end:])
+            pos = struct_index(n.item).type_pos(n.ts)
+            return pos is not None and pos[1] == 1
+        return nodefilter
+
+    def _pseudo_nth_of_type(self, value):
+        match = nth_expr(value)
+        def nodefilter(n):
+            pos = struct_index(n.item).type_pos(n.ts)
+            return pos is not None and match(pos[0])
+        return nodefilter
+
+    def _pseudo_nth_last_of_type(self, value):
+        match = nth_expr(value)
+        def nodefilter(n):
+            pos = struct_index(n.item).type_pos(n.ts)
+            return pos is not None and match(pos[1] - pos[0] + 1)
         return nodefilter
 
     def _pseudo_enabled(self, value):
@@ -378,17 +613,7 @@ class SelectorBuilder(object):
     def _pseudo_not(self, value):
         if not self.inside_pseudo_not:
             raise ValueError(':not() can NOT be empty')
-        sel = self._not_data.sel
-        def nodefilter(node):
-            # compare found node `node' with selector from :not()
-            hit = dom_search(node.item[node.tag_start:node.tag_end], sel.tag, attrs=dict(sel.attrs),
-                             ret=ResultParam(Result.Node, position=TagPosition.FirstOnly))
-            for n in hit:
-                n.move_to_item(item=node.item, off=node.tag_start)
-                if all(f(n) for f in sel.nodefilterlist):
-                    return False   # hit, :not() is false
-            return True
-        return nodefilter
+        return NotFilter(self._not_data.sel)
 
 
 
@@ -404,7 +629,7 @@ def parse(sel):
 
 def set_debug_repr():
     tag_pos = {TagPosition.Any: '', TagPosition.RootLevel: '>', TagPosition.FirstOnly: '(^)'}
-    tag_src = {ItemSource.Content: '', ItemSource.After: '+'}
+    tag_src = {ItemSource.Content: '', ItemSource.After: '+', ItemSource.Siblings: '~'}
     GroupSelector.__repr__ = lambda self: '\033[36mG\033[0m' + list.__repr__(self)
     SelectorPath.__repr__ = lambda self: '\033[36mP\033[0m' + list.__repr__(self)
     SetSelector.__repr__ = lambda self: '\033[36mA\033[0m' + list.__repr__(self)
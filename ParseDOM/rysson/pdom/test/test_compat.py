@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, unicode_literals, print_function
+
+from .base import TestCase
+from unittest import skip as skiptest, skipIf as skiptestIf
+
+from ..compat import mrknow_parseDOM, cherry_parse_dom, DOMMatch
+
+try:
+    import mrknow
+    from cherry import dom_parser as cherry_dom_parser
+except ImportError:
+    mrknow = cherry_dom_parser = None
+
+
+#: HTML from tests.py (well-formed part).
+html = '''
+<ul class="a" data="vvv">
+<a href="a/a">Aa</a> qwe aaa
+<a href="a/b">Ab</a> asd aaa
+<a href="a/c">Ac</a> zxc aaa
+</ul>
+<ul class="b" data="nnn">
+<a href="b/a">Ba</a> qwe bbb
+<a href="b/b">Bb</a> asd bbb
+<a href="b/c">Bc</a> zxc bbb
+</ul>
+<ul class="a c" data="mmm">
+<a href="c/a">Ca</a> qwe ccc
+<a href="c/b">Cb</a> asd ccc
+<a href="c/c">Cc</a> zxc ccc
+</ul>
+<p a="1" b="2">12a</p>
+<p b="2" a="1">12b</p>
+<p a="1">12-c</p>
+<p b="2">12-d</p>
+<p c="3" e="żółć">12-<b>33</b>-e</p>
+<div c="3">12-<b>33</b>-e</div>
+<p a="1 2 3">1.2.3</p>
+<p a="1 22 3">1.22.3</p>
+<p a="22 1 3">22.1.3</p>
+<p a="1 3 22" b=42>1.3.22</p>
+<p a="1 020 3">1.020.3</p>
+<p a="1 022 3">1.022.3</p>
+<p a="1 220 3">1.220.3</p>
+<div a="1 22 3" c="44">1.22.3</div>
+<div a="22 1 3" c="45">22.1.3</div>
+<div c="4">c4..<b z="9">bz9</b></div>
+'''
+
+names = ('a', 'p', 'ul', 'div', 'b')
+attrs_list = ({'a': '1'}, {'class': 'a'}, {'a': '22'}, {'c': '3'}, {'z': '9'}, {'a': '1', 'b': '2'}, {'href': 'b/.'})
+
+
+class TestMrknowParseDOM(TestCase):
+
+    def test_tests_patterns(self):
+        # expected results from tests.py (MrParseDOM)
+        for pat, expected in (
+            ('<a>A</a><a>B</a>', ['A', 'B']),
+            ('<a><x>A</x></a>', ['<x>A</x>']),
+            ('<a>A<a>B</a>C</a>Q', ['A<a>B</a>C', 'B']),
+            ('<a>A<a>B<a>C</a></a></a>', ['A<a>B<a>C</a></a>', 'B<a>C</a>', 'C']),
+            ('<x><a/></x><a>A</a>', ['', 'A']),
+            ('<a>A<a />B</a>Q', ['A<a />B', '']),
+            ('<a>A<x>B<a>C</x>D</a>Q', ['A<x>B<a>C</x>D', 'C']),
+            ('<a>A</a><a x="1">B</a>', ['A', 'B']),
+        ):
+            with self.subTest(pat):
+                self.assertEqual(mrknow_parseDOM(pat, 'a'), expected)
+        self.assertEqual(mrknow_parseDOM('<a x="1">A<a>B</a></a>', 'a', {'x': '1'}), ['A<a>B</a>'])
+        self.assertEqual(mrknow_parseDOM('<a x="1">A</a>', 'a', ret=True), ['<a x="1">A</a>'])
+        self.assertEqual(mrknow_parseDOM('<a x=" 1 ">A</a>', 'a', ret='x'), ['1'])
+
+    def test_flat(self):
+        # flat HTML where mrknow differs, pdom behaviour is kept (see doc/en/dom.md)
+        for args, expected in (
+            (('<a title="x y"> V</a><a>U </a>', 'a'), [' V', 'U ']),
+            (('<a data-href="1">A</a><a href="2">B</a>', 'a', {}, 'href'), ['2']),
+            (('<a data-href="1">A</a><a href="2">B</a>', 'a', {'href': '1'}), []),
+            (('<a href=x-y>T</a>', 'a', {'href': 'x'}), []),
+            (('<a href=x-y class="x">T</a>', 'a', {'href': 'x'}, 'class'), []),
+            (('<a href=x-y class="x">T</a>', 'a', {'href': 'x-y'}, 'class'), ['x']),
+            (('<a href="1" href="2">A</a>', 'a', {}, 'href'), ['2']),
+            (('<a x="1">A</a><a>B</a>', 'a', {}, True), ['<a x="1">A</a>', '<a>B</a>']),
+            (('<a x="1">A</a><a x="2">B</a>', 'a', {'x': '2'}, True), ['<a x="2">B</a>']),
+            (('<a href=a/b>A</a><a href="a/b">B</a>', 'a'), ['B']),
+            (('<a href=a/b>A</a><a href="a/b">B</a>', 'a', {}, 'href'), ['a/b']),
+        ):
+            with self.subTest(repr(args)):
+                self.assertEqual(mrknow_parseDOM(*args), expected)
+
+    @skiptestIf(mrknow is None, 'No mrknow module')
+    def test_flat_equal(self):
+        # flat HTML without mrknow quirks: the same results
+        html = '<a href="1" class="x">A</a> <a class="y" href="2"> B </a><b title="x y">C</b><a href=3>D</a>'
+        for name in ('a', 'b'):
+            for attrs in ({}, {'href': '1'}, {'class': 'y'}, {'href': '3'}):
+                for ret in (False, 'href', 'class'):
+                    with self.subTest('{} {} {}'.format(name, attrs, ret)):
+                        self.assertEqual(mrknow_parseDOM(html, name, attrs, ret), mrknow.parseDOM(html, name, attrs, ret))
+
+    def test_bad_input(self):
+        self.assertEqual(mrknow_parseDOM(None, 'a'), '')
+        self.assertEqual(mrknow_parseDOM('<a>A</a>', ' '), '')
+
+    @skiptestIf(mrknow is None, 'No mrknow module')
+    def test_equal(self):
+        for name in names:
+            for attrs in attrs_list:
+                for ret in (False, 'href', 'c'):
+                    with self.subTest('{} {} {}'.format(name, attrs, ret)):
+                        self.assertEqual(mrknow_parseDOM(html, name, attrs, ret), mrknow.parseDOM(html, name, attrs, ret))
+
+
+class TestCherryParseDom(TestCase):
+
+    def test_result(self):
+        self.assertEqual(cherry_parse_dom('<a x="1" y>A</a><a/>', 'a'), [DOMMatch({'x': '1'}, 'A'), DOMMatch({}, '')])
+        self.assertEqual(cherry_parse_dom('<a x="1 2">A</a><a x="1">B</a>', 'a', {'x': ['2', '1']}), [DOMMatch({'x': '1 2'}, 'A')])
+        self.assertEqual(cherry_parse_dom('<a x="1">A</a><a>B</a>', 'a', req='x'), [DOMMatch({'x': '1'}, 'A')])
+        self.assertEqual(cherry_parse_dom(cherry_parse_dom('<a><b>B</b></a>', 'a'), 'b'), [DOMMatch({}, 'B')])
+        self.assertEqual(cherry_parse_dom('<a>A<!-- <a>X</a> --></a>', 'a', exclude_comments=True), [DOMMatch({}, 'A')])
+
+    def test_bad_input(self):
+        self.assertEqual(cherry_parse_dom(None, 'a'), '')
+        self.assertEqual(cherry_parse_dom('<a>A</a>', ''), '')
+        self.assertEqual(cherry_parse_dom('<a>A</a>', 'a', attrs=['x']), '')
+
+    @skiptestIf(cherry_dom_parser is None, 'No cherry module')
+    def test_equal(self):
+        import re
+        for name in names:
+            for attrs in attrs_list + ({}, {'a': re.compile('1 ')}, {'a': ['1', '3']}):
+                for req in (False, 'a', ['a', 'c']):
+                    with self.subTest('{} {} {}'.format(name, attrs, req)):
+                        self.assertEqual(cherry_parse_dom(html, name, attrs, req),
+                                         cherry_dom_parser.parse_dom(html, name, attrs, req))
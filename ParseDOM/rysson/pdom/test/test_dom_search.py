@@ -6,8 +6,11 @@ from .base import TestCase
 from unittest import skip as skiptest, skipIf as skiptestIf
 
 from ..msearch import dom_search
+from ..backward import parseDOM, parse_dom, _fast_search
 from ..base import aWord, aWordStarts, aStarts, aEnds, aContains
 from ..base import DomMatch, ResultParam, MissingAttr   # for test only
+from ..base import Node, NodeList, Columns, Result, TagPosition, ItemSource
+from ..base import remove_tags_re, text_projection
 
 
 
@@ -603,3 +606,245 @@ class TestDomSearch_ResultParam(TestCase):
         self.assertEqual(dom_search('<a x="1">A</a><a>A</a>', 'a',
                                     ret=ResultParam(['x'], missing=MissingAttr.SkipAll)), [['1']])
 
+
+    def test_limit(self):
+        html = '<a x="1">A1</a><a>A2</a><a x="2">A3</a>'
+        self.assertEqual(dom_search(html, 'a', ret=ResultParam(Result.Content, limit=2)), ['A1', 'A2'])
+        self.assertEqual(dom_search(html, 'a', {'x': True}, ret=ResultParam('x', limit=1)), ['1'])
+        self.assertEqual(dom_search([html, html], 'a', ret=ResultParam(Result.Content, limit=1)), ['A1', 'A1'])
+        self.assertEqual(dom_search(html, 'a', {'x': True}, ret=ResultParam(Result.Content, limit=5,
+                                    nodefilter=lambda n: n.content != 'A1')), ['A3'])
+        self.assertEqual(dom_search(html, 'a', {'x': [True, '2']}, ret=ResultParam(Result.Content, limit=1)), ['A3'])
+
+    def test_siblings(self):
+        html = '<p><a>A1</a>x<b y="1">B1</b><b>B2</b></p><b y="1">B3</b>'
+        a = dom_search(html, 'a', ret=Node)
+        nodes = dom_search(a, 'b', ret=ResultParam(Result.Node, source=ItemSource.Siblings))
+        self.assertEqual([n.content for n in nodes], ['B1', 'B2'])
+        self.assertIs(nodes[0].item, html)
+        self.assertEqual(dom_search(a, 'b', {'y': True}, ret=ResultParam(Result.Content, source=ItemSource.Siblings,
+                                                                         position=TagPosition.FirstOnly)), ['B1'])
+        self.assertEqual(dom_search(a, 'b', {'y': False}, ret=ResultParam(Result.Content, source=ItemSource.Siblings,
+                                                                          position=TagPosition.FirstOnly)), [])
+
+
+class TestNodeList(TestCase):
+
+    html = '<a x="1">A<b>B</b></a><a>C<a>D</a></a>'
+
+    def nodes(self):
+        return NodeList(self.html, [(0, 9), (22, 25), (26, 29)])
+
+    def test_lazy(self):
+        nodes = self.nodes()
+        self.assertEqual(len(nodes), 3)
+        self.assertEqual(list(nodes.te), [0, 0, 0])
+        self.assertEqual(nodes.tagstrs(), ['<a x="1">', '<a>', '<a>'])
+        self.assertEqual(nodes.contents(), ['A<b>B</b>', 'C<a>D</a>', 'D'])
+        self.assertEqual(nodes.outer_htmls(), ['<a x="1">A<b>B</b></a>', '<a>C<a>D</a></a>', '<a>D</a>'])
+        self.assertEqual(nodes.texts(), ['AB', 'CD', 'D'])
+        self.assertEqual(list(nodes.te), [22, 38, 34])
+
+    def test_nodes(self):
+        nodes = self.nodes()
+        self.assertIsInstance(nodes[0], Node)
+        self.assertEqual(nodes[0].attrs, {'x': '1'})
+        self.assertEqual([n.content for n in nodes], nodes.contents())
+        self.assertEqual(nodes[1:].contents(), ['C<a>D</a>', 'D'])
+
+    def test_filter(self):
+        nodes = self.nodes()
+        self.assertEqual(nodes.filter(lambda n: 'D' in n.content).contents(), ['C<a>D</a>', 'D'])
+        self.assertEqual(nodes.filter(lambda n: n.attrs).tagstrs(), ['<a x="1">'])
+        self.assertEqual(len(nodes.filter(lambda n: False)), 0)
+
+    def test_search(self):
+        html = self.html * 3
+        self.assertEqual(dom_search(html, 'a', ret=[Result.Content, 'x']),
+                         [[n.content, n.attrs.get('x')] for n in dom_search(html, 'a', ret=Node)])
+        self.assertEqual(dom_search(html, 'a', ret=ResultParam(Result.Text, nodefilter=lambda n: 'x' in n.attrs)),
+                         ['AB'] * 3)
+
+
+class TestColumns(TestCase):
+
+    html = '<a href="/1" title=T1>A<b>1</b></a><a href=\'/2\' data-href="x">A2</a><a>A3</a>'
+
+    def columns(self, *args):
+        return dom_search(self.html, 'a', ret=ResultParam(list(args), columnar=True))
+
+    def test_rows(self):
+        cols = self.columns('href', Result.Text, 'title')
+        self.assertIsInstance(cols, Columns)
+        self.assertEqual(len(cols), 3)
+        self.assertEqual(cols.names, ['href', 'text', 'title'])
+        self.assertEqual(cols.to_rows(), dom_search(self.html, 'a', ret=['href', Result.Text, 'title']))
+
+    def test_attr_case(self):
+        html = '<a HREF="/1" Title=T>x</a><a href="/2">y</a>'
+        for ret in (['HREF'], ['href'], ['HREF', 'title'], ['Title', Result.Text], ['href', 'title']):
+            with self.subTest(ret):
+                self.assertEqual(dom_search(html, 'a', ret=ResultParam(ret, columnar=True)).to_rows(),
+                                 dom_search(html, 'a', ret=ret))
+        self.assertEqual(dom_search(html, 'a', ret=ResultParam(['HREF'], columnar=True)).to_rows(), [[None], [None]])
+
+    def test_column(self):
+        cols = self.columns('href', Result.Content)
+        self.assertEqual(list(cols['href']), ['/1', '/2', None])
+        self.assertEqual(cols['content'][-1], 'A3')
+        self.assertEqual(cols[1][:2], ['A<b>1</b>', 'A2'])
+        with self.assertRaises(KeyError):
+            cols['title']
+
+    def test_parts(self):
+        cols = dom_search([self.html, '<a href="/4">A4</a>'], 'a', ret=ResultParam('href', columnar=True))
+        self.assertEqual(list(cols[0]), ['/1', '/2', None, '/4'])
+        index, ts, cs, ce, te = cols.offsets()
+        self.assertEqual(list(index), [0, 0, 0, 1])
+        self.assertEqual(list(ts)[-1], 0)
+        self.assertEqual(list(te)[-1], 19)
+
+    def test_jsonl(self):
+        import io
+        import json
+        fp = io.StringIO()
+        self.assertEqual(self.columns('href', Result.Text).to_jsonl(fp), 3)
+        self.assertEqual([json.loads(line) for line in fp.getvalue().splitlines()],
+                         [{'href': '/1', 'text': 'A1'}, {'href': '/2', 'text': 'A2'}, {'href': None, 'text': 'A3'}])
+
+    def test_jsonl_nodes(self):
+        import io
+        import json
+        fp = io.StringIO()
+        self.assertEqual(self.columns('href', Result.Node, Result.DomMatch).to_jsonl(fp), 3)
+        rows = [json.loads(line) for line in fp.getvalue().splitlines()]
+        self.assertEqual([row['node'] for row in rows], dom_search(self.html, 'a', ret=Result.OuterHTML))
+        self.assertEqual(rows[0]['DomMatch'], {'attrs': {'href': '/1', 'title': 'T1'}, 'content': 'A<b>1</b>'})
+        fp = io.StringIO()
+        dom_search(self.html, 'a', ret=ResultParam(['href', Node], columnar=True)).to_jsonl(fp)
+        self.assertEqual(json.loads(fp.getvalue().splitlines()[1]), {'href': '/2', 'node': '<a href=\'/2\' data-href="x">A2</a>'})
+
+
+class TestPickle(TestCase):
+
+    html = '<p>' + 'x' * 10000 + '</p>' + '<a href="/1">A<b>B</b></a>' * 100
+
+    def test_node(self):
+        import pickle
+        nodes = dom_search(self.html, 'a', ret=Node)
+        data = pickle.dumps(nodes, 2)
+        self.assertLess(len(data), len(self.html) + 50 * len(nodes))
+        nodes2 = pickle.loads(data)
+        self.assertEqual(repr(nodes2), repr(nodes))
+        self.assertIs(nodes2[0].item, nodes2[-1].item)
+
+    def test_detached(self):
+        import pickle
+        node = dom_search(self.html, 'a', ret=Node)[-1]
+        node2 = node.detached()
+        self.assertEqual(node2.item, node.outerHTML)
+        self.assertEqual(repr(node2), repr(node))
+        self.assertLess(len(pickle.dumps(node2, 2)), 200)
+        self.assertEqual(repr(pickle.loads(pickle.dumps(node2, 2))), repr(node))
+
+    def test_nodelist(self):
+        import pickle
+        cols = dom_search(self.html, 'a', ret=ResultParam(['href', Result.Text], columnar=True))
+        cols2 = pickle.loads(pickle.dumps(cols, 2))
+        self.assertEqual(cols2.to_rows(), cols.to_rows())
+        cols3 = pickle.loads(pickle.dumps(cols.detached(), 2))
+        self.assertEqual(cols3.to_rows(), cols.to_rows())
+        self.assertNotIn('x' * 100, cols3.parts[0].item)
+
+    def test_nodelist_reduce(self):
+        import pickle
+        from .. import base as pdom_base
+        nodes = dom_search(self.html, 'a', ret=ResultParam(Node, columnar=True)).parts[0]
+        func, args = nodes.__reduce__()
+        # module-level function, bound classmethod can't be pickled in Python 2
+        self.assertIs(getattr(pdom_base, func.__name__), func)
+        nodes2 = pickle.loads(pickle.dumps(nodes, 2))
+        self.assertIs(type(nodes2), NodeList)
+        self.assertEqual(nodes2.outer_htmls(), nodes.outer_htmls())
+
+
+class TestParseDOMFast(TestCase):
+
+    html = ('<ul class="a"><a href="a/a">Aa</a><a href="a/b" x="1">Ab</a></ul>'
+            '<ul class="b c" data="n"><A HREF=\'b/a\'>Ba<a>in</a></A><a x=1 x="2">Bb</a><a/>Q</ul>'
+            '<p a="1" b="2">12a</p><p b="2" a="1">12b</p><p a="1">12c</p><p c="3" e="żółć">12-<b>33</b>-e</p>')
+
+    def test_equal(self):
+        for name in ('a', 'ul', 'p', 'A', '', 'a|p'):
+            for attrs in (None, {'x': '1'}, {'class': 'b.*'}, {'a': '1', 'b': '2'}, {'x': True}, {'e': 'żółć'}):
+                for ret in (None, False, 'href', 'x', 'data', 'b'):
+                    with self.subTest('{} {} {}'.format(name, attrs, ret)):
+                        self.assertIsNotNone(_fast_search(self.html, name, attrs, ret))
+                        self.assertEqual(parseDOM(self.html, name, attrs, ret),
+                                         dom_search(self.html, name, attrs, ret=ret or Result.Content))
+
+    def test_parse_dom(self):
+        for name, attrs in (('a', None), ('p', {'a': '1'}), ('ul', {'class': 'b.*'})):
+            with self.subTest('{} {}'.format(name, attrs)):
+                self.assertEqual(parse_dom(self.html, name, attrs), dom_search(self.html, name, attrs, ret=DomMatch))
+
+    def test_fallback(self):
+        self.assertIsNone(_fast_search(self.html, 'p', {'a': ['1', '2']}, None))
+        self.assertIsNone(_fast_search(self.html, 'a', None, ['href']))
+        self.assertIsNone(_fast_search(self.html, 'a', None, 'HREF'))
+        self.assertIsNone(_fast_search([[self.html]], 'a', None, None))
+        self.assertEqual(parseDOM(self.html, 'p', {'a': ['1', '2']}), dom_search(self.html, 'p', {'a': ['1', '2']}))
+        self.assertEqual(parseDOM(self.html, 'a', None, ['href']), dom_search(self.html, 'a', None, ret=['href']))
+
+
+class TestNodeAttrs(TestCase):
+
+    tags = ('<a href="x" class="c d">', '<a data-href="y" href=z>', "<a title='href=q' HREF='w'>",
+            '<a href="1" href="2" disabled>', '<a>', '<a hrefx="1" b=\'2\' c="3"/>')
+
+    def test_get_attr(self):
+        for tagstr in self.tags:
+            for name in ('href', 'class', 'disabled', 'hrefx', 'none'):
+                with self.subTest('{} {}'.format(tagstr, name)):
+                    self.assertEqual(Node(tagstr).get_attr(name), Node(tagstr).attrs.get(name))
+                    self.assertEqual(Node(tagstr).get_attr(name.upper(), 0), Node(tagstr).attrs.get(name, 0))
+
+    def test_parse_attrs(self):
+        nodes = [Node(tagstr) for tagstr in self.tags]
+        Node.parse_attrs(nodes)
+        self.assertEqual([n.attrs for n in nodes], [Node(tagstr).attrs for tagstr in self.tags])
+        nodes = [Node('<a x="\x00">'), Node('<b y=1>')]
+        Node.parse_attrs(nodes)
+        self.assertEqual([n.attrs for n in nodes], [{'x': '\x00'}, {'y': '1'}])
+
+    def test_search(self):
+        html = ''.join(t if t.endswith('/>') else t + 'A</a>' for t in self.tags)
+        for ret in ('href', ['href', 'class'], DomMatch):
+            with self.subTest(ret=ret):
+                self.assertEqual(dom_search(html, 'a', ret=ret),
+                                 [[n.attrs.get(r) for r in ret] if isinstance(ret, list) else
+                                  DomMatch(n.attrs, n.content) if ret is DomMatch else n.attrs[ret]
+                                  for n in dom_search(html, 'a', ret=Node)
+                                  if isinstance(ret, list) or ret is DomMatch or ret in n.attrs])
+
+
+class TestTextProjection(TestCase):
+
+    html = '<div><p title="a>b">P1 <b>B1</b></p>x<p>P2<br>y</p><i x=\'<p>\'>I</i></div><p>P3</p>'
+
+    def test_text(self):
+        nodes = dom_search(self.html, 'div|p|b|i', ret=Node)
+        expected = [remove_tags_re.sub('', n.content) for n in nodes]
+        proj = text_projection(self.html)
+        proj.stripped = len(self.html)  # build projection now
+        self.assertEqual([n.text for n in nodes], expected)
+        self.assertIsNotNone(proj.text)
+        self.assertEqual(proj.text, remove_tags_re.sub('', self.html))
+        self.assertEqual(NodeList.from_nodes(self.html, nodes).texts(), expected)
+
+    def test_contains(self):
+        nodes = dom_search(self.html, 'div|p|b|i', ret=Node)
+        text_projection(self.html).stripped = len(self.html)
+        for sub in ('P', 'P1 B1', 'B1x', '1xP2', 'y', 'Z', ''):
+            with self.subTest(sub):
+                self.assertEqual([n.contains_text(sub) for n in nodes], [sub in n.text for n in nodes])
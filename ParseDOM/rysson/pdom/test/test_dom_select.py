@@ -2,12 +2,25 @@
 
 from __future__ import absolute_import, division, unicode_literals, print_function
 
+import io
+import os
+import json
+import shutil
+import tempfile
 from .base import TestCase
 from unittest import skip as skiptest, skipIf as skiptestIf
 
-from ..mselect import dom_select
+from ..mselect import dom_select, CompiledSelector, compile_selector, _select_group
+from ..selectorparser import parse as parse_selector
+from ..mcodegen import selector_code
+from ..moptimize import optimize
+from ..mexplain import explain
+from ..mprofile import profile
+from ..mslowlog import slow_log, fingerprint
+from .. import base as pdom_base, mselect as pdom_mselect
 from ..base import aWord, aWordStarts, aStarts, aEnds, aContains
 from ..base import Node, DomMatch   # for test only
+from ..base import _make_html_list
 
 
 class N(Node):
@@ -118,6 +131,26 @@ class TestDomSelect(TestCase):
         self.assertEqual(dom_select('<a x="1" x-y="2">A</a>', 'a')[0].attrs, {'x': '1', 'x-y': '2'})
         self.assertEqual(dom_select('<a x="1" y="2" x-y="3">A</a>', 'a')[0].attrs, {'x': '1', 'y': '2', 'x-y': '3'})
 
+    def test_class_words(self):
+        html = '<a class=x>A1</a><a class="y  X z">A2</a><a class="xy">A3</a>'
+        with self.subTest('unquoted'):
+            self.assertEqual(dom_select(html, 'a.x::text'), [['A1'], ['A2']])
+        with self.subTest('multi'):
+            self.assertEqual(dom_select(html, 'a.z.x.y::text'), [['A2']])
+            self.assertEqual(dom_select(html, 'a.x.xy::text'), [])
+        with self.subTest('long'):
+            cls = ' '.join('c{}'.format(i) for i in range(100))
+            self.assertEqual(dom_select('<a class="{} x">A</a>'.format(cls), '.c99.x.c0::text'), [['A']])
+        with self.subTest('auto nth'):
+            self.assertEqual(dom_select(html, '{a.x, a.x}'), [(NC('A1', 'x'), NC('A2', 'y  X z'))])
+
+    def test_attr_words(self):
+        html = '<a x="1 22 3">A1</a><a x=22>A2</a><a x="122">A3</a><a y="22">A4</a>'
+        self.assertEqual(dom_select(html, '[x~=22]::text'), [['A1'], ['A2']])
+        self.assertEqual(dom_select(html, '[x|=2]::text'), [['A1'], ['A2']])
+        self.assertEqual(dom_select(html, '[x|=1][x~=3]::text'), [['A1']])
+        self.assertEqual(dom_select(html, 'a:not([x~=22])::text'), [['A3'], ['A4']])
+
     def test_node_attr(self):
         self.assertRaises(AttributeError, getattr, dom_select('<a>A</a>', 'a')[0].attr, 'x')
         self.assertRaises(AttributeError, dom_select('<a>A</a>', 'a')[0].attr, 'x')
@@ -165,6 +198,119 @@ class TestDomSelect(TestCase):
 
 
 
+class TestDomSelectGroup(TestCase):
+
+    html = '<ul class="m"><li><a x="1">A1</a><i>I1</i><a x="2" class="y">A2</a></li></ul><a x="3">A3</a><i>I2</i>'
+
+    def _expected(self, sel):
+        # all A results, then all B results
+        expected = []
+        for path in sel.split(','):
+            expected += dom_select(self.html, path.strip())
+        return expected
+
+    def test_grouped(self):
+        self.assertEqual(dom_select(self.html, 'a::text, i::text'), [['A1'], ['A2'], ['A3'], ['I1'], ['I2']])
+        self.assertEqual(dom_select(self.html, 'a::text, i::text', grouped=True),
+                         [['A1'], ['A2'], ['A3'], ['I1'], ['I2']])
+        self.assertEqual(repr(dom_select(self.html, 'a, a')), repr(dom_select(self.html, 'a') * 2))
+
+    def test_doc_order(self):
+        self.assertEqual(dom_select(self.html, 'a::text, i::text', grouped=False),
+                         [['A1'], ['I1'], ['A2'], ['A3'], ['I2']])
+        self.assertEqual([n.text for n in dom_select(self.html, 'a, i', grouped=False)],
+                         ['A1', 'I1', 'A2', 'A3', 'I2'])
+
+    def test_unique(self):
+        self.assertEqual(dom_select(self.html, 'a.y::text, a[x]::text', grouped=False), [['A1'], ['A2'], ['A3']])
+        self.assertEqual(repr(dom_select(self.html, 'a, a', grouped=False)), repr(dom_select(self.html, 'a')))
+
+    def test_prefix(self):
+        for sel in ('ul.m a::text, ul.m i::text', 'ul a::text, i::text', 'a, i', 'li > a, i'):
+            with self.subTest(sel):
+                self.assertEqual(repr(dom_select(self.html, sel)), repr(self._expected(sel)))
+                self.assertEqual(repr(dom_select(self.html, sel)), repr(dom_select(self.html, sel, grouped=True)))
+        self.assertEqual(dom_select(self.html, 'ul.m a::text, ul.m i::text', grouped=False), [['A1'], ['I1'], ['A2']])
+
+    def test_different_results(self):
+        # node matched by many paths with different results: nothing is lost, results are grouped
+        html = '<a href="/1" title="T1">A</a><a href="/2" title="T2">B</a>'
+        self.assertEqual(dom_select(html, 'a::attr(href), a::attr(title)', grouped=False),
+                         [['/1'], ['/2'], ['T1'], ['T2']])
+        self.assertEqual(dom_select(html, 'a::text, a::attr(href)', grouped=False), [['A'], ['B'], ['/1'], ['/2']])
+        for sel in ('a(x), i::text', 'a.y::text, a[x]::attr(x)', 'a::text, a::attr(href)'):
+            with self.subTest(sel):
+                self.assertEqual(dom_select(self.html, sel, grouped=False), self._expected(sel))
+
+    def test_limit(self):
+        html = '<a id="x">1</a><i id="x">2</i><a>3</a>'
+        sel = CompiledSelector('a::text, i::text')
+        sel.group[0][-1].limit = 1
+        self.assertEqual(dom_select(html, sel, grouped=False), [['1'], ['2']])
+
+    def test_same_as_grouped(self):
+        for sel in ('a, i', 'a:contains(2), i', '*[x="3"], i:first-child', 'li > a, i', 'a(x), i::text',
+                    'ul a::text, i::text', 'a.y::text, a[x]::attr(x)'):
+            with self.subTest(sel):
+                self.assertEqual(repr(dom_select(self.html, sel)), repr(dom_select(self.html, sel, grouped=True)))
+                self.assertEqual(repr(dom_select(self.html, sel)), repr(self._expected(sel)))
+
+
+class TestDomSelectFused(TestCase):
+
+    html = ('<head><meta property="og:title" content="T"><meta property=og:image content=\'/i\'></head>'
+            '<a href="/1" title=A>A</a><a name=x>X</a><A HREF=x2 href="/3">B</A><a href>C</a>'
+            '<img class="big poster" src="/p.jpg"><img class=poster2 src=q.jpg><a data-xy="1">D</a>')
+
+    def test_fused(self):
+        for sel in ('a[href]::attr(href)', 'a::attr(href)', 'a(href, title)', 'img.poster::attr(src)',
+                    'meta[property="og:title"]::attr(content)', '*(content)', 'a[data-x](data-x)'):
+            with self.subTest(sel):
+                general = CompiledSelector(sel)
+                general.group._fused = None  # general engine
+                self.assertEqual(dom_select(self.html, sel), dom_select(self.html, general))
+                self.assertIsNotNone(compile_selector(sel).group._fused)
+        self.assertEqual(dom_select(self.html, 'a::attr(href)'), [['/1'], [None], ['/3'], [''], [None]])
+        self.assertEqual(dom_select(self.html, 'img.poster::attr(src)'), [['/p.jpg']])
+        self.assertEqual(dom_select(self.html, 'meta[property="og:title"](content)'), [['T']])
+
+    def test_general(self):
+        for sel in ('a', 'a::text', 'a(HREF)', 'div a(href)', 'a:first-child(href)', 'a[href][title](href)'):
+            with self.subTest(sel):
+                dom_select(self.html, sel)
+                self.assertIsNone(compile_selector(sel).group._fused)
+
+
+
+class TestDomSelectSharedPrefix(TestCase):
+
+    html = '<div class="x"><a><b>B1</b><c>C1</c><b>B2</b></a><p>P</p></div><a><b>B9</b></a>'
+
+    def test_key(self):
+        key = lambda sel: parse_selector(sel)[0][-1].key
+        self.assertEqual(key('a.x[y="1"]:contains(z)'), key('a.x[y="1"]:contains(z)'))
+        self.assertEqual(key('a.x.y'), key('a.y.x'))
+        self.assertNotEqual(key('a:contains(z)'), key('a:contains(y)'))
+        self.assertNotEqual(key('a:not(.x)'), key('a:not(.y)'))
+        self.assertNotEqual(key('a > b'), key('a b'))
+        self.assertEqual(hash(parse_selector('a b')), hash(parse_selector('a b')))
+        self.assertNotEqual(hash(parse_selector('a a')), hash(parse_selector('b b')))
+
+    def test_group(self):
+        for sel in ('div.x a b, div.x a c, div.x p', 'a b::text, a c::text, b', 'a:not(.y) > b, a:not(.y) > c'):
+            with self.subTest(sel):
+                expected = []
+                for path in sel.split(','):
+                    expected += dom_select(self.html, path.strip())
+                self.assertEqual(repr(dom_select(self.html, sel, grouped=True)), repr(expected))
+
+    def test_set(self):
+        self.assertEqual(dom_select(self.html, 'div {a b, a c, p}'), [(N('B1'), N('C1'), N('P'))])
+        self.assertEqual(dom_select(self.html, 'div {{a b, a c}}'), [(N('B1'), N('C1'))])
+        self.assertEqual(dom_select(self.html, '{a b:2, a c, a b:1}'), [(N('B2'), N('C1'), N('B1'))])
+
+
+
 class TestDomSelectSet(TestCase):
 
     def test_simple(self):
@@ -202,6 +348,21 @@ class TestDomSelectSet(TestCase):
         self.assertEqual(dom_select('<a>A1</a><a>A2</a><b>B1</b><b>B2</b>', '{a:1,a,b:2}'), [(N('A1'), N('A2'), N('B2'))])
 
 
+    def test_nth_rows(self):
+        html = '<tr><td>1</td><td>2</td><td>3</td></tr><tr><td>4</td><td>5</td><td>6</td></tr>'
+        self.assertEqual(dom_select(html, 'tr {td:1, td:3}'), [(N('1', tag='td'), N('3', tag='td')),
+                                                             (N('4', tag='td'), N('6', tag='td'))])
+        self.assertEqual(dom_select(html, 'tr {td:2, td, td:1::text}'), [(N('2', tag='td'), N('3', tag='td'), ['1']),
+                                                                       (N('5', tag='td'), N('6', tag='td'), ['4'])])
+        self.assertEqual(dom_select(html, 'tr {td:3, td}'), [])
+        self.assertEqual(dom_select(html, 'tr {td:1, td:4}'), [])
+        self.assertEqual(dom_select(html + '<tr><td>7</td></tr>', 'tr {td:1, td:2}'), [])
+
+    def test_nth_desc(self):
+        html = '<a><b>B1</b><c>C1</c><b>B2</b><c>C2</c></a>'
+        self.assertEqual(dom_select(html, '{a b:2, a c:2, a c:1}'), [(N('B2'), N('C2'), N('C1'))])
+        self.assertEqual(dom_select(html, '{a c, a b, a c}'), [(N('C1'), N('B1'), N('C2'))])
+
 
 class TestDomSelectChild(TestCase):
 
@@ -233,6 +394,32 @@ class TestDomSelectSilbing(TestCase):
     def test_many_hit(self):
         self.assertEqual(dom_select('<a>A1</a><a>A2</a><a>A3</a>', 'a + a'), [N('A2'), N('A3')])
 
+    def test_parent(self):
+        self.assertEqual(dom_select('<div><a>A</a></div><b>B</b>', 'a + b'), [])
+        self.assertEqual(dom_select('<div><a>A</a>text<b>B1</b></div><b>B2</b>', 'a + b'), [N('B1')])
+        self.assertEqual(dom_select('<div><a>A<i>I</i></a><b>B</b></div>', 'div a + b'), [N('B')])
+
+    def test_pseudo(self):
+        html = '<ul><li>1</li><li>2</li><li>3</li></ul>'
+        self.assertEqual(dom_select(html, 'li + li:last-child::text'), [['3']])
+        self.assertEqual(dom_select(html, 'li + li:nth-child(2)::text'), [['2']])
+
+
+class TestDomSelectGeneralSilbing(TestCase):
+
+    html = '<div><a>A</a>x<b>B1</b><c/><b>B2</b></div><b>B3</b>'
+
+    def test_empty(self):
+        self.assertEqual(dom_select(self.html, 'b ~ a'), [])
+        self.assertEqual(dom_select(self.html, 'div ~ a'), [])
+
+    def test_many(self):
+        self.assertEqual(dom_select(self.html, 'a ~ b::text'), [['B1'], ['B2']])
+        self.assertEqual(dom_select(self.html, 'a ~ c + b::text'), [['B2']])
+        self.assertEqual(dom_select(self.html, 'div ~ b::text'), [['B3']])
+        self.assertEqual(dom_select(self.html, 'a ~ b:last-of-type::text'), [['B2']])
+        self.assertEqual(dom_select(self.html, 'a ~ *::text'), [['B1'], [''], ['B2']])
+
 
 
 class TestDomSelectFirstLastChild(TestCase):
@@ -309,6 +496,30 @@ class TestDomSelectFirstLastChild(TestCase):
         self.assertEqual(dom_select('<a>A1</a><b/>', 'a:only-of-type'), [N('A1')])
         self.assertEqual(dom_select('<a>A1</a><a/>', 'a:only-of-type'), [])
 
+    def test_nested(self):
+        html = '<div><p>A</p><i><b>1</b></i><b>2</b><p>3</p><br></div>'
+        self.assertEqual(dom_select(html, 'div b:first-child::text'), [['1']])
+        self.assertEqual(dom_select(html, 'div b:only-of-type::text'), [['1'], ['2']])
+        self.assertEqual(dom_select(html, 'div p:last-of-type::text'), [['3']])
+        self.assertEqual(dom_select(html, 'div :last-child'), [N('1', tag='b'), N('', tag='br')])
+
+    def test_nth_child(self):
+        html = '<ul><li>1</li><li>2</li><li>3</li><li>4</li><li>5</li></ul>'
+        for arg, res in (('3', '3'), ('odd', '135'), ('even', '24'), ('2n+1', '135'), ('2n', '24'),
+                         ('n+4', '45'), ('-n+2', '12'), ('3n-1', '25'), (' 2n - 1 ', '135'), ('0', '')):
+            with self.subTest(arg):
+                self.assertEqual(dom_select(html, 'li:nth-child({})::text'.format(arg)), [[t] for t in res])
+        self.assertEqual(dom_select(html, 'li:nth-last-child(2)::text'), [['4']])
+        self.assertEqual(dom_select(html, 'li:nth-last-child(-n+2)::text'), [['4'], ['5']])
+        self.assertRaises(ValueError, dom_select, html, 'li:nth-child(x)')
+
+    def test_nth_of_type(self):
+        html = '<div><p>1</p><b>2</b><p>3</p><b>4</b><p>5</p></div>'
+        self.assertEqual(dom_select(html, 'p:nth-of-type(2)::text'), [['3']])
+        self.assertEqual(dom_select(html, 'div :nth-of-type(2)::text'), [['3'], ['4']])
+        self.assertEqual(dom_select(html, 'p:nth-last-of-type(odd)::text'), [['1'], ['5']])
+        self.assertEqual(dom_select(html, 'b:nth-last-of-type(1)::text'), [['4']])
+
 
 
 class TestDomSelectNot(TestCase):
@@ -338,6 +549,319 @@ class TestDomSelectNot(TestCase):
         self.assertEqual(dom_select('<a>A</a><b>B</b>', ':not(:first-child)'), [N('B')])
         self.assertEqual(dom_select('<a>A</a><b>B</b>', 'a:not(:first-child)'), [])
 
+    def test_attrs(self):
+        html = '<a class="x ad">1</a><a href="/2" class="y">2</a><a x="<a class=ad>">3</a><A CLASS="AD">4</A>'
+        self.assertEqual(dom_select(html, 'a:not(.ad)::text'), [['2'], ['3']])
+        self.assertEqual(dom_select(html, 'a:not([href])::text'), [['1'], ['3'], ['4']])
+        self.assertEqual(dom_select(html, 'a:not([href^="/"]):not(.x)::text'), [['3'], ['4']])
+        self.assertEqual(dom_select(html, ':not(a.y)::text'), [['1'], ['3'], ['4']])
+        self.assertEqual(dom_select(html, 'a:not(:contains(2)):not(.ad)::text'), [['3']])
+
+
+class TestDomSelectHas(TestCase):
+
+    html = '<div id="1"><a class="play">A1</a></div><div id="2"><b z="<a class=play>">B</b></div>' + \
+           '<div id="3"><p><a class="play x">A3</a></p></div>'
+
+    def test_empty(self):
+        self.assertRaises(ValueError, dom_select, self.html, 'div:has()')
+        self.assertEqual(dom_select(self.html, 'div:has(i)'), [])
+        self.assertEqual(dom_select(self.html, 'a:has(a)'), [])
+
+    def test_selector_list(self):
+        for sel in ('div:has(b, a)', 'div:has(a, b)', 'div:has("a", "b")', 'div:has(a, "b")', 'div:has("a, b")'):
+            with self.subTest(sel):
+                with self.assertRaises(ValueError):
+                    dom_select(self.html, sel)
+
+    def test_descendant(self):
+        self.assertEqual(dom_select(self.html, 'div:has(a.play)::attr(id)'), [['1'], ['3']])
+        self.assertEqual(dom_select(self.html, 'div:has(p a)::attr(id)'), [['3']])
+        self.assertEqual(dom_select(self.html, 'div:has(a:not(.x))::attr(id)'), [['1']])
+        self.assertEqual(dom_select(self.html, 'div:has(a:contains(A3))::attr(id)'), [['3']])
+        self.assertEqual(dom_select(self.html, 'div:has("p a")::attr(id)'), [['3']])
+
+    def test_child(self):
+        self.assertEqual(dom_select(self.html, 'div:has(> a)::attr(id)'), [['1']])
+        self.assertEqual(dom_select(self.html, 'div:has(> p > a.x)::attr(id)'), [['3']])
+        self.assertEqual(dom_select(self.html, 'div:has(>a)::attr(id)'), [['1']])
+
+    def test_sibling(self):
+        self.assertEqual(dom_select(self.html, 'div:has(+ div b)::attr(id)'), [['1']])
+        self.assertEqual(dom_select(self.html, 'div:has(~ div > p)::attr(id)'), [['1'], ['2']])
+        self.assertEqual(dom_select(self.html, 'div:has(+ div:has(p))::attr(id)'), [['2']])
+        self.assertEqual(dom_select(self.html, 'div:not(:has(a))::attr(id)'), [['2']])
+
+    def test_nested(self):
+        html = '<ul><li><ul><li>1</li></ul></li><li><b>2</b></li></ul>'
+        self.assertEqual(dom_select(html, 'li:has(b)::text'), [['2']])
+        self.assertEqual([n.content for n in dom_select(html, 'ul:has(> li > b)')],
+                         ['<li><ul><li>1</li></ul></li><li><b>2</b></li>'])
+        self.assertEqual([n.content for n in dom_select(html, 'li:has(li)')], ['<ul><li>1</li></ul>'])
+
+
+class TestDomSelectColumnar(TestCase):
+
+    html = '<ul><li><a href="/1" title="T1">A<b>1</b></a></li><li><a href="/2">A2</a></li></ul><a href="/3">A3</a>'
+
+    def test_columnar(self):
+        for sel in ('a::attr(href, title)', 'ul a(href)', 'li > a::text', 'a:contains(2)::attr(href)'):
+            with self.subTest(sel):
+                self.assertEqual(dom_select(self.html, sel, columnar=True).to_rows(), dom_select(self.html, sel))
+
+    def test_attr_case(self):
+        html = '<a HREF="/1" Title="T">x</a>'
+        for sel in ('a::attr(HREF)', 'a::attr(href)', 'a(HREF, Title)', 'a(href, Title)', 'a::text::attr(Title)'):
+            with self.subTest(sel):
+                self.assertEqual(dom_select(html, sel, columnar=True).to_rows(), dom_select(html, sel))
+
+    def test_columns(self):
+        cols = dom_select(self.html, 'a::attr(href, title)', columnar=True)
+        self.assertEqual(cols.names, ['href', 'title'])
+        self.assertEqual(list(cols['href']), ['/1', '/2', '/3'])
+        self.assertEqual(list(cols[1]), ['T1', None, None])
+
+    def test_unsupported(self):
+        with self.assertRaises(ValueError):
+            dom_select(self.html, 'a, b', columnar=True)
+        with self.assertRaises(ValueError):
+            dom_select(self.html, 'li::text a', columnar=True)
+
+
+class TestCompiledSelector(TestCase):
+
+    html = '<div class="x"><a href="/1">A</a><b>B</b></div><div><a>A2</a></div>'
+
+    def test_compiled(self):
+        for sel in ('div.x a::attr(href)', 'div a', 'div {a, b?}', 'a:contains(2)::text', 'div.x a, b'):
+            with self.subTest(sel):
+                csel = compile_selector(sel)
+                self.assertIsInstance(csel, CompiledSelector)
+                expected = repr(dom_select(self.html, sel))
+                self.assertEqual(repr(dom_select(self.html, csel)), expected)
+                self.assertEqual(repr(dom_select(self.html, csel)), expected)  # reuse compiled results
+                self.assertEqual(repr(dom_select(self.html, [csel])), repr([dom_select(self.html, sel)]))
+
+    def test_cache(self):
+        self.assertIs(compile_selector('div a'), compile_selector('div a'))
+        csel = CompiledSelector('div a')
+        self.assertIs(compile_selector(csel), csel)
+
+
+class TestSelectorCode(TestCase):
+
+    html = ('<ul><li class="a b">1<i>x</i></li><li class="b">2</li><li class="a">3<b>y</b></li></ul>'
+            '<ul><li class="a c">4</li></ul>')
+
+    def test_same_as_filters(self):
+        nodes = dom_select(self.html, 'li')
+        for sel in ('li.a.b', 'li[class|=c]', 'li:first-child', 'li:nth-child(2n+1)', 'li:nth-last-of-type(-n+2)',
+                    'li:only-child', 'li:contains(3)', 'li:content-contains("<i>")', 'li:empty', 'li:regex("b.>2")',
+                    'li:not(.b):has(b)', 'li:last-of-type:contains("1", "3")'):
+            with self.subTest(sel):
+                s = parse_selector(sel)[0][-1]
+                code = selector_code(s)
+                self.assertEqual([code.nodefilter(n) for n in nodes],
+                                 [all(f(n) for f in s.nodefilterlist) for n in nodes])
+
+    def test_values(self):
+        self.assertEqual(dom_select(self.html, 'li:first-child::attr(class)'), [['a b'], ['a c']])
+        self.assertEqual(dom_select(self.html, 'li.b::text::attr(class, x)'), [['1x', 'a b', None], ['2', 'b', None]])
+        self.assertEqual(dom_select(self.html, 'ul {li.c::text}'), [(['4'], )])
+
+    def test_source(self):
+        code = selector_code(parse_selector('li.a:nth-child(odd)::text')[0][-1])
+        self.assertIn('node.tokens(', code.source)
+        self.assertIn('k % 2 == 0', code.source)
+        self.assertIn('return [node.text]', code.source)
+        self.assertIsNone(selector_code(parse_selector('li')[0][-1]).nodefilter)
+        source = compile_selector('ul > li:first-child, li.b(class)').source()
+        self.assertEqual(source.count('def nodefilter('), 2)
+        self.assertEqual(source.count('def values('), 1)
+
+
+class TestSelectorOptimize(TestCase):
+
+    html = ('<div id="m"><a class="x y" href="1">A1</a><a href="2">A2</a><b class="x">B</b></div>'
+            '<div><a class="y" href="3">A3</a><a class="x" href="4">A4</a></div>')
+
+    def opt(self, selector, unique_ids=False):
+        log = []
+        return optimize(parse_selector(selector), log, unique_ids=unique_ids)[0][-1], log
+
+    def test_rules(self):
+        sel, log = self.opt('*.x.y:not(:not(a.z))[href][href="1"]:first-child:first-child')
+        self.assertEqual(sel.tag, 'a')
+        self.assertEqual(sel.attrs['href'], ['1'])
+        self.assertEqual([key[0] for key in sel.filterkeys], ['words', 'first-child'])
+        self.assertEqual(sel.nodefilterlist[0].checks, (('class', frozenset('xyz'), ()), ))
+        self.assertEqual(log, ['star', 'not-not', 'attrs', 'filters', 'words'])
+        self.assertEqual(self.opt('#m a')[0].limit, None)
+        self.assertEqual(self.opt('div #m')[0].limit, None)
+        self.assertEqual(self.opt('div #m', unique_ids=True)[1], ['unique-id'])
+        self.assertEqual(self.opt('div #m', unique_ids=True)[0].limit, 1)
+        self.assertEqual(self.opt('div a::none')[0].limit, 1)
+        self.assertEqual(self.opt('div::none a')[0].limit, None)
+        self.assertEqual(self.opt('a:not(:not(b))')[1], [])
+
+    def test_same_results(self):
+        for sel in ('*.x', 'a:not(:not(.x))', 'div:not(:not(#m)) a::text', 'a[href][href="2"]', ':not(:not(.y)).x',
+                    'a.x:not(:not(.y))(href)', 'a:first-child:first-child', '#m a::text', 'div {a.y::none, b?}',
+                    '{div a::none, b}', '#m::none', 'a:not(:not(b))', 'div:not(:not(:not(#m)))'):
+            with self.subTest(sel):
+                self.assertEqual(repr(dom_select(self.html, sel)),
+                                 repr(_select_group([], _make_html_list(self.html), parse_selector(sel))))
+
+    def test_duplicate_id(self):
+        html = '<a id=x>1</a><a id=x>2</a><div><b id=x>3</b></div>'
+        for sel in ('#x::text', 'a#x::text', '[id=x]::text', 'div #x::text', '#x::none'):
+            with self.subTest(sel):
+                self.assertEqual(repr(dom_select(html, sel)),
+                                 repr(_select_group([], _make_html_list(html), parse_selector(sel))))
+        self.assertEqual(dom_select(html, '#x::text'), [['1'], ['2'], ['3']])
+        self.assertEqual(dom_select(html, 'a#x::text'), [['1'], ['2']])
+        # opt-in, the first hit only
+        self.assertEqual(dom_select(html, compile_selector('a#x::text', unique_ids=True)), [['1']])
+        self.assertEqual(dom_select(html, 'a#x::text'), [['1'], ['2']])  # not cached together
+        self.assertEqual(compile_selector('#x', unique_ids=True).rules, ['unique-id'])
+
+    def test_explain(self):
+        out = io.StringIO()
+        explain('div > *.x:not(:not(.y))::text', file=out)
+        out = out.getvalue().splitlines()
+        self.assertEqual(out[0], 'selector: div > *.x:not(:not(.y))::text')
+        self.assertEqual(out[1:10], ['before:', '  path', '    div', '    > *.x:not(*:not(*.y))::text',
+                                     'after:', '  path', '    div', '    > *.x.y::text',
+                                     'rules: star, not-not, words'])
+
+
+class TestExplain(TestCase):
+
+    html = '<div id="m"><ul><li class="a"><a href="1">A1</a></li><li><a href="2">A2</a></li></ul></div>'
+
+    def explain(self, *args, **kwargs):
+        out = io.StringIO()
+        explain(*args, file=out, **kwargs)
+        return out.getvalue().splitlines()
+
+    def test_plan(self):
+        out = self.explain('ul > li.a a::text')
+        self.assertEqual(out[out.index('plan: single path'):], [
+            'plan: single path',
+            '  ul       regex scan',
+            '  > li.a   root-level scan',
+            '  a::text  regex scan, text projection',
+        ])
+        def plan(sel):
+            return next(line for line in self.explain(sel) if line.startswith('plan: '))
+        self.assertTrue(plan('a[href]::attr(href)').startswith('plan: fused regex'))
+        self.assertEqual(plan('a, li'), 'plan: path by path')
+        self.assertEqual(next(line for line in self.explain('a, li', grouped=False) if line.startswith('plan: ')),
+                         'plan: union scan (2 paths in one regex)')
+        self.assertTrue(plan('div li.a a, div li b').startswith('plan: shared prefix'))
+
+    def test_stats(self):
+        out = self.explain('#m li.a a::text', self.html)
+        self.assertEqual(out[-1].split(',')[0], 'total: 1 results')
+        rows = [line.split() for line in out[out.index('plan: single path') + 2:-1]]
+        self.assertEqual([row[0] for row in rows], ["*[id='m']", 'li.a', 'a::text'])
+        # calls, parts, bytes, estimated, found
+        self.assertEqual([row[1:6] for row in rows], [
+            ['1', '1', str(len(self.html)), '6', '1'],
+            ['1', '1', str(len(self.html) - 18), '2', '1'],
+            ['1', '1', '18', '1', '1'],
+        ])
+        self.assertEqual(dom_select(self.html, '#m li.a a::text'), [['A1']])
+
+
+class TestProfile(TestCase):
+
+    html = '<ul><li class="a"><a href="1">A1</a></li><li><a href="2" title="x">A2</a></li></ul>'
+
+    def test_counters(self):
+        compile_selector('li.a a::text')
+        with profile() as p:
+            self.assertEqual(dom_select(self.html, 'li.a a::text'), [['A1']])
+            self.assertEqual(dom_select(self.html, 'li.a a::text'), [['A1']])
+            self.assertEqual(dom_select(self.html, 'a(title)'), [[None], ['x']])
+        d = p.as_dict()
+        self.assertEqual(d['cache'], {'hits': 2, 'misses': 1})
+        self.assertEqual(sorted(d['selectors']), ['a(title)', 'li.a a::text'])
+        self.assertEqual(d['selectors']['li.a a::text']['calls'], 2)
+        self.assertEqual(d['regex']['a']['scans'], 2)
+        self.assertEqual(d['regex']['fused scan']['scans'], 1)
+        self.assertEqual(d['find_node']['calls'], 4)    # li.a and a in both calls
+        self.assertEqual(d['nodes'], 4)
+        self.assertEqual(d['text']['strips'], 2)
+        self.assertIn('selector cache hits', p.table())
+
+    def test_unique_ids(self):
+        sel = '#m li.a a::text'
+        compile_selector(sel)  # cached without unique_ids only
+        with profile() as p:
+            compiled = pdom_mselect.compile_selector(sel, unique_ids=True)
+            self.assertIs(pdom_mselect.compile_selector(sel, unique_ids=True), compiled)
+            self.assertIs(pdom_mselect.compile_selector(sel, True), compiled)
+            self.assertIsNot(pdom_mselect.compile_selector(sel), compiled)
+        self.assertTrue(compiled.unique_ids)
+        self.assertEqual(p.as_dict()['cache'], {'hits': 3, 'misses': 1})
+
+    def test_restored(self):
+        find_node, select_group, init = pdom_base.find_node, pdom_mselect._select_group, Node.__init__
+        with profile() as p:
+            self.assertIsNot(pdom_base.find_node, find_node)
+            self.assertTrue(p.running)
+        self.assertFalse(p.running)
+        self.assertIs(pdom_base.find_node, find_node)
+        self.assertIs(pdom_mselect._select_group, select_group)
+        self.assertIs(Node.__init__, init)
+        dom_select(self.html, 'li a')
+        self.assertEqual(p.as_dict()['nodes'], 0)
+
+
+class TestSlowLog(TestCase):
+
+    html = '<ul><li class="a"><a href="1">A1</a></li><li><a href="2">A2</a></li></ul>'
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_records(self):
+        with slow_log(0, size=2) as log:
+            pdom_mselect.dom_select(self.html, 'li.a a::text')
+        pdom_mselect.dom_select(self.html, 'li')  # stopped
+        self.assertEqual(len(log.records), 1)
+        rec = log.records[0]
+        self.assertEqual(rec['func'], 'dom_select')
+        self.assertEqual(rec['selector'], 'li.a a::text')
+        self.assertEqual(rec['size'], len(self.html))
+        self.assertEqual(rec['fingerprint'], fingerprint(self.html))
+        self.assertEqual(rec['candidates'], 2)   # li.a and a
+        self.assertEqual(rec['results'], 1)
+        self.assertIsNone(rec['error'])
+        with slow_log(0, size=2) as log:
+            for _ in range(3):
+                pdom_mselect.dom_select(self.html, 'a')
+        self.assertEqual(len(log.records), 2)
+        with slow_log(60) as log:
+            pdom_mselect.dom_select(self.html, 'a')
+        self.assertEqual(len(log.records), 0)
+
+    def test_file_and_capture(self):
+        path, capture = os.path.join(self.tmp, 'slow.jsonl'), os.path.join(self.tmp, 'pages')
+        with slow_log(0, path=path, max_bytes=300, backups=1, capture=capture) as log:
+            for sel in ('li', 'a', 'li a'):
+                pdom_mselect.dom_select(self.html, sel)
+        self.assertEqual(sorted(os.listdir(self.tmp)), ['pages', 'slow.jsonl', 'slow.jsonl.1'])
+        with open(path) as f:
+            self.assertEqual(json.loads(f.readline())['selector'], 'li a')
+        self.assertEqual(os.listdir(capture), ['{}.html'.format(fingerprint(self.html))])
+        with open(log.records[0]['capture']) as f:
+            self.assertEqual(f.read(), self.html)
+
 
 # Manual tests
 if __name__ == '__main__':
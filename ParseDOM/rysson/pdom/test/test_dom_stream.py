@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, unicode_literals, print_function
+
+from .base import TestCase
+from unittest import skip as skiptest, skipIf as skiptestIf
+
+from ..msearch import dom_search
+from ..mselect import dom_select
+from ..mstream import dom_search_iter, dom_select_iter, dom_select_one
+from ..base import Node, ResultParam, MissingAttr   # for test only
+
+
+def chunks(s, size):
+    return [s[i:i+size] for i in range(0, len(s), size)]
+
+
+class TestDomSearchIter(TestCase):
+
+    html = '<div><a x="1">A1<b>B</b></a> <a>A2</a><p>żółć<a y=2/></p></div><a>A3'
+
+    def test_whole(self):
+        self.assertEqual(list(dom_search_iter('<a>A</a>', 'a')), ['A'])
+        self.assertEqual(list(dom_search_iter(b'<a>A</a>', 'a')), ['A'])
+        self.assertEqual(list(dom_search_iter(self.html, 'a')), dom_search(self.html, 'a'))
+
+    def test_chunks(self):
+        for size in (1, 2, 3, 5, 100):
+            with self.subTest('chunk size {}'.format(size)):
+                self.assertEqual(list(dom_search_iter(chunks(self.html, size), 'a')),
+                                 dom_search(self.html, 'a'))
+
+    def test_chunk_boundaries(self):
+        # tag-like text in attribute values is never a tag, whatever chunks are
+        for html in ('<div><a title="<b>x</b>">T</a><b>real</b></div>',
+                     "<p x='a>b<b>q</b>'>P<b>r</b></p><b y=\"'>\">s</b>",
+                     '<script>if (a < b) x="<b>";</script><b>z</b> a < b <b>2</b>'):
+            expected = list(dom_search_iter(html, 'b'))
+            for size in range(1, len(html) + 1):
+                with self.subTest('{!r}, chunk size {}'.format(html, size)):
+                    self.assertEqual(list(dom_search_iter(chunks(html, size), 'b')), expected)
+                    self.assertEqual(list(dom_select_iter(chunks(html, size), 'b::text')), [[v] for v in expected])
+        self.assertEqual(list(dom_search_iter(chunks('<div><a title="<b>x</b>">T</a><b>real</b></div>', 15), 'b')),
+                         ['real'])
+
+    def test_bytes_chunks(self):
+        html = self.html.encode('utf-8')
+        for size in (1, 2, 3):
+            with self.subTest('chunk size {}'.format(size)):
+                self.assertEqual(list(dom_search_iter(chunks(html, size), 'p')), ['żółć<a y=2/>'])
+
+    def test_ret(self):
+        html = self.html * 2
+        self.assertEqual(list(dom_search_iter(chunks(html, 3), 'a', ret='x')), dom_search(html, 'a', ret='x'))
+        self.assertEqual(list(dom_search_iter(chunks(html, 3), 'a', ret=['x', 'y'])),
+                         dom_search(html, 'a', ret=['x', 'y']))
+        self.assertEqual(list(dom_search_iter(chunks(html, 3), 'a', ret=ResultParam('x', missing=MissingAttr.NoSkip))),
+                         dom_search(html, 'a', ret=ResultParam('x', missing=MissingAttr.NoSkip)))
+
+    def test_attrs(self):
+        html = '<a x="1">A1</a><a x="2" y="1">A2</a><a y="1" x="1">A3</a>'
+        self.assertEqual(list(dom_search_iter(chunks(html, 4), 'a', {'x': '1'})), ['A1', 'A3'])
+        self.assertEqual(list(dom_search_iter(chunks(html, 4), 'a', {'x': '1', 'y': True})), ['A3'])
+
+    def test_nested(self):
+        html = '<a>A<a>B<a>C</a></a></a>'
+        self.assertEqual(list(dom_search_iter(chunks(html, 2), 'a')), dom_search(html, 'a'))
+
+    def test_detached_nodes(self):
+        html = ('<li><a href="x">' + 'y' * 50 + '</a></li>') * 1000
+        nodes = list(dom_search_iter(chunks(html, 100), 'a', ret=Node))
+        self.assertEqual(len(nodes), 1000)
+        self.assertTrue(all(n.item == n.outerHTML for n in nodes))
+        self.assertEqual(nodes[-1].attrs, {'href': 'x'})
+
+
+class TestDomSelectIter(TestCase):
+
+    html = '<div><a x="1">A1<b>B</b></a> <a>A2</a><p>żółć<a y=2/></p></div><a>A3</a>'
+
+    def test_select(self):
+        for sel in ('a', 'div a::text', 'div > a', 'p a(y)', 'a:contains(A2)', 'div {a, p}'):
+            with self.subTest(sel):
+                self.assertEqual(repr(list(dom_select_iter(chunks(self.html, 3), sel))),
+                                 repr(dom_select(self.html, sel)))
+
+    def test_context(self):
+        # node position and siblings are out of streamed node, whole input is used
+        for html, sel in (('<ul><li>1</li><li>2</li></ul>', 'li:first-child'),
+                          ('<ul><li>1</li><li>2</li></ul>', 'li:nth-child(2)::text'),
+                          ('<ul><li>1</li><li>2</li></ul>', 'li:not(:last-child)'),
+                          ('<ul><li>1</li><li>2</li></ul>', 'li:has(+ li)::text'),
+                          ('<dl><dt>t</dt><dd>d</dd></dl>', 'dt + dd::text'),
+                          ('<dl><dt>t</dt><dd>d</dd></dl>', 'dt ~ dd::text'),
+                          ('<dl><dt>t</dt><dd>d</dd></dl>', 'dl dt + dd'),
+                          ('<ul><li>1</li><li>2</li></ul>', 'ul li:first-child::text')):
+            with self.subTest(sel):
+                expected = dom_select(html, sel)
+                self.assertTrue(expected)
+                for size in (1, 3, len(html)):
+                    self.assertEqual(repr(list(dom_select_iter(chunks(html, size), sel))), repr(expected))
+
+    def test_group_document_order(self):
+        self.assertEqual([n.name for n in dom_select_iter(chunks(self.html, 3), 'p, b')], ['b', 'p'])
+
+    def test_set_first(self):
+        self.assertEqual(repr(list(dom_select_iter(chunks(self.html, 3), '{b, p}'))),
+                         repr(dom_select(self.html, '{b, p}')))
+
+
+class SlowPageServer(object):
+    r"""Local HTTP server which serves large page slowly (chunk by chunk)."""
+
+    def __init__(self, head, body_chunk, count, delay=0.002):
+        try:
+            from http.server import HTTPServer, BaseHTTPRequestHandler
+            from socketserver import ThreadingMixIn
+        except ImportError:  # Py2
+            from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+            from SocketServer import ThreadingMixIn
+        import threading
+        import time
+        server = self
+        self.sent = 0
+        self.size = len(head) + len(body_chunk) * count
+
+        class Handler(BaseHTTPRequestHandler):
+            timeout = 5
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.end_headers()
+                try:
+                    self.wfile.write(head)
+                    for i in range(count):
+                        self.wfile.write(body_chunk)
+                        self.wfile.flush()
+                        server.sent += 1
+                        time.sleep(delay)
+                except (IOError, OSError):
+                    pass  # client closed connection
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingMixIn, HTTPServer):
+            daemon_threads = True
+
+        self.httpd = Server(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{}/'.format(self.httpd.server_address[1])
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class CountingReader(object):
+    r"""File-like wrapper, counts read bytes."""
+
+    def __init__(self, fp):
+        self.fp, self.count, self.closed = fp, 0, False
+
+    def read(self, size=-1):
+        data = self.fp.read(size)
+        self.count += len(data)
+        return data
+
+    def close(self):
+        self.closed = True
+        self.fp.close()
+
+
+class TestDomSelectEarlyAbort(TestCase):
+
+    head = ('<html><head><link rel="next" href="/page/2">'
+            '<meta property="og:title" content="Title"></head><body>').encode('utf-8')
+    chunk = ('<div class="item"><a href="/x">X</a></div>' * 200).encode('utf-8')
+
+    def urlopen(self, url):
+        try:
+            from urllib.request import urlopen
+        except ImportError:  # Py2
+            from urllib2 import urlopen
+        return CountingReader(urlopen(url))
+
+    def test_select_one(self):
+        with SlowPageServer(self.head, self.chunk, 500) as server:
+            resp = self.urlopen(server.url)
+            self.assertEqual(dom_select_one(resp, 'link[rel=next](href)', chunk_size=1024), ['/page/2'])
+            self.assertTrue(resp.closed)
+            self.assertLess(resp.count, server.size // 100)
+
+    def test_limit(self):
+        with SlowPageServer(self.head, self.chunk, 500) as server:
+            resp = self.urlopen(server.url)
+            self.assertEqual(list(dom_select_iter(resp, 'div.item a::attr(href)', chunk_size=1024, limit=3)),
+                             [['/x'], ['/x'], ['/x']])
+            self.assertTrue(resp.closed)
+            self.assertLess(resp.count, server.size // 100)
+
+    def test_search_limit(self):
+        html = '<a>A1</a><a>A2</a><a>A3</a>'
+        self.assertEqual(list(dom_search_iter(chunks(html, 2), 'a', limit=2)), ['A1', 'A2'])
+        self.assertEqual(list(dom_search_iter(chunks(html, 2), 'a', limit=0)), [])
+
+    def test_select_one_default(self):
+        self.assertEqual(dom_select_one('<a>A</a>', 'b'), None)
+        self.assertEqual(dom_select_one('<a>A</a>', 'b', default=''), '')
+        self.assertEqual(dom_select_one('<a>A</a><a>B</a>', 'a::text'), ['A'])
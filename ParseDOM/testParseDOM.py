@@ -1,16 +1,48 @@
 # -*- coding: utf-8 -*-
+r"""
+Benchmark of parseDOM implementations (mrknow, cherry, rysson) on generated corpora.
+
+Usage:
+
+    python testParseDOM.py                          # all benchmarks, sizes s and m
+    python testParseDOM.py -c wide,xmltv -s l       # selected corpora and sizes
+    python testParseDOM.py -b select -i rysson      # benchmarks / implementations matching regex
+    python testParseDOM.py --json new.json          # save results
+    python testParseDOM.py --compare old.json new.json
+    python testParseDOM.py --compare old.json       # run and compare with saved results
+    python testParseDOM.py --fused                  # fused regex vs general engine
+    python testParseDOM.py --patterns [--github]    # parseDOM results on tricky patterns
+
+Every measurement is time of single call (best of repeats, number of calls
+is scaled to at least 0.1 s) and peak memory of single call (tracemalloc,
+Python 3 only). If single call is slower then --max-time, the same benchmark
+is skipped on larger sizes of the corpus.
+"""
 
 #from __future__ import absolute_import
 from __future__ import unicode_literals
 from __future__ import print_function
 from __future__ import division
 
+import re
 import sys
-import timeit as T
+import json
+import time
+import platform
+import argparse
+import subprocess
+from collections import OrderedDict
+from timeit import default_timer as timer
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
 import mrknow
 import cherry
 import rysson
 from rysson.pdom import Node
+from rysson.pdom import CompiledSelector
+from rysson.pdom import compat
 
 PY2 = sys.version_info < (3,0)
 PY3 = sys.version_info >= (3,0)
@@ -21,74 +53,336 @@ if PY3:
     basestring = str
 
 
-class cls(object):
-    def __init__(self, C):
-        self._cls = C
-    def __str__(self):
-        return self._cls.__name__
-    def __repr__(self):
-        return self._cls.__name__
+# -------  Corpora -------
 
 
-def prepare_html():
+def corpus_classic(n):
+    r"""Nested A, B, C tags with `x` attribute (the old benchmark page), `n` C blocks."""
     a = '<a>aaa</a>'
     b = '<b>bb1{a}bb2{a}bb3</b>\n'.format(**locals())
-    c = '<c>cc1{a}cc2{b}cc3{b}cc4</c>\n'.format(**locals())
     ax = dict((i, '<a x="{i}">aaa:x{i}</a>'.format(**locals())) for i in range(1, 4))
     L = locals()
-    bx = dict((i, '<b x="{i}">bb0:x{i}{a}bb1:x{i}{ax[1]}bb2:x{i}{ax[2]}bb9:x{i}</b>\n'.format(i=i, **L)) for i in range(1, 4))
+    bx = dict((i, '<b x="{i}">bb0:x{i}{a}bb1:x{i}{ax[1]}bb2:x{i}{ax[2]}bb9:x{i}</b>\n'.format(i=i, **L))
+              for i in range(1, 4))
     L = locals()
-    cx = dict((i, '<c x="{i}">cc:x{i}{ax[1]}cc0:x{i}{b}cc1:x{i}{bx[1]}cc2:x{i}{bx[2]}cc9:x{i}</c>\n'.format(i=i, **L)) for i in range(1, 4))
-    return '<div>\n' + (''.join(cx.values()) * 1000) + '</div>\n'
-
-
-def check(fun, *args, **kwargs):
-    prepare_html = kwargs.pop('prepare_html', globals()['prepare_html'])
-    line = []
-    if args:
-        line.append(', '.join(repr(a) for a in args))
-    if kwargs:
-        line.append(', '.join(str(k)+'='+repr(v) for k,v in kwargs.items()))
-    line = ','.join(line)
-    if PY2:
-        py2_setup = 'from testParseDOM import prepare_html,mrknow,cherry,rysson,Node; html=prepare_html()'
-    else:
-        html = prepare_html()
-        vars = globals()
-        vars.update(locals())
-    cmd = '{fun}(html, {line})'.format(fun=fun, line=line)
-    for i in range(6):
-        n = int(10**i)
-        #check('mrknow.parseDOM', html, 'a')
-        if PY2:
-            t = T.timeit(cmd, py2_setup, number=n)
-        else:
-            t = T.timeit(cmd, number=n, globals=vars)
-        if t > 0.2:
-            return t / n
-    return t / n
+    cx = [('<c x="{i}">cc:x{i}{ax[1]}cc0:x{i}{b}cc1:x{i}{bx[1]}cc2:x{i}{bx[2]}cc9:x{i}</c>\n'.format(i=i, **L))
+          for i in range(1, 4)]
+    return '<div>\n' + ''.join(cx[i % 3] for i in range(n)) + '</div>\n'
+
+
+def corpus_wide(n):
+    r"""Wide list: `n` items in one <ul>."""
+    item = ('<li class="item x{k}" data-id="{i}"><a class="link" href="/v/{i}" title="T{i}">Title {i}</a>'
+            '<span class="year">{y}</span></li>\n')
+    return ('<html><body><ul class="list">\n'
+            + ''.join(item.format(i=i, k=i % 5, y=1990 + i % 30) for i in range(n))
+            + '</ul></body></html>\n')
+
+
+def corpus_deep(n, depth=40):
+    r"""Deep nesting: `n` links, every in `depth` nested <div> tags."""
+    block = ''.join('<div class="lvl l{}">'.format(d) for d in range(depth)) + \
+        '<a class="link" href="/v/{i}" title="T{i}">Title {i}</a>' + '</div>' * depth + '\n'
+    return '<html><body>\n' + ''.join(block.format(i=i) for i in range(n)) + '</body></html>\n'
+
+
+def corpus_attrs(n, count=20):
+    r"""Attribute-heavy tags: `n` links with `count` extra attributes."""
+    extra = ' '.join('data-a{0}="value {0} {{i}}"'.format(j) for j in range(count))
+    item = '<li class="item"><a {extra} class="link" href="/v/{{i}}" title="T{{i}}">Title {{i}}</a></li>\n' \
+        .format(extra=extra)
+    return '<html><body><ul>\n' + ''.join(item.format(i=i) for i in range(n)) + '</ul></body></html>\n'
+
+
+def corpus_void(n):
+    r"""Void elements (<img>, <br>, <input>, <meta>) without closing tags around links."""
+    item = ('<li class="item"><img src="/p/{i}.jpg" alt="P{i}"><br><input type="checkbox" name="c{i}">'
+            '<a class="link" href="/v/{i}" title="T{i}">Title {i}</a><br/><meta itemprop="n" content="{i}"></li>\n')
+    return ('<html><head><meta charset="utf-8"></head><body><ul>\n'
+            + ''.join(item.format(i=i) for i in range(n)) + '</ul></body></html>\n')
+
+
+def corpus_unclosed(n):
+    r"""Unclosed tags (<li>, <p>, <td>) like in old HTML."""
+    item = '<li class="item"><p>Para {i}<a class="link" href="/v/{i}" title="T{i}">Title {i}</a><td>{i}\n'
+    return '<html><body><ul>\n' + ''.join(item.format(i=i) for i in range(n)) + '</ul></body></html>\n'
+
+
+def corpus_scripts(n, size=2000):
+    r"""Large scripts (with tags in strings) between links, script every 10 links."""
+    script = ('<script type="text/javascript">var s = "<a href=\\"/js\\">js</a>"; '
+              + 'var x = [' + ','.join(str(j) for j in range(size // 4)) + ']; if (a < b && c > d) {{}}</script>\n')
+    item = '<li class="item"><a class="link" href="/v/{i}" title="T{i}">Title {i}</a></li>\n'
+    return ('<html><body><ul>\n'
+            + ''.join((script if i % 10 == 0 else '') + item.format(i=i) for i in range(n))
+            + '</ul></body></html>\n')
+
+
+def corpus_xmltv(n):
+    r"""XMLTV-like records: `n` programmes on 10 channels."""
+    item = ('<programme start="2020010{d}{h:02}0000 +0100" stop="2020010{d}{h:02}3000 +0100" channel="ch{c}">'
+            '<title lang="pl">Title {i}</title><desc lang="pl">Desc {i} &amp; more</desc>'
+            '<category lang="en">Cat{k}</category><episode-num system="xmltv_ns">{k}.{i}.</episode-num>'
+            '<rating system="PL"><value>{k}</value></rating></programme>\n')
+    channels = ''.join('<channel id="ch{c}"><display-name>Channel {c}</display-name></channel>\n'.format(c=c)
+                       for c in range(10))
+    return ('<?xml version="1.0" encoding="utf-8"?>\n<tv generator-info-name="bench">\n' + channels
+            + ''.join(item.format(i=i, c=i % 10, k=i % 7, d=1 + i // 1000 % 9, h=i // 10 % 24) for i in range(n))
+            + '</tv>\n')
+
+
+class Spec(object):
+    r"""Corpus and what is searched in it (tag, attributes, returned attribute, selectors)."""
+
+    def __init__(self, generator, tag, attrs, ret, select):
+        self.generator = generator
+        self.tag = tag
+        self.attrs = attrs
+        self.ret = ret
+        #: Selectors for dom_select benchmarks (benchmark name: selector).
+        self.select = select
+
+
+#: Common selectors for HTML corpora with `li.item a.link` records.
+_html_select = OrderedDict([
+    ('select:tag', 'a'),
+    ('select:class', 'a.link'),
+    ('select:attr', 'a[href][title]::attr(href)'),
+    ('select:path', 'li.item a.link::text'),
+    ('select:child', 'li > a::attr(title)'),
+    ('select:group', 'a(href), img(src)'),
+    ('select:set', 'li.item {a(href), img?}'),
+    ('pseudo:first-child', 'li:first-child'),
+    ('pseudo:nth-child', 'li:nth-child(2n+1) a::text'),
+    ('pseudo:contains', 'a:contains("Title 5")'),
+    ('pseudo:not', 'li a:not(.x)'),
+    ('pseudo:has', 'li:has(> a.link)'),
+    ('pseudo:empty', ':empty'),
+])
+
+#: Corpora: name -> Spec.
+CORPORA = OrderedDict([
+    ('classic', Spec(corpus_classic, 'a', {'x': '1'}, 'x', OrderedDict([
+        ('select:tag', 'a'),
+        ('select:attr', 'a[x="1"]::attr(x)'),
+        ('select:path', 'c b a::text'),
+        ('select:child', 'c > b > a'),
+        ('select:group', 'a[x="1"], b[x="2"]'),
+        ('select:set', 'c {b, a[x]}'),
+        ('pseudo:first-child', 'b a:first-child'),
+        ('pseudo:nth-child', 'c a:nth-child(2n+1)'),
+        ('pseudo:contains', 'a:contains("x2")'),
+        ('pseudo:not', 'c a:not([x])'),
+        ('pseudo:has', 'b:has(> a[x="2"])'),
+    ]))),
+    ('wide', Spec(corpus_wide, 'a', {'class': 'link'}, 'href', _html_select)),
+    ('deep', Spec(corpus_deep, 'a', {'class': 'link'}, 'href', OrderedDict([
+        ('select:tag', 'a'),
+        ('select:class', 'a.link'),
+        ('select:attr', 'a[href][title]::attr(href)'),
+        ('select:path', 'div.l0 div.l39 a::text'),
+        ('select:child', 'div.l39 > a::attr(title)'),
+        ('pseudo:first-child', 'div.l20:first-child'),
+        ('pseudo:contains', 'div.l30:contains("Title 5")'),
+        ('pseudo:has', 'div.l38:has(> div > a)'),
+    ]))),
+    ('attrs', Spec(corpus_attrs, 'a', {'class': 'link'}, 'href', _html_select)),
+    ('void', Spec(corpus_void, 'a', {'class': 'link'}, 'href', _html_select)),
+    ('unclosed', Spec(corpus_unclosed, 'a', {'class': 'link'}, 'href', OrderedDict([
+        ('select:tag', 'a'),
+        ('select:class', 'a.link'),
+        ('select:attr', 'a[href][title]::attr(href)'),
+        ('select:path', 'li.item a.link::text'),
+        ('pseudo:contains', 'a:contains("Title 5")'),
+    ]))),
+    ('scripts', Spec(corpus_scripts, 'a', {'class': 'link'}, 'href', _html_select)),
+    ('xmltv', Spec(corpus_xmltv, 'programme', {'channel': 'ch1'}, 'start', OrderedDict([
+        ('select:tag', 'programme'),
+        ('select:attr', 'programme[channel="ch1"]::attr(start, stop)'),
+        ('select:path', 'programme title::text'),
+        ('select:set', 'programme {title::text, desc::text, category::text, episode-num?}'),
+        ('select:group', 'channel(id), programme(channel)'),
+        ('pseudo:first-child', 'programme > title:first-child'),
+        ('pseudo:contains', 'programme:contains("Title 5")'),
+        ('pseudo:has', 'programme:has(rating value)'),
+    ]))),
+])
+
+#: Corpus sizes: name -> number of records.
+SIZES = OrderedDict([('s', 100), ('m', 1000), ('l', 10000)])
+
+
+# -------  Benchmarks -------
+
 
+def _benchmarks(spec):
+    r"""Generate (benchmark, implementation, function(html)) for corpus `spec`."""
+    tag, attrs, ret = spec.tag, spec.attrs, spec.ret
+    for impl, fun in (('mrknow', mrknow.parseDOM), ('cherry', cherry.parseDOM), ('rysson', rysson.parseDOM),
+                      ('compat', compat.mrknow_parseDOM)):
+        yield 'parseDOM:tag', impl, lambda html, fun=fun: fun(html, tag)
+        yield 'parseDOM:attrs', impl, lambda html, fun=fun: fun(html, tag, attrs)
+        yield 'parseDOM:ret', impl, lambda html, fun=fun: fun(html, tag, attrs, ret)
+    for impl, fun in (('cherry', cherry.parse_dom), ('rysson', rysson.parse_dom),
+                      ('compat', compat.cherry_parse_dom)):
+        yield 'parse_dom:tag', impl, lambda html, fun=fun: fun(html, tag)
+    yield 'dom_search:tag', 'rysson', lambda html: rysson.dom_search(html, tag)
+    yield 'dom_search:attrs', 'rysson', lambda html: rysson.dom_search(html, tag, attrs)
+    yield 'dom_search:ret', 'rysson', lambda html: rysson.dom_search(html, tag, attrs, ret)
+    yield 'dom_search:node', 'rysson', lambda html: rysson.dom_search(html, tag, ret=Node)
+    for name, sel in spec.select.items():
+        yield name, 'rysson', lambda html, sel=sel: rysson.dom_select(html, sel)
 
-def test_pat_1(github=False):
+
+def measure(fun, min_time=0.1, repeat=3):
+    r"""Returns (time of single call, result) of `fun()`, best of `repeat`."""
+    t = timer()
+    res = fun()
+    once = timer() - t
+    if once >= min_time:
+        return once, res
+    number = max(1, int(min_time / max(once, 1e-6)))
+    best = once
+    for _ in range(repeat):
+        t = timer()
+        for _ in range(number):
+            fun()
+        best = min(best, (timer() - t) / number)
+    return best, res
+
+
+def peak_memory(fun):
+    r"""Returns peak memory [B] allocated by single `fun()` call or None (no tracemalloc)."""
+    if tracemalloc is None:
+        return None
+    tracemalloc.start()
+    try:
+        fun()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _count(res):
+    r"""Helper. Number of results."""
+    try:
+        return len(res)
+    except TypeError:
+        return None
+
+
+def run(corpora, sizes, bench=None, impl=None, max_time=5.0, memory=True, out=sys.stdout):
+    r"""
+    Run benchmarks, returns list of result dicts.
+
+    Result: bench, impl, corpus, size, records, bytes, time [s], peak [B], count.
+    """
+    bench_re = re.compile(bench) if bench else None
+    impl_re = re.compile(impl) if impl else None
+    results = []
+    line = '{:10} {:2} {:>9} {:20} {:7} {:>11} {:>11} {:>7}'
+    print(line.format('corpus', 'sz', 'bytes', 'benchmark', 'impl', 'time [ms]', 'peak [kB]', 'count'), file=out)
+    for cname in corpora:
+        spec = CORPORA[cname]
+        too_slow = set()
+        for size in sizes:
+            records = SIZES[size]
+            html = spec.generator(records)
+            for name, iname, fun in _benchmarks(spec):
+                if (bench_re and not bench_re.search(name)) or (impl_re and not impl_re.search(iname)):
+                    continue
+                if (name, iname) in too_slow:
+                    continue
+                call = lambda fun=fun: fun(html)
+                try:
+                    t, res = measure(call)
+                    error = None
+                except Exception as exc:
+                    t, res, error = None, None, '{}: {}'.format(exc.__class__.__name__, exc)
+                peak = peak_memory(call) if memory and error is None else None
+                if t is not None and t > max_time:
+                    too_slow.add((name, iname))
+                result = OrderedDict([('bench', name), ('impl', iname), ('corpus', cname), ('size', size),
+                                      ('records', records), ('bytes', len(html)), ('time', t), ('peak', peak),
+                                      ('count', _count(res))])
+                if error:
+                    result['error'] = error
+                results.append(result)
+                print(line.format(cname, size, len(html), name, iname,
+                                  '-' if t is None else '{:.3f}'.format(t * 1000),
+                                  '-' if peak is None else '{:.1f}'.format(peak / 1024),
+                                  '-' if error else result['count']), file=out)
+                out.flush()
+    return results
+
+
+def meta():
+    r"""Returns run metadata (Python, platform, git commit, time)."""
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                         stderr=subprocess.STDOUT).decode('utf-8').strip()
+    except Exception:
+        commit = None
+    return OrderedDict([('python', platform.python_version()), ('implementation', platform.python_implementation()),
+                        ('platform', platform.platform()), ('commit', commit),
+                        ('time', time.strftime('%Y-%m-%d %H:%M:%S'))])
+
+
+def compare(base, new, out=sys.stdout):
+    r"""Print time and memory ratios (new / base) of the same measurements."""
+    def key(r):
+        return r['bench'], r['impl'], r['corpus'], r['size']
+    old = dict((key(r), r) for r in base['results'])
+    print('base: {}, new: {}'.format(base['meta'].get('commit'), new['meta'].get('commit')), file=out)
+    line = '{:10} {:2} {:20} {:7} {:>11} {:>11} {:>7} {:>7}'
+    print(line.format('corpus', 'sz', 'benchmark', 'impl', 'base [ms]', 'new [ms]', 'time', 'memory'), file=out)
+    for r in new['results']:
+        b = old.get(key(r))
+        if b is None or not b.get('time') or not r.get('time'):
+            continue
+        mem = '{:.2f}x'.format(r['peak'] / b['peak']) if b.get('peak') and r.get('peak') else '-'
+        print(line.format(r['corpus'], r['size'], r['bench'], r['impl'], '{:.3f}'.format(b['time'] * 1000),
+                          '{:.3f}'.format(r['time'] * 1000), '{:.2f}x'.format(r['time'] / b['time']), mem), file=out)
+
+
+# -------  Extra checks -------
+
+
+def html_fused():
+    item = ('<div class="item"><a href="/v/{i}" title="T{i}"><img class="poster big" src="/p/{i}.jpg"></a>'
+            '<a name="x{i}">no href</a><img class="thumb" src="/t/{i}.jpg"></div>\n')
+    head = '<head><meta property="og:title" content="Title"><meta property="og:image" content="/i.jpg"></head>'
+    return head + ''.join(item.format(i=i) for i in range(10000))
+
+
+def test_fused():
+    r"""Simple selectors: fused regex vs general engine (fused plan is disabled in own compiled selector)."""
+    print('-- fused regex vs general engine --')
+    html = html_fused()
+    for sel in ('a[href]::attr(href)', 'a(href, title)', 'img.poster::attr(src)',
+                'meta[property="og:title"]::attr(content)'):
+        nofused = CompiledSelector(sel)
+        nofused.group._fused = None
+        fused, general = rysson.dom_select(html, sel), rysson.dom_select(html, nofused)
+        assert fused == general, sel
+        tf = measure(lambda: rysson.dom_select(html, sel))[0]
+        tg = measure(lambda: rysson.dom_select(html, nofused))[0]
+        print('{sel:42} fused: {tf:.4f}, general: {tg:.4f} [s], {n} results, identical'.format(
+              sel=sel, tf=tf, tg=tg, n=len(fused)))
+
+
+def test_patterns(github=False):
+    r"""Print parseDOM() results of all modules on tricky patterns."""
     if github:
-        #print("parseDOM('...', 'a' [, {'x':'1'} ]) | mrknow | cherry | rysson\n---- | ---- | ---- | ----")
         print("parseDOM('...', 'a') | mrknow | cherry | rysson\n---- | ---- | ---- | ----")
+    mods = dict(mrknow=mrknow, cherry=cherry, rysson=rysson)
     for pat in (
         '<a>A</a>Q',
         '<a>A<a>B</a>C</a>Q',
         '<a>A<a/>B</a>Q',
-        #'<x><a/></x><a>Z</a>Q',
-        #'<x><a/><a>Z</a></x>Q',
-        #'<a>z<x>x<a/>y</x></a>Q</a>Q',
-        #'<a>z<x>x<a>aa</a>y</x></a>Q',
-        #'<a>z<x>x<a>y</x></a>Q</a>R',
         '<a>A<x>B<a>C</x>D</a>Q</a>R',
         '<a>A</a><a x="1">B</a>Q',
         '<a z=">">A</a>Q',
-        #('<a x="1">A</a><a x="2">B</a>Q', {'x': '1'}, False),
-        #('<a x="1">A</a><a y="2">B</a>Q', {'x': '1'}, False),
-        #('<a x="1">A</a><a x="1" y="2">B</a>Q', {'x': '1'}, False),
-        #('<a x="1">A</a><a x="1" y="2">B</a>Q', {'x': '1', 'y': '2'}, False),
         ('<a x="1">A</a>Q', {'x': '1'}, 'x'),
         ('<a x="1">A</a>Q', {'x': '1'}, 'y'),
         ('<a x="1" x="2">A</a>Q', {'x': '1'}, 'x'),
@@ -97,80 +391,66 @@ def test_pat_1(github=False):
         if not isinstance(pat, basestring):
             pat, attr, ret = pat
         if github:
-            if attr:
-                line = [ "`{}`, `{}`".format(pat, attr) ]
-            else:
-                line = [ "`{}`".format(pat) ]
+            line = ['`{}`, `{}`'.format(pat, attr) if attr else '`{}`'.format(pat)]
         else:
             print('----- Pattern: {}'.format(pat))
         match = rysson.parseDOM(pat, 'a', attr)
         for mod in ('mrknow', 'cherry', 'rysson'):
+            lst = mods[mod].parseDOM(pat, 'a', attr, ret)
             if github:
-                lst = eval('{0}.parseDOM("""{1}""", "a", attr, ret)'.format(mod, pat), globals(), locals())
                 res = '[' + ', '.join("'{}'".format('`{}`'.format(v) if v else '') for v in lst) + ']'
                 if match == lst:
                     res = '**\033[32;1m{}\033[0m**'.format(res)
                 line.append(res)
             else:
-                eval('print("{0}: ", {0}.parseDOM("""{1}""", "a", attr, ret))'.format(mod, pat), globals(), locals())
+                print('{}: '.format(mod), lst)
         if github:
             print(' | '.join(line))
-    exit()
 
-if __name__ == '__main__':
-    github = sys.argv[1:2] == ['--github']
-    print('zażółć', 3/2, 3//2, type(''), type(b''), bytes, basestring)
-    #test_pat_1(github=github)
-
-    #html = prepare_html()
-
-    def html_attr():
-        return (('<a x="1">A</a>' * 999) + '<a x="1" y="2">') * 1000
-    if False:
-        print('-- search --')
-        print('attr -:   {t:.3f}'.format(t=check('rysson.dom_search', 'a', ret=cls(Node), prepare_html=html_attr)))
-        print('attr x:   {t:.3f}'.format(t=check('rysson.dom_search', 'a', {'x': True}, ret=cls(Node), prepare_html=html_attr)))
-        print('-- select --')
-        print('attr -:   {t:.3f}'.format(t=check('rysson.dom_select', 'a', prepare_html=html_attr)))
-        print('attr x:   {t:.3f}'.format(t=check('rysson.dom_select', 'a[x]', prepare_html=html_attr)))
-        print('attr x,y: {t:.3f}'.format(t=check('rysson.dom_select', 'a[x][y]', prepare_html=html_attr)))
-        print('attr y,x: {t:.3f}'.format(t=check('rysson.dom_select', 'a[y][x]', prepare_html=html_attr)))
-
-
-    def html_contains():
-        return ('<a>A' + ('<b>B</b>' * 999) + 'C</a>') * 1000
-    def html_contains_mass():
-        return '<a>A</a>' * 1000000
-    if False:
-        print('-- select --')
-        print('contains a:   {t:.3f}'.format(t=check('rysson.dom_select', 'a', prepare_html=html_contains))),
-        print('contains a.A: {t:.3f}'.format(t=check('rysson.dom_select', 'a:contains(A)', prepare_html=html_contains))),
-        print('contains a.C: {t:.3f}'.format(t=check('rysson.dom_select', 'a:contains(C)', prepare_html=html_contains))),
-        print('contains a.X: {t:.3f}'.format(t=check('rysson.dom_select', 'a:contains(X)', prepare_html=html_contains))),
-        print('  --mass a.A: {t:.3f}'.format(t=check('rysson.dom_select', 'a:contains(A)', prepare_html=html_contains_mass))),
-        print('  --mass a.X: {t:.3f}'.format(t=check('rysson.dom_select', 'a:contains(X)', prepare_html=html_contains_mass))),
-
-
-    allmods = ('mrknow', 'cherry', 'rysson')
-    mods = ('cherry', 'rysson')
-    print('-- compare modules {} --\n'.format(', '.join(allmods)))
-    if github:
-        print('#### Python{py}\n\nTest  | mrknow | cherry | rysson |\n----- | ----- | ----- | -----'.format(py=sys.version_info[0]))
-        print(' | '.join(['tags '] + list('{t:.3f}'.format(t=check(mod + '.parseDOM', 'a')) for mod in allmods)))
-        print(' | '.join(['attrs'] + list('{t:.3f}'.format(t=check(mod + '.parseDOM', 'a', {'x': '1'})) for mod in allmods)))
-        print('> rysson.Node: {t:.3f}'.format(t=check('rysson.parseDOM', 'a', ret=cls(Node))))
-    else:
-        for mod in allmods:
-            t = check(mod + '.parseDOM', 'a')
-            print('Tag:  Python{py}, module: {mod}, time: {t:.3f} [s]'.format(py=sys.version_info[0], mod=mod, t=t))
-        print('> rysson.Node: {t:.3f}'.format(t=check('rysson.parseDOM', 'a', ret=cls(Node))))
-        for mod in allmods:
-            t = check(mod + '.parseDOM', 'a', {'x': '1'})
-            print('Attr: Python{py}, module: {mod}, time: {t:.3f} [s]'.format(py=sys.version_info[0], mod=mod, t=t))
-        for mod in mods:
-            t = check(mod + '.parse_dom', 'a')
-            print('Node: Python{py}, module: {mod}, time: {t:.3f} [s]'.format(py=sys.version_info[0], mod=mod, t=t))
-        for mod in 'rysson',:
-            t = check(mod + '.dom_select', 'a')
-            print('SelN: Python{py}, module: {mod}, time: {t:.3f} [s]'.format(py=sys.version_info[0], mod=mod, t=t))
 
+def main(argv=None):
+    aparser = argparse.ArgumentParser(description='Benchmark of parseDOM implementations.')
+    aparser.add_argument('--corpus', '-c', default=','.join(CORPORA),
+                         help='comma separated corpora: {} (default all)'.format(', '.join(CORPORA)))
+    aparser.add_argument('--size', '-s', default='s,m',
+                         help='comma separated sizes: {} (default s,m)'.format(
+                             ', '.join('{}={}'.format(k, v) for k, v in SIZES.items())))
+    aparser.add_argument('--bench', '-b', metavar='REGEX', help='run benchmarks matching regex only')
+    aparser.add_argument('--impl', '-i', metavar='REGEX', help='run implementations matching regex only')
+    aparser.add_argument('--max-time', type=float, default=5.0,
+                         help='skip benchmark on larger sizes if single call is slower [s]')
+    aparser.add_argument('--no-memory', action='store_true', help='do not measure peak memory')
+    aparser.add_argument('--json', metavar='FILE', help='save results as JSON')
+    aparser.add_argument('--compare', metavar='JSON', nargs='+', help='compare results (base [new])')
+    aparser.add_argument('--fused', action='store_true', help='compare fused regex and general engine')
+    aparser.add_argument('--patterns', action='store_true', help='show parseDOM results on tricky patterns')
+    aparser.add_argument('--github', action='store_true', help='markdown output for --patterns')
+    args = aparser.parse_args(argv)
+
+    if args.fused:
+        return test_fused()
+    if args.patterns:
+        return test_patterns(github=args.github)
+    if args.compare and len(args.compare) == 2:
+        with open(args.compare[0]) as f1, open(args.compare[1]) as f2:
+            return compare(json.load(f1), json.load(f2))
+
+    corpora = [c for c in args.corpus.split(',') if c]
+    sizes = [s for s in args.size.split(',') if s]
+    for name, known in ((corpora, CORPORA), (sizes, SIZES)):
+        unknown = [n for n in name if n not in known]
+        if unknown:
+            aparser.error('unknown: {}'.format(', '.join(unknown)))
+    data = OrderedDict([('meta', meta()), ('results', run(corpora, sizes, bench=args.bench, impl=args.impl,
+                                                          max_time=args.max_time, memory=not args.no_memory))])
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(data, f, indent=1)
+    if args.compare:
+        with open(args.compare[0]) as f:
+            print()
+            compare(json.load(f), data)
+
+
+if __name__ == '__main__':
+    main()